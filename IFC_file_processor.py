@@ -1,7 +1,18 @@
+import tempfile
+
 import streamlit as st
+
+from auth import check_password
+
+# Checked before the app modules are imported, so the login page is shown
+# without waiting for them
+if not check_password():
+    st.stop()
+
 from src.utils.file_loader import FileLoader
 from src.utils.embedding import EmbeddingProcessor
 from src.utils.ifc_processing import IFCProcessor, check_ifcopenshell_installation, install_ifcopenshell_message
+from src.utils.text_profiles import token_report
 from src.components.api_key_manager import APIKeyManager
 from src.components.overview_tab import OverviewTab
 from src.components.elements_tab import ElementsTab
@@ -10,11 +21,6 @@ from src.components.embeddings_tab import EmbeddingsTab
 from src.components.load_embeddings_tab import LoadEmbeddingsTab
 from src.components.chat_tab import ChatTab
 
-from auth import check_password
-
-if not check_password():
-    st.stop()
-
 def main():
     st.title("🎈 IFC File Processor")
     st.write(
@@ -31,8 +37,8 @@ def main():
         ["None"] + sample_files
     )
 
-    # JSON/IFC file uploader
-    uploaded_file = st.file_uploader("Upload a JSON or IFC file", type=["json", "ifc"])
+    # JSON/IFC/columnar file uploader
+    uploaded_file = st.file_uploader("Upload a JSON, IFC or columnar (.ifccol) file", type=["json", "ifc", "ifccol"])
 
     # Load data
     data = None
@@ -43,10 +49,16 @@ def main():
         data = FileLoader.load_uploaded_file(uploaded_file)
 
     if data:
+        # Set while a large IFC model is still being extracted in the background
+        partial = isinstance(data, dict) and data.get('file_info', {}).get('partial', False)
+
         # Initialize embedding processor
         if 'embedding_processor' not in st.session_state:
             st.session_state.embedding_processor = EmbeddingProcessor()
         embedding_processor = st.session_state.embedding_processor
+        embedding_processor.shared_cache = FileLoader.shared_cache()
+        # Large stores are memory-mapped, so only their search index stays in memory
+        embedding_processor.offload_dir = tempfile.gettempdir()
 
         # Create tabs
         tab_names = ["Overview", "Building Elements", "Download", "API Key", 
@@ -62,37 +74,49 @@ def main():
             ElementsTab.render(data)
 
         with tab_download:
-            DownloadTab.render(data)
+            if partial:
+                st.info("Download is available once the model has finished loading.")
+            else:
+                DownloadTab.render(data)
 
         with tab_api:
             APIKeyManager.render(embedding_processor)
 
         with tab_embeddings:
             st.subheader("Generate & Manage Embeddings")
-            selected_model = EmbeddingsTab.render(embedding_processor)
-            
-            # Process texts for embedding
-            texts = []
-            if data.get('file_info', {}).get('type') == 'IFC':
-                processor = IFCProcessor()
-                texts = processor.convert_to_text_chunks(data)
-                st.write(f"Found {len(texts)} elements to process")
+            if partial:
+                st.info("Embeddings can be generated once the model has finished loading.")
+            else:
+                embedding_settings = EmbeddingsTab.render(embedding_processor)
+                
+                # Process texts for embedding
+                texts = []
+                if data.get('file_info', {}).get('type') == 'IFC':
+                    profile = EmbeddingsTab.select_text_profile()
+                    texts = FileLoader.shared_derived(
+                        data, f'text_chunks_{profile}',
+                        lambda: IFCProcessor().convert_to_text_chunks(data, use_cache=False, profile=profile))
+                    report = FileLoader.shared_derived(data, f'text_tokens_{profile}', lambda: token_report(texts))
+                    EmbeddingsTab.show_token_report(report, len(data.get('elements', [])))
+                    
+                EmbeddingsTab.process_and_generate(
+                    texts, 
+                    embedding_processor, 
+                    embedding_settings,
+                    st.session_state.get('api_key')
+                )
                 
-            EmbeddingsTab.process_and_generate(
-                texts, 
-                embedding_processor, 
-                selected_model,
-                st.session_state.get('api_key')
-            )
-            
-            if texts:
-                EmbeddingsTab.show_text_descriptions(texts)
+                if texts:
+                    EmbeddingsTab.show_text_descriptions(texts)
 
         with tab_load:
             LoadEmbeddingsTab.render(embedding_processor)
 
         with tab_chat:
-            ChatTab.render(embedding_processor)
+            if partial:
+                st.info("Chat is available once the model has finished loading.")
+            else:
+                ChatTab.render(embedding_processor, data)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,86 @@
+"""
+Load time and size of processed models: JSON vs the columnar format.
+
+Builds a processed model of ``--elements`` elements by repeating the
+elements of the sample models (with unique IDs), writes it as JSON and as
+columnar files (plain and compressed), and measures for each (JSON is
+loaded both with json.load and with the streaming loader):
+
+- size on disk
+- open: time until the model can be used (json.load / load_document / columnar.read)
+- open+iterate: open and decode every element
+- peak traced memory of open+iterate (memory-mapped pages are not traced)
+
+    python benchmarks/bench_columnar.py
+    python benchmarks/bench_columnar.py --elements 50000 --repeats 3
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_suite import measure  # noqa: E402
+from src.utils import columnar, json_stream  # noqa: E402
+from src.utils.ifc_processing import IFCProcessor  # noqa: E402
+
+
+def synthetic_model(n_elements: int) -> dict:
+    """A processed model of n elements repeated from the sample models."""
+    processor = IFCProcessor()
+    source = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "sample_models", "*.ifc"))):
+        source.extend(processor.process_sample_ifc(path)['elements'])
+    elements = []
+    for i in range(n_elements):
+        element = dict(source[i % len(source)])
+        element['id'] = f"{element['id']}_{i // len(source)}"
+        elements.append(element)
+    return IFCProcessor.structure_data(elements, {'name': f"synthetic_{n_elements}.ifc", 'type': 'IFC'})
+
+
+def load_json(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--elements", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    data = synthetic_model(args.elements)
+    with tempfile.TemporaryDirectory(prefix="ifc_columnar_") as work_dir:
+        json_path = os.path.join(work_dir, "model.json")
+        paths = {
+            'json': json_path,
+            'json (streamed)': json_path,
+            'columnar': os.path.join(work_dir, "model.ifccol"),
+            'columnar (zlib)': os.path.join(work_dir, "model_z.ifccol")
+        }
+        with open(paths['json'], 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        columnar.write(data, paths['columnar'])
+        columnar.write(data, paths['columnar (zlib)'], compress=True)
+
+        loaders = {'json': load_json, 'json (streamed)': json_stream.load_document,
+                   'columnar': columnar.read, 'columnar (zlib)': columnar.read}
+        print(f"{args.elements} elements")
+        print(f"{'format':<18} {'size MB':>9} {'open ms':>9} {'open+iterate ms':>16} {'peak MB':>9}")
+        for name, path in paths.items():
+            load = loaders[name]
+            opened = measure(lambda: load(path), args.repeats)
+            iterated = measure(lambda: list(load(path)['elements']), args.repeats)
+            print(f"{name:<18} {os.path.getsize(path) / 1e6:>9.2f} {opened['seconds'] * 1000:>9.1f} "
+                  f"{iterated['seconds'] * 1000:>16.1f} {iterated['peak_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
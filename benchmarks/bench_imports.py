@@ -0,0 +1,105 @@
+"""
+Import-time budget for app startup.
+
+Each measurement runs in a fresh interpreter, so nothing is already in
+sys.modules. Reported times are medians and exclude Streamlit itself, which
+every page pays for regardless:
+
+- login: what the password page imports (auth)
+- app: the modules IFC_file_processor.py imports once the password is accepted
+
+Fails if the app imports take longer than the budget, or if any module that
+should only load with the feature that needs it (the OpenAI SDK,
+scikit-learn, plotly express) is imported at startup.
+
+    python benchmarks/bench_imports.py
+    python benchmarks/bench_imports.py --budget-ms 300 --repeats 7
+"""
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Any
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_SCRIPT = os.path.join(ROOT, "IFC_file_processor.py")
+
+# Loaded on first use by the feature that needs them, never at startup
+DEFERRED_MODULES = ["openai", "sklearn", "plotly.express", "openTSNE"]
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+base = time.perf_counter()
+before = set(sys.modules)
+{imports}
+end = time.perf_counter()
+print(json.dumps({{
+    'streamlit_s': base - start,
+    'seconds': end - base,
+    'deferred_loaded': [m for m in {deferred!r} if m in sys.modules and m not in before]
+}}))
+"""
+
+
+def app_imports(script: str = APP_SCRIPT) -> List[str]:
+    """The project modules the app script imports, as import statements."""
+    with open(script, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    statements = []
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module and node.module.split(".")[0] in ("src", "auth"):
+            statements.append(f"import {node.module}")
+    return statements
+
+
+def measure(imports: List[str], repeats: int) -> Dict[str, Any]:
+    """Median import time of the statements over fresh interpreters."""
+    code = MEASURE.format(imports="\n".join(imports), deferred=DEFERRED_MODULES)
+    runs = []
+    for _ in range(repeats):
+        completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Import failed:\n{completed.stderr}")
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {
+        'streamlit_s': statistics.median(run['streamlit_s'] for run in runs),
+        'seconds': statistics.median(run['seconds'] for run in runs),
+        'deferred_loaded': sorted({m for run in runs for m in run['deferred_loaded']})
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=500.0,
+                        help="Allowed app import time on top of Streamlit (default: 500)")
+    args = parser.parse_args()
+
+    login = measure(["import auth"], args.repeats)
+    app = measure(["import auth"] + app_imports(), args.repeats)
+
+    print(f"streamlit  {login['streamlit_s'] * 1000:8.1f} ms (not counted)")
+    print(f"login      {login['seconds'] * 1000:8.1f} ms")
+    print(f"app        {app['seconds'] * 1000:8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+
+    failures = []
+    if app['seconds'] * 1000 > args.budget_ms:
+        failures.append(f"app imports take {app['seconds'] * 1000:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    for name in app['deferred_loaded']:
+        failures.append(f"{name} is imported at startup")
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nWithin budget.")
+
+
+if __name__ == "__main__":
+    main()
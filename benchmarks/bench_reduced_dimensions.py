@@ -0,0 +1,96 @@
+"""
+Quality-vs-speed benchmark for reduced-dimension search with full-vector re-ranking.
+
+Runs offline against a synthetic store whose variance decays along the vector,
+like the Matryoshka-trained text-embedding-3 models, or against a saved
+embedding store. Queries are noisy copies of stored vectors.
+
+    python benchmarks/bench_reduced_dimensions.py
+    python benchmarks/bench_reduced_dimensions.py --store embeddings.pickle
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.embedding import EmbeddingProcessor  # noqa: E402
+
+
+def synthetic_store(n: int, dims: int, seed: int = 0) -> np.ndarray:
+    """Random vectors whose leading dimensions carry most of the signal."""
+    rng = np.random.default_rng(seed)
+    scale = (1.0 + np.arange(dims) / 32.0) ** -0.75
+    vectors = rng.standard_normal((n, dims)).astype(np.float32) * scale
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(store: np.ndarray, n_queries: int, noise: float, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(store), size=n_queries, replace=False)
+    queries = store[picks] + noise * rng.standard_normal((n_queries, store.shape[1])).astype(np.float32) / np.sqrt(store.shape[1])
+    return queries.astype(np.float32)
+
+
+def run_queries(processor: EmbeddingProcessor, queries: np.ndarray, top_k: int):
+    # Warm the index so its construction is not counted as search time
+    processor.find_top_similar("", top_k=top_k, query_embedding=queries[0])
+    start = time.perf_counter()
+    results = [
+        [r['index'] for r in processor.find_top_similar("", top_k=top_k, query_embedding=q)]
+        for q in queries
+    ]
+    elapsed = time.perf_counter() - start
+    return results, elapsed / len(queries)
+
+
+def recall(results, truth) -> float:
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    return hits / sum(len(t) for t in truth)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--store", help="Saved embedding store (pickle or json)")
+    parser.add_argument("--n", type=int, default=20000, help="Synthetic store size")
+    parser.add_argument("--dims", type=int, default=1536, help="Synthetic vector size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--search-dims", type=int, nargs="+", default=[128, 256, 512])
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    processor = EmbeddingProcessor()
+    if args.store:
+        processor.load_embeddings(args.store, format='json' if args.store.endswith('.json') else 'pickle')
+        store = np.asarray(processor.embeddings, dtype=np.float32)
+    else:
+        store = synthetic_store(args.n, args.dims)
+        processor.embeddings = store.tolist()
+        processor.texts = [f"Element {i}" for i in range(len(store))]
+    queries = make_queries(store, min(args.queries, len(store)), args.noise)
+
+    truth, full_time = run_queries(processor, queries, args.top_k)
+    full_bytes = store.shape[0] * store.shape[1] * 4
+    print(f"Store: {store.shape[0]} vectors x {store.shape[1]} dims, top-{args.top_k}, {len(queries)} queries")
+    print(f"{'index':>12} {'recall':>8} {'ms/query':>9} {'speedup':>8} {'index MB':>9}")
+    print(f"{'full':>12} {1.0:>8.3f} {full_time * 1000:>9.2f} {1.0:>7.1f}x {full_bytes / 1e6:>9.1f}")
+
+    for dims in args.search_dims:
+        if dims >= store.shape[1]:
+            continue
+        for factor, label in ((1, f"{dims}"), (args.rerank_factor, f"{dims}+rerank")):
+            processor.set_search_dimensions(dims, rerank_factor=factor)
+            results, elapsed = run_queries(processor, queries, args.top_k)
+            index_bytes = store.shape[0] * dims * 4
+            print(f"{label:>12} {recall(results, truth):>8.3f} {elapsed * 1000:>9.2f} "
+                  f"{full_time / elapsed:>7.1f}x {index_bytes / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Offline benchmark suite for the ingest, chunking, embedding and search hot paths.
+
+Runs every case against the models in sample_models/ plus a synthetic model
+made of renumbered copies of the largest sample (process_ifc, which walks
+every entity, is skipped for it). Embeddings come from a local mock of
+the OpenAI embeddings endpoint, so no API key or network is needed. Each
+case reports the median wall time over repeats and the peak traced memory
+of one extra run, and is compared against a baseline from the same machine.
+
+    git stash; python benchmarks/bench_suite.py --update-baseline; git stash pop
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --quick --threshold 0.5
+
+Timings are only comparable on one machine, so baselines are not part of
+the repository: --update-baseline writes benchmarks/baseline.local.json
+(ignored by git) with the machine it was measured on, and a baseline from
+another machine is ignored. Run it on the commit to compare against, then
+run the suite on the change.
+"""
+
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Any, Optional
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.utils.embedding import EmbeddingProcessor  # noqa: E402
+from src.utils.ifc_processing import IFCProcessor  # noqa: E402
+from src.utils.numeric_index import NumericIndex  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.local.json")
+MOCK_DIMENSIONS = 1536
+
+
+class MockEmbeddingsHandler(BaseHTTPRequestHandler):
+    """Answer POST /v1/embeddings with deterministic vectors derived from each input."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+        dims = body.get('dimensions') or MOCK_DIMENSIONS
+        data = []
+        for i, text in enumerate(inputs):
+            rng = np.random.default_rng(zlib.crc32(text.encode('utf-8')))
+            vector = rng.standard_normal(dims).astype(np.float32)
+            data.append({'object': 'embedding', 'index': i, 'embedding': (vector / np.linalg.norm(vector)).tolist()})
+        payload = json.dumps({
+            'object': 'list', 'data': data, 'model': body['model'],
+            'usage': {'prompt_tokens': len(inputs), 'total_tokens': len(inputs)}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockEmbeddingsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def scaled_model(source: str, copies: int, output_dir: str) -> str:
+    """Write an IFC file holding `copies` renumbered copies of the source model's data section."""
+    with open(source, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    head, rest = text.split("DATA;", 1)
+    data, tail = rest.split("ENDSEC;", 1)
+    max_id = max(int(n) for n in re.findall(r"#(\d+)", data))
+    parts = [data] + [re.sub(r"#(\d+)", lambda m, k=k: f"#{int(m.group(1)) + k * max_id}", data)
+                      for k in range(1, copies)]
+    path = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(source))[0]}_x{copies}.ifc")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(head + "DATA;" + "".join(parts) + "ENDSEC;" + tail)
+    return path
+
+
+def synthetic_processor(n: int, dims: int, seed: int = 0) -> EmbeddingProcessor:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dims)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    processor = EmbeddingProcessor()
+    processor.embeddings = vectors.tolist()
+    processor.texts = [f"Element Type: IfcWall | ID: {i}" for i in range(n)]
+    return processor
+
+
+def measure(fn: Callable[[], Any], repeats: int, setup: Optional[Callable[[], None]] = None,
+            time_budget: float = 15.0) -> Dict[str, float]:
+    """Median wall time over repeats, then peak traced memory of one more run.
+
+    Repeats stop early once they have taken ``time_budget`` seconds in total.
+    """
+    # Keep debug prints of the code under test out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _measure(fn, repeats, setup, time_budget)
+
+
+def _measure(fn: Callable[[], Any], repeats: int, setup: Optional[Callable[[], None]],
+             time_budget: float) -> Dict[str, float]:
+    times = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+        if sum(times) > time_budget:
+            break
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': statistics.median(times), 'peak_mb': peak / (1024 * 1024)}
+
+
+def range_queries(numeric: NumericIndex) -> None:
+    """One range query per indexed property, over the middle half of its values."""
+    for key in numeric.keys():
+        values = numeric.values[key]
+        numeric.range(key, values[len(values) // 4], values[3 * len(values) // 4])
+
+
+def build_cases(models: List[str], base_url: str, work_dir: str, store_size: int,
+                dims: int) -> Dict[str, Callable[[int], Dict[str, float]]]:
+    """Benchmark cases by name; each takes a repeat count and returns its measurement."""
+    cases: Dict[str, Callable[[int], Dict[str, float]]] = {}
+    processor = IFCProcessor()
+
+    for path in models:
+        name = os.path.basename(path)
+        synthetic = path.startswith(work_dir)
+        ifc_file = processor.load_ifc_file(path)
+        data = processor.process_sample_ifc(path)
+
+        cases[f"load_ifc_file[{name}]"] = lambda r, p=path: measure(lambda: processor.load_ifc_file(p), r)
+        types = processor.extract_types(ifc_file)
+        cases[f"extract_types[{name}]"] = lambda r, f=ifc_file: measure(lambda: processor.extract_types(f), r)
+        cases[f"extract_building_elements[{name}]"] = \
+            lambda r, f=ifc_file, t=types: measure(lambda: processor.extract_building_elements(f, types=t), r)
+        cases[f"extract_relationships[{name}]"] = lambda r, f=ifc_file, d=data: measure(
+            lambda: processor.extract_relationships(f, d['elements']), r)
+        if not synthetic:
+            # Walks every entity in the file; too slow to repeat on the scaled-up model
+            cases[f"process_ifc[{name}]"] = lambda r, p=path: measure(lambda: IFCProcessor.process_ifc(p), r)
+        cases[f"convert_to_text_chunks[{name}]"] = \
+            lambda r, d=data: measure(lambda: processor.convert_to_text_chunks(d, use_cache=False), r)
+        cases[f"convert_to_text_chunks[{name},compact]"] = lambda r, d=data: measure(
+            lambda: processor.convert_to_text_chunks(d, use_cache=False, profile='compact'), r)
+        cases[f"numeric_index_build[{name}]"] = lambda r, d=data: measure(lambda: NumericIndex(d), r)
+        cases[f"numeric_range_query[{name},all keys]"] = \
+            lambda r, n=NumericIndex(data): measure(lambda: range_queries(n), r)
+
+        texts = processor.convert_to_text_chunks(data, use_cache=False)
+        embedder = EmbeddingProcessor()
+        embedder.set_api_key("benchmark", base_url=base_url)
+        cases[f"generate_embeddings[{name}]"] = \
+            lambda r, t=texts, e=embedder: measure(lambda: e.generate_embeddings(t), r)
+
+    searcher = synthetic_processor(store_size, dims)
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((50, dims)).astype(np.float32)
+
+    def search_top():
+        for q in queries:
+            searcher.find_top_similar("", top_k=10, query_embedding=q)
+
+    def search_threshold():
+        for q in queries:
+            searcher.find_similar_by_threshold("", threshold=0.1, query_embedding=q)
+
+    def warm():
+        # Index construction is measured by its own case, not per query
+        searcher.find_top_similar("", top_k=1, query_embedding=queries[0])
+
+    cases[f"find_top_similar[{store_size}x{dims},50q]"] = lambda r: measure(search_top, r, setup=warm)
+    cases[f"find_similar_by_threshold[{store_size}x{dims},50q]"] = lambda r: measure(search_threshold, r, setup=warm)
+
+    def build_index():
+        searcher._index_cache = None
+        searcher.find_top_similar("", top_k=1, query_embedding=queries[0])
+
+    cases[f"search_index_build[{store_size}x{dims}]"] = lambda r: measure(build_index, r)
+
+    store = synthetic_processor(max(store_size // 4, 1), dims, seed=2)
+    for fmt in ("pickle", "json"):
+        path = os.path.join(work_dir, f"store.{fmt}")
+        loader = EmbeddingProcessor()
+        cases[f"save_embeddings[{fmt}]"] = lambda r, f=fmt, p=path: measure(lambda: store.save_embeddings(p, format=f), r)
+        cases[f"load_embeddings[{fmt}]"] = lambda r, f=fmt, p=path: measure(
+            lambda: loader.load_embeddings(p, format=f), r,
+            setup=lambda: os.path.exists(p) or store.save_embeddings(p, format=f))
+    return cases
+
+
+def machine() -> Dict[str, Any]:
+    """What a baseline was measured on; timings only compare on the same machine."""
+    return {'node': platform.node(), 'processor': platform.machine(), 'cpus': os.cpu_count(),
+            'python': platform.python_version()}
+
+
+def load_baseline(path: str) -> Dict[str, Dict[str, float]]:
+    """Baseline results stored at path, or {} if there are none for this machine."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        stored = json.load(f)
+    if stored.get('machine') != machine():
+        print(f"Ignoring {path}: it was measured on another machine ({stored.get('machine')}).")
+        return {}
+    return stored['results']
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float, min_delta: float = 0.0) -> List[str]:
+    """Names of cases slower than baseline by more than threshold (a fraction) and min_delta seconds."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base and result['seconds'] > base['seconds'] * (1 + threshold) \
+                and result['seconds'] - base['seconds'] > min_delta:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", nargs="*", default=None, help="IFC files (default: sample_models/*.ifc)")
+    parser.add_argument("--scale", type=int, default=8, help="Copies in the synthetic model (0 to skip)")
+    parser.add_argument("--store-size", type=int, default=20000, help="Vectors in the synthetic search store")
+    parser.add_argument("--dims", type=int, default=MOCK_DIMENSIONS)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="One repeat, no synthetic model, smaller store")
+    parser.add_argument("--filter", default=None, help="Only run cases whose name contains this text")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file measured on this machine")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=0.01,
+                        help="Slowdowns of fewer seconds than this are timer noise, not regressions")
+    parser.add_argument("--update-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--output", help="Also write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.repeats, args.scale, args.store_size = 1, 0, min(args.store_size, 5000)
+    models = args.models or sorted(glob.glob(os.path.join(ROOT, "sample_models", "*.ifc")))
+
+    server = start_mock_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    with tempfile.TemporaryDirectory(prefix="ifc_bench_") as work_dir:
+        if args.scale > 1 and models:
+            largest = max(models, key=os.path.getsize)
+            models = models + [scaled_model(largest, args.scale, work_dir)]
+        cases = build_cases(models, base_url, work_dir, args.store_size, args.dims)
+
+        results = {}
+        print(f"{'case':<62} {'median s':>10} {'peak MB':>9} {'vs base':>8}")
+        baseline = load_baseline(args.baseline)
+        for name, case in cases.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = case(args.repeats)
+            base = baseline.get(name)
+            change = f"{results[name]['seconds'] / base['seconds'] - 1:+.0%}" if base else "new"
+            print(f"{name:<62} {results[name]['seconds']:>10.4f} {results[name]['peak_mb']:>9.1f} {change:>8}")
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.update_baseline:
+        # Cases left out by --filter keep their stored timings
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'machine': machine(), 'results': dict(baseline, **results)}, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    if regressions:
+        print(f"\n{len(regressions)} regressions beyond {args.threshold:.0%}:")
+        for name in regressions:
+            print(f"  {name}")
+        sys.exit(1)
+    print("\nNo regressions." if baseline else "\nNo baseline yet; run with --update-baseline to store one.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import glob
+import os
+
+import streamlit as st
+
+from auth import check_password
+from src.utils.metrics import METRICS
+
+if not check_password():
+    st.stop()
+
+st.set_page_config(page_title="Diagnostics", page_icon="🩺")
+
+# Only shown to operators who start the app with IFC_DIAGNOSTICS=1
+if os.environ.get("IFC_DIAGNOSTICS") != "1":
+    st.info("This page is not available.")
+    st.stop()
+
+st.title("🩺 Diagnostics")
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    enabled = st.toggle("Collect metrics", value=METRICS.enabled,
+                        help="Off by default; can also be enabled with IFC_METRICS=1")
+    if enabled != METRICS.enabled:
+        METRICS.enable() if enabled else METRICS.disable()
+with col2:
+    if st.button("Reset metrics"):
+        METRICS.reset()
+        st.rerun()
+with col3:
+    if st.button("Profile next ingest", help="Run the next IFC ingest under cProfile"):
+        METRICS.request_profile()
+        st.success(f"The next IFC ingest will be profiled into {METRICS.profile_dir}/")
+
+snapshot = METRICS.snapshot()
+
+st.subheader("Method timings")
+timing_rows = [
+    {'method': item['labels'].get('method', ''), 'calls': item['count'],
+     'total s': item['sum'], 'mean ms': item['sum'] / item['count'] * 1000 if item['count'] else 0.0}
+    for item in snapshot['timings'].get('method_seconds', [])
+]
+if timing_rows:
+    st.dataframe(sorted(timing_rows, key=lambda row: row['total s'], reverse=True),
+                 use_container_width=True, hide_index=True)
+else:
+    st.caption("No timings recorded yet.")
+
+st.subheader("Counters")
+for name, series in sorted(snapshot['counters'].items()):
+    with st.expander(f"{name} ({sum(item['value'] for item in series):,.0f})"):
+        rows = [dict(item['labels'], value=item['value']) for item in series]
+        st.dataframe(sorted(rows, key=lambda row: row['value'], reverse=True),
+                     use_container_width=True, hide_index=True)
+if not snapshot['counters']:
+    st.caption("No counters recorded yet.")
+
+st.subheader("Caches")
+if snapshot['gauges']:
+    st.dataframe([dict(cache=name, **values) for name, values in sorted(snapshot['gauges'].items())],
+                 use_container_width=True, hide_index=True)
+else:
+    st.caption("No caches created yet.")
+
+st.subheader("Export")
+col1, col2 = st.columns(2)
+with col1:
+    st.download_button("Prometheus text", METRICS.to_prometheus(), file_name="metrics.txt", mime="text/plain")
+with col2:
+    st.download_button("JSON", METRICS.to_json(), file_name="metrics.json", mime="application/json")
+
+profiles = sorted(glob.glob(os.path.join(METRICS.profile_dir, "*.prof")), key=os.path.getmtime, reverse=True)
+if profiles:
+    st.subheader("Ingest profiles")
+    st.caption("Open with `python -m pstats <file>` or snakeviz.")
+    for path in profiles[:10]:
+        with open(path, 'rb') as f:
+            st.download_button(os.path.basename(path), f.read(), file_name=os.path.basename(path), key=path)
@@ -0,0 +1,209 @@
+"""
+Headless batch processing: IFC files -> processed JSON -> embedding stores.
+
+    python -m src.cli "drops/2024-06-01/*.ifc" --output processed --workers 8
+    python -m src.cli models/ --output processed --embeddings --model text-embedding-3-small
+
+Files whose content hash matches the manifest from an earlier run (with
+the same embedding settings and existing outputs) are skipped.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional
+
+MANIFEST_NAME = "manifest.json"
+
+
+def find_ifc_files(inputs: List[str]) -> List[str]:
+    """Expand directories (recursively) and glob patterns into a sorted list of IFC files."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(glob.glob(os.path.join(item, "**", "*.ifc"), recursive=True))
+        else:
+            files.update(path for path in glob.glob(item, recursive=True) if path.lower().endswith(".ifc"))
+    return sorted(os.path.abspath(path) for path in files)
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir: str) -> Dict[str, Any]:
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir: str, manifest: Dict[str, Any]) -> None:
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def output_stem(path: str) -> str:
+    """Output file name stem; a short path hash keeps same-named files from different folders apart."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return f"{name}_{hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]}"
+
+
+def process_file(path: str, output_dir: str, embedding_settings: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Process one IFC file in a worker: write processed JSON and, optionally, an embedding store."""
+    # Imported here so worker processes only pay for what they use
+    from src.utils.ifc_processing import IFCProcessor
+    from src.utils.metrics import METRICS
+
+    start = time.perf_counter()
+    processor = IFCProcessor()
+    with METRICS.profiled(f"ingest_{os.path.basename(path)}"):
+        data = processor.process_sample_ifc(path)
+    stem = output_stem(path)
+    json_path = processor.save_to_json(data, os.path.join(output_dir, f"{stem}.json"))
+    result = {
+        'json': os.path.basename(json_path),
+        'elements': len(data['elements']),
+        'embeddings': None
+    }
+
+    if embedding_settings:
+        from src.utils.embedding import EmbeddingProcessor
+        from src.utils.text_profiles import token_report
+
+        embedder = EmbeddingProcessor()
+        embedder.set_api_key(embedding_settings['api_key'])
+        embedder.set_model(embedding_settings['model'])
+        embedder.set_dimensions(embedding_settings.get('dimensions'))
+        texts = processor.convert_to_text_chunks(data, use_cache=False, profile=embedding_settings['profile'])
+        if texts:
+            report = token_report(texts)
+            result['tokens'] = report['tokens']
+            print(f"Embedding {path}: {report['chunks']} texts, {'' if report['exact'] else 'about '}"
+                  f"{report['tokens']:,} tokens", flush=True)
+            embedder.generate_embeddings(texts)
+            store_format = embedding_settings['format']
+            store_path = os.path.join(output_dir, f"{stem}_embeddings.{store_format}")
+            embedder.save_embeddings(store_path, format=store_format)
+            result['embeddings'] = os.path.basename(store_path)
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def is_up_to_date(entry: Optional[Dict[str, Any]], content_hash: str, settings_key: Optional[str],
+                  output_dir: str) -> bool:
+    if not entry or entry.get('hash') != content_hash or entry.get('embedding_settings') != settings_key:
+        return False
+    outputs = [entry.get('json')] + ([entry.get('embeddings')] if settings_key else [])
+    return all(name and os.path.exists(os.path.join(output_dir, name)) for name in outputs)
+
+
+def run(files: List[str], output_dir: str, workers: int, embedding_settings: Optional[Dict[str, Any]],
+        force: bool = False) -> Dict[str, Any]:
+    """Process files in parallel, skipping unchanged ones, and return throughput statistics."""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    settings_key = None
+    if embedding_settings:
+        settings_key = (f"{embedding_settings['model']}|{embedding_settings.get('dimensions')}|"
+                        f"{embedding_settings['format']}|{embedding_settings['profile']}")
+
+    start = time.perf_counter()
+    todo = []
+    skipped = 0
+    for path in files:
+        content_hash = file_hash(path)
+        if not force and is_up_to_date(manifest.get(path), content_hash, settings_key, output_dir):
+            skipped += 1
+        else:
+            todo.append((path, content_hash))
+
+    processed = failed = elements = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_file, path, output_dir, embedding_settings): (path, content_hash)
+                   for path, content_hash in todo}
+        for future in as_completed(futures):
+            path, content_hash = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"FAILED  {path}: {e}", file=sys.stderr)
+                continue
+            processed += 1
+            elements += result['elements']
+            manifest[path] = {
+                'hash': content_hash,
+                'json': result['json'],
+                'embeddings': result['embeddings'],
+                'embedding_settings': settings_key,
+                'elements': result['elements'],
+                'processed_at': time.strftime("%Y-%m-%dT%H:%M:%S")
+            }
+            # Saved after every file so an interrupted run keeps its progress
+            save_manifest(output_dir, manifest)
+            print(f"OK      {path}: {result['elements']} elements in {result['seconds']:.1f} s")
+
+    elapsed = time.perf_counter() - start
+    return {
+        'files': len(files),
+        'processed': processed,
+        'skipped': skipped,
+        'failed': failed,
+        'elements': elements,
+        'seconds': elapsed,
+        'files_per_s': processed / elapsed if elapsed else 0.0,
+        'elements_per_s': elements / elapsed if elapsed else 0.0
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch-process IFC files into JSON and embedding stores.")
+    parser.add_argument("inputs", nargs="+", help="IFC files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="processed", help="Output directory (default: processed)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--embeddings", action="store_true", help="Also generate embedding stores")
+    parser.add_argument("--model", default="text-embedding-3-small", help="OpenAI embedding model")
+    parser.add_argument("--dimensions", type=int, default=None, help="Reduced vector size (text-embedding-3 only)")
+    parser.add_argument("--format", choices=["pickle", "json"], default="pickle", help="Embedding store format")
+    parser.add_argument("--text-profile", choices=["compact", "full"], default="compact",
+                        help="How element texts are written for embedding (default: compact)")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"),
+                        help="OpenAI API key (default: $OPENAI_API_KEY)")
+    parser.add_argument("--force", action="store_true", help="Reprocess files even if unchanged")
+    args = parser.parse_args(argv)
+
+    files = find_ifc_files(args.inputs)
+    if not files:
+        print("No IFC files found.", file=sys.stderr)
+        return 1
+
+    embedding_settings = None
+    if args.embeddings:
+        if not args.api_key:
+            parser.error("--embeddings needs --api-key or OPENAI_API_KEY")
+        embedding_settings = {'api_key': args.api_key, 'model': args.model,
+                              'dimensions': args.dimensions, 'format': args.format, 'profile': args.text_profile}
+
+    stats = run(files, args.output, max(1, args.workers), embedding_settings, force=args.force)
+    print(f"\n{stats['processed']} processed, {stats['skipped']} unchanged, {stats['failed']} failed "
+          f"of {stats['files']} files in {stats['seconds']:.1f} s")
+    print(f"Throughput: {stats['files_per_s']:.2f} files/s, {stats['elements_per_s']:.0f} elements/s")
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,38 @@
+import time
 import streamlit as st
-import openai
 from typing import List, Dict, Any
+from src.utils.context_builder import ContextBuilder
+from src.utils.answer_cache import SemanticAnswerCache
+from src.utils.openai_clients import OpenAIClientManager
+from src.utils.numeric_index import NumericIndex
+from src.utils.query_engine import StructuredQueryEngine
+from src.utils.relationship_graph import RelationshipGraph
+from src.utils.file_loader import FileLoader
+from src.utils.metrics import METRICS
+from src.utils.tracing import PipelineTrace, TraceRecorder, ensure_trace
 
 class ChatTab:
     @staticmethod
-    def render(embedding_processor):
-        """Render the Chat tab."""
+    def render(embedding_processor, data=None):
+        """Render the Chat tab.
+        
+        Args:
+            embedding_processor: Processor holding the embeddings to search
+            data: Processed model data, used to answer counts and totals exactly
+        """
         st.subheader("💬 Chat with your Data")
         
-        if 'embedding_processor' in st.session_state and st.session_state.embedding_processor.embeddings:
+        if ChatTab._project_index() is not None or \
+                ('embedding_processor' in st.session_state and st.session_state.embedding_processor.embeddings):
             if 'api_key' not in st.session_state:
                 st.warning("Please set your OpenAI API key in the API Key tab first.")
             else:
-                ChatTab._show_chat_interface(embedding_processor)
+                ChatTab._show_chat_interface(embedding_processor, data)
         else:
             st.warning("Please generate or load embeddings first before using the chat feature.")
 
     @staticmethod
-    def _show_chat_interface(embedding_processor):
+    def _show_chat_interface(embedding_processor, data=None):
         """Show the chat interface."""
         st.markdown("### 🔍 Building Element Search")
         
@@ -31,6 +46,68 @@ class ChatTab:
             help="Adjust this value to control how similar elements need to be to appear in results. Lower values will return more results."
         )
         
+        context_budget = st.slider(
+            "Context Token Budget",
+            min_value=250,
+            max_value=6000,
+            value=1500,
+            step=250,
+            help="Maximum tokens of element data sent with each question. Keeps cost and latency bounded however low the threshold is."
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            stream_responses = st.toggle(
+                "Stream responses",
+                value=True,
+                key="chat_stream",
+                help="Show the answer word by word as it is generated instead of waiting for the full reply."
+            )
+        with col2:
+            show_debug = st.toggle(
+                "Show debug details",
+                value=False,
+                key="chat_debug",
+                help="Show the raw search results, the prompt sent to OpenAI and the raw reply."
+            )
+        
+        with st.expander("🧮 Exact Answers", expanded=False):
+            use_structured = st.toggle(
+                "Answer counts, totals and type lists directly from the model",
+                value=True,
+                key="chat_structured",
+                help="Questions like 'how many doors' or 'total slab area' are computed exactly from the element data, without an API call."
+            )
+            phrase_structured = st.toggle(
+                "Rephrase exact answers with the LLM",
+                value=False,
+                key="chat_phrase_structured"
+            )
+        
+        with st.expander("⚡ Answer Cache", expanded=False):
+            use_cache = st.toggle(
+                "Reuse answers to near-identical questions",
+                value=True,
+                key="chat_use_cache",
+                help="Questions close enough to an earlier one on the same embeddings skip search and the LLM."
+            )
+            cache_threshold = st.slider(
+                "Question Similarity for Cache Hits",
+                min_value=0.80,
+                max_value=1.0,
+                value=0.95,
+                step=0.01
+            )
+            answer_cache = ChatTab._answer_cache()
+            st.caption(f"{len(answer_cache)} cached answers, {answer_cache.hit_ratio:.0%} hit ratio")
+            if st.button("🗑️ Clear Cached Answers for These Embeddings",
+                         help="The cache is shared by every session; answers for other embeddings are kept."):
+                project_index = ChatTab._project_index()
+                searcher = project_index if project_index is not None else embedding_processor
+                # Cache keys start with the searched embeddings' fingerprint
+                fingerprint = searcher.fingerprint()
+                answer_cache.invalidate_where(lambda store_key: store_key[0] == fingerprint)
+        
         # Initialize chat history
         if "chat_history" not in st.session_state:
             st.session_state.chat_history = []
@@ -50,97 +127,238 @@ class ChatTab:
             
             st.chat_message("user").write(user_query)
             
-            with st.spinner("Thinking..."):
-                try:
+            trace = PipelineTrace("chat_turn", threshold=threshold, context_budget=context_budget,
+                                  stream=stream_responses)
+            try:
+                project_index = ChatTab._project_index()
+                # Exact answers only cover the loaded model, not a whole project index
+                if use_structured and data and project_index is None:
+                    with trace.stage('structured_query'):
+                        structured = ChatTab._query_engine(data).answer(user_query)
+                    if structured is not None:
+                        trace.set('route', 'structured')
+                        ChatTab._show_structured_answer(user_query, structured, phrase_structured)
+                        return
+                
+                searcher = project_index if project_index is not None else embedding_processor
+                # Answers depend on the embeddings and on the settings that shape the prompt
+                cache_key = (searcher.fingerprint(), round(threshold, 2), context_budget)
+                
+                with st.spinner("Searching..."):
+                    query_embedding = embedding_processor.embed_query(user_query, trace)
+                    with trace.stage('cache_lookup'):
+                        cached = answer_cache.lookup(cache_key, query_embedding, cache_threshold) if use_cache else None
+                trace.set('cache_hit', cached is not None)
+                
+                if cached is not None:
+                    trace.set('route', 'cache')
+                    ChatTab._show_cached_answer(cached)
+                    return
+                
+                trace.set('route', 'llm')
+                with st.spinner("Searching..."):
                     # Get initial results based on similarity
-                    relevant_results = embedding_processor.find_similar_by_threshold(
+                    # Shards are checked against the model that embedded the query
+                    shard_check = {'query_processor': embedding_processor} if project_index is not None else {}
+                    relevant_results = searcher.find_similar_by_threshold(
                         user_query,
-                        threshold=threshold
+                        threshold=threshold,
+                        query_embedding=query_embedding,
+                        trace=trace,
+                        **shard_check
                     )
                     
                     # Filter results by type
-                    filtered_results = ChatTab._filter_results_by_type(relevant_results, user_query)
-                    
-                    response = ChatTab._generate_chat_response(
+                    with trace.stage('type_filter'):
+                        filtered_results = ChatTab._filter_results_by_type(relevant_results, user_query)
+                    trace.set('filtered_results', len(filtered_results))
+                
+                with st.chat_message("assistant"):
+                    response, outcome = ChatTab._generate_chat_response(
                         user_query,
                         filtered_results,  # Pass filtered results to chat
-                        st.session_state.get("api_key")
+                        st.session_state.get("api_key"),
+                        stream=stream_responses,
+                        debug=show_debug,
+                        context_budget=context_budget,
+                        trace=trace
                     )
-                    
-                    st.session_state.chat_history.append({
-                        "role": "assistant",
-                        "content": response
-                    })
-                    
-                    st.chat_message("assistant").write(response)
-                    
-                    # Show filtered search details
-                    with st.expander("🔍 Search Details", expanded=False):
-                        st.write(f"**Found {len(filtered_results)} relevant elements:**")
-                        for i, result in enumerate(filtered_results, 1):
-                            st.write(f"**{i}.** Score: {result['similarity_score']:.3f}")
-                            # Show all data instead of just type, ID, and name
-                            st.code(result['text'])  # Display the full text with all parameters
-
-                except Exception as e:
-                    error_msg = f"Error processing query: {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.chat_history.append({
-                        "role": "assistant",
-                        "content": error_msg
-                    })
-
-    @staticmethod
-    def _generate_chat_response(user_query, search_results, api_key):
-        """Generate a conversational response using OpenAI Chat API."""
-        if not api_key:
-            st.error("API key not found. Please set your OpenAI API key first.")
-            return "API key not found. Please set your OpenAI API key first."
-        
-        # Debug info
-        st.write("🔍 Debug Info:")
-        st.write("API Key present:", bool(api_key))
-        with st.expander("Raw search results"):
-            st.json(search_results)
-        
-        # Set up OpenAI client
-        client = openai.OpenAI(api_key=api_key)
-        
-        # Create context from search results with simplified information
-        if isinstance(search_results, list):
-            # Multiple results
-            context_parts = []
-            for i, result in enumerate(search_results, 1):
-                # Extract only type, ID, and name from the full text
-                text = result['text']
-                element_type = ""
-                element_id = ""
-                element_name = ""
+                    if not isinstance(response, str):
+                        # Tokens are written as they arrive; the joined text is returned
+                        response = st.write_stream(response)
+                    else:
+                        st.write(response)
                 
-                # Parse the text to extract key information
-                parts = text.split(" | ")
-                for part in parts:
-                    if "Element Type:" in part:
-                        element_type = part
-                    elif "ID:" in part:
-                        element_id = part
-                    elif "Name:" in part:
-                        element_name = part
+                st.session_state.chat_history.append({
+                    "role": "assistant",
+                    "content": response
+                })
                 
-                # Create simplified context
-                simplified_text = f"{element_type} | {element_id} | {element_name}".strip(" | ")
-                context_parts.append(f"Element {i} (Similarity: {result['similarity_score']:.2f}): {simplified_text}")
-            
-            context = "\n\n".join(context_parts)
-            best_score = search_results[0]['similarity_score'] if search_results else 0
-        else:
+                # Only successful answers are worth reusing
+                if use_cache and outcome['success']:
+                    answer_cache.store(cache_key, user_query, query_embedding, response, filtered_results)
+                
+                ChatTab._show_search_details(filtered_results)
+
+            except Exception as e:
+                error_msg = f"Error processing query: {str(e)}"
+                trace.set('error', str(e))
+                st.error(error_msg)
+                st.session_state.chat_history.append({
+                    "role": "assistant",
+                    "content": error_msg
+                })
+            finally:
+                ChatTab._record_trace(trace)
+
+    @staticmethod
+    def _record_trace(trace):
+        """Save a finished turn's trace and show its timing breakdown."""
+        trace.finish()
+        try:
+            TraceRecorder().record(trace)
+        except OSError as e:
+            print(f"Warning: Could not write chat trace: {e}")
+        
+        with st.expander(f"⏱️ Timing Breakdown ({trace.total_ms / 1000:.2f} s)", expanded=False):
+            rows = [{"Stage": s['stage'], "Time (ms)": round(s['ms'], 1)} for s in trace.stages]
+            accounted = sum(s['ms'] for s in trace.stages)
+            rows.append({"Stage": "other (rendering, overhead)", "Time (ms)": round(max(0.0, trace.total_ms - accounted), 1)})
+            st.table(rows)
+            if trace.counters:
+                st.json(trace.counters)
+
+    @staticmethod
+    def _show_search_details(filtered_results):
+        """Show the search hits an answer was based on."""
+        with st.expander("🔍 Search Details", expanded=False):
+            st.write(f"**Found {len(filtered_results)} relevant elements:**")
+            for i, result in enumerate(filtered_results, 1):
+                source = f" | Model: {result['source']}" if 'source' in result else ""
+                st.write(f"**{i}.** Score: {result['similarity_score']:.3f}{source}")
+                # Show all data instead of just type, ID, and name
+                st.code(result['text'])  # Display the full text with all parameters
+
+    @staticmethod
+    def _query_engine(data):
+        """Structured query engine for the loaded model, built once per model and shared by sessions."""
+        # The numeric index and relationship graph are the ones the Elements tab uses
+        numeric = FileLoader.shared_derived(data, 'numeric_index', lambda: NumericIndex(data))
+        graph = FileLoader.shared_derived(data, 'relationship_graph', lambda: RelationshipGraph.from_data(data))
+        return FileLoader.shared_derived(data, 'query_engine', lambda: StructuredQueryEngine(data, numeric, graph))
+
+    @staticmethod
+    def _show_structured_answer(user_query, structured, phrase_with_llm):
+        """Render an answer computed directly from the element data."""
+        response = structured['answer']
+        with st.chat_message("assistant"):
+            if phrase_with_llm:
+                response = st.write_stream(ChatTab._phrase_structured_answer(user_query, response))
+            else:
+                st.markdown(response)
+        st.caption(f"🧮 Exact answer computed from {structured['elements']} elements, no similarity search")
+        st.session_state.chat_history.append({
+            "role": "assistant",
+            "content": response
+        })
+
+    @staticmethod
+    def _phrase_structured_answer(user_query, facts):
+        """Stream a conversational rewording of an exact answer without changing its numbers."""
+        client = OpenAIClientManager.get_client(st.session_state.get("api_key"))
+        messages = [
+            {"role": "system", "content": "You rephrase exact answers about a building model into one or two "
+                                          "friendly sentences. Keep every number and name exactly as given."},
+            {"role": "user", "content": f"Question: {user_query}\n\nExact answer:\n{facts}"}
+        ]
+        try:
+            for event in client.chat.completions.create(model="gpt-3.5-turbo", messages=messages,
+                                                        max_tokens=200, temperature=0.3, stream=True):
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+        except Exception:
+            # The exact answer is still correct without the rewording
+            yield facts
+
+    @staticmethod
+    def _show_cached_answer(cached):
+        """Render an answer served from the semantic answer cache."""
+        st.chat_message("assistant").write(cached['answer'])
+        st.caption(f"⚡ Cached answer to a similar question: \"{cached['query']}\" "
+                   f"(similarity {cached['similarity']:.2f})")
+        st.session_state.chat_history.append({
+            "role": "assistant",
+            "content": cached['answer']
+        })
+        ChatTab._show_search_details(cached['results'])
+
+    @staticmethod
+    @st.cache_resource
+    def _answer_cache():
+        """Answer cache shared by all sessions of this server process."""
+        cache = SemanticAnswerCache()
+        METRICS.register_gauge('answer_cache', lambda: {
+            'entries': len(cache), 'hits': cache.hits, 'misses': cache.misses, 'hit_ratio': cache.hit_ratio
+        })
+        return cache
+
+    @staticmethod
+    def _project_index():
+        """Return the session's project index if chat should search it."""
+        project_index = st.session_state.get('project_index')
+        if project_index is not None and len(project_index) and st.session_state.get('use_project_index'):
+            return project_index
+        return None
+
+    @staticmethod
+    def _generate_chat_response(user_query, search_results, api_key, stream=False, debug=False,
+                                context_budget=1500, trace=None):
+        """Generate a conversational response using OpenAI Chat API.
+        
+        Args:
+            user_query: The user's question
+            search_results: Search hits to answer from
+            api_key: OpenAI API key
+            stream: If True, return a generator of text chunks instead of a string
+            debug: If True, render the raw search results, prompt and reply
+            context_budget: Maximum tokens of element data sent with the question
+            trace: Optional PipelineTrace receiving context and completion timings
+        
+        Returns:
+            (response, outcome): the answer (or its chunk generator) and a dict whose
+            'success' is False when the answer is an error message; for a stream it
+            is final once the stream has been consumed
+        """
+        trace = ensure_trace(trace)
+        outcome = {'success': True}
+        if not api_key:
+            st.error("API key not found. Please set your OpenAI API key first.")
+            outcome['success'] = False
+            return "API key not found. Please set your OpenAI API key first.", outcome
+        
+        if debug:
+            st.write("🔍 Debug Info:")
+            st.write("API Key present:", bool(api_key))
+            with st.expander("Raw search results"):
+                st.json(search_results)
+        
+        # Reuse the pooled client (and its open connections) for this key
+        client = OpenAIClientManager.get_client(api_key)
+        
+        # Pack the most relevant facts from the search results into the token budget
+        if not isinstance(search_results, list):
             # Single result (backward compatibility)
-            text = search_results['text']
-            parts = text.split(" | ")
-            simplified_parts = [p for p in parts if any(key in p for key in ["Element Type:", "ID:", "Name:"])]
-            simplified_text = " | ".join(simplified_parts)
-            context = f"Element Details: {simplified_text}"
-            best_score = search_results['similarity_score']
+            search_results = [search_results]
+        with trace.stage('context_build'):
+            context_info = ContextBuilder(token_budget=context_budget).build(user_query, search_results)
+        trace.set('context_tokens', context_info['tokens'])
+        trace.set('context_elements', context_info['groups_included'])
+        context = context_info['context'] or "No matching elements found."
+        best_score = search_results[0]['similarity_score'] if search_results else 0
+        
+        if debug:
+            st.write(f"Context: {context_info['tokens']} tokens, {context_info['groups_included']} distinct "
+                     f"elements covering {context_info['hits_included']} of {context_info['hits_total']} hits")
         
         # Create system prompt
         system_prompt = """You are an expert building information assistant specializing in explaining building elements from IFC files in a natural, conversational way.
@@ -182,14 +400,12 @@ Building Information:
 Please provide a natural, conversational response that explains the relevant building elements."""}
             ]
             
-            # Print debug info about the API call
-            st.write("Making OpenAI API call...")
-            with st.expander("Request Details", expanded=True):
-                st.write("Messages being sent to OpenAI:")
-                st.json(messages)
+            if debug:
+                with st.expander("Request Details", expanded=False):
+                    st.write("Messages being sent to OpenAI:")
+                    st.json(messages)
             
-            # Make the API call
-            response = client.chat.completions.create(
+            completion_args = dict(
                 model="gpt-3.5-turbo",
                 messages=messages,
                 max_tokens=800,  # Increased for more detailed responses
@@ -198,22 +414,89 @@ Please provide a natural, conversational response that explains the relevant bui
                 frequency_penalty=0.2  # Reduce repetition
             )
             
-            generated_response = response.choices[0].message.content
+            if stream:
+                return ChatTab._stream_chat_response(client, completion_args, best_score, search_results,
+                                                     context, debug, trace, outcome), outcome
             
-            # Debug: Show the raw API response
-            with st.expander("API Response Debug"):
-                st.write("Raw API Response:")
-                st.json({"response": generated_response})
+            # Make the API call
+            with trace.stage('completion'):
+                response = client.chat.completions.create(**completion_args)
+            ChatTab._record_usage(trace, getattr(response, 'usage', None))
+            
+            generated_response = response.choices[0].message.content
             
-            # Add confidence note if similarity is low
-            if best_score < 0.5:
-                generated_response += f"\n\n*Note: The similarity score is {best_score:.2f}, which suggests this might not be a perfect match for your question. You might want to try rephrasing your query.*"
+            if debug:
+                with st.expander("API Response Debug"):
+                    st.write("Raw API Response:")
+                    st.json({"response": generated_response})
             
-            return generated_response
+            return generated_response + ChatTab._low_confidence_note(best_score), outcome
             
         except Exception as e:
-            fallback_text = context if isinstance(search_results, str) else search_results[0]['text'] if search_results else "No data found"
-            return f"Error generating response: {str(e)}. Here's the raw data I found: {fallback_text}"
+            outcome['success'] = False
+            return ChatTab._error_response(e, search_results, context), outcome
+
+    @staticmethod
+    def _stream_chat_response(client, completion_args, best_score, search_results, context, debug=False,
+                              trace=None, outcome=None):
+        """Yield the completion text chunk by chunk as the API produces it.
+        
+        On failure the error answer is yielded and ``outcome['success']`` set to False.
+        """
+        trace = ensure_trace(trace)
+        chunks = []
+        start = time.perf_counter()
+        try:
+            events = client.chat.completions.create(stream=True, stream_options={"include_usage": True},
+                                                    **completion_args)
+            for event in events:
+                if getattr(event, 'usage', None) is not None:
+                    ChatTab._record_usage(trace, event.usage)
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    if not chunks:
+                        trace.add_stage('time_to_first_token', (time.perf_counter() - start) * 1000)
+                    chunks.append(delta)
+                    yield delta
+        except Exception as e:
+            if outcome is not None:
+                outcome['success'] = False
+            yield ChatTab._error_response(e, search_results, context)
+            return
+        finally:
+            trace.add_stage('completion', (time.perf_counter() - start) * 1000)
+        
+        yield ChatTab._low_confidence_note(best_score)
+        
+        if debug:
+            with st.expander("API Response Debug"):
+                st.write("Raw API Response:")
+                st.json({"response": "".join(chunks)})
+
+    @staticmethod
+    def _record_usage(trace, usage):
+        """Copy token usage reported by the API into the trace."""
+        if usage is None:
+            return
+        trace.set('prompt_tokens', usage.prompt_tokens)
+        trace.set('completion_tokens', usage.completion_tokens)
+        METRICS.incr('api_tokens', usage.prompt_tokens, api='chat', kind='prompt')
+        METRICS.incr('api_tokens', usage.completion_tokens, api='chat', kind='completion')
+
+    @staticmethod
+    def _low_confidence_note(best_score):
+        """Note appended to answers when the best match is weak."""
+        if best_score < 0.5:
+            return f"\n\n*Note: The similarity score is {best_score:.2f}, which suggests this might not be a perfect match for your question. You might want to try rephrasing your query.*"
+        return ""
+
+    @staticmethod
+    def _error_response(error, search_results, context):
+        """Fallback answer showing the raw data when the completion call fails."""
+        fallback_text = search_results[0]['text'] if search_results else "No data found"
+        return f"Error generating response: {str(error)}. Here's the raw data I found: {fallback_text}"
     
     @staticmethod
     def _filter_results_by_type(results: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
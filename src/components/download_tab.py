@@ -1,6 +1,14 @@
 import streamlit as st
 import os
 from src.utils.ifc_processing import IFCProcessor
+from src.utils.file_loader import FileLoader
+from src.utils.json_stream import preview
+
+EXPORT_FORMATS = {
+    "JSON": ('json', '.json', "application/json"),
+    "NDJSON (one element per line)": ('ndjson', '.ndjson', "application/x-ndjson"),
+    "Columnar (binary, fast to reload)": ('columnar', '.ifccol', "application/octet-stream")
+}
 
 class DownloadTab:
     @staticmethod
@@ -9,38 +17,63 @@ class DownloadTab:
         if data.get('file_info', {}).get('type') == 'IFC':
             DownloadTab._render_ifc_download(data)
         else:
-            st.json(data)
+            st.json(preview(data))
 
     @staticmethod
     def _render_ifc_download(data):
         """Render IFC file download options."""
         try:
-            processor = IFCProcessor()
-            json_string = processor.get_json_string(data)
+            st.write("### Download Processed IFC Data")
+            st.write("Download the processed IFC data for use in other applications. "
+                     "Columnar files can be loaded back into this app much faster than JSON.")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                format_label = st.radio("Format", list(EXPORT_FORMATS), horizontal=True)
+            with col2:
+                compress = st.checkbox("Compress (gzip)", value=False)
+            export_format, extension, mime = EXPORT_FORMATS[format_label]
+            
+            # Serialised once per model and format, not on every rerun
+            export_bytes = FileLoader.shared_derived(
+                data, f"export_{export_format}{'_gz' if compress else ''}",
+                lambda: IFCProcessor().get_export_bytes(data, export_format, compress))
             
             # Generate filename for download
             original_name = data.get('file_info', {}).get('name', 'processed_ifc')
-            download_filename = DownloadTab._generate_download_filename(original_name)
+            download_filename = DownloadTab._generate_download_filename(original_name, extension)
+            if compress and export_format != 'columnar':
+                download_filename += ".gz"
+                mime = "application/gzip"
             
-            st.write("### Download Processed IFC Data")
-            st.write("Download the processed IFC data in JSON format for use in other applications.")
             st.download_button(
-                label="📥 Download as JSON",
-                data=json_string,
+                label=f"📥 Download as {format_label.split(' ')[0]} ({len(export_bytes) / 1024:.1f} KB)",
+                data=export_bytes,
                 file_name=download_filename,
-                mime="application/json",
-                help="Download the processed IFC data in JSON format"
+                mime=mime,
+                help="Download the processed IFC data"
             )
             
-            # Show preview of the JSON
-            st.write("### JSON Preview")
-            st.json(data)
+            DownloadTab._render_preview(data)
         except Exception as e:
             st.error(f"Error preparing download: {e}")
 
     @staticmethod
-    def _generate_download_filename(original_name):
+    def _render_preview(data, default_elements=20):
+        """Show the file info, summary and the first elements instead of the whole model."""
+        st.write("### JSON Preview")
+        elements = data.get('elements', [])
+        count = st.number_input("Elements to preview", min_value=0, max_value=max(len(elements), 0),
+                                value=min(default_elements, len(elements)), step=10)
+        preview = {key: value for key, value in data.items() if key != 'elements'}
+        preview['elements'] = elements[:count]
+        st.json(preview)
+        if count < len(elements):
+            st.caption(f"Showing {count} of {len(elements)} elements; download the file for all of them.")
+
+    @staticmethod
+    def _generate_download_filename(original_name, extension='.json'):
         """Generate a download filename based on the original name."""
         if original_name.endswith('.ifc'):
-            return original_name.replace('.ifc', '_processed.json')
-        return f"{original_name}_processed.json"
+            return original_name.replace('.ifc', f'_processed{extension}')
+        return f"{original_name}_processed{extension}"
@@ -1,4 +1,17 @@
+import numpy as np
 import streamlit as st
+from collections.abc import Sequence
+from itertools import groupby
+from src.utils import type_objects
+from src.utils.element_index import ElementIndex
+from src.utils.file_loader import FileLoader
+from src.utils.json_stream import describe, preview
+from src.utils.numeric_index import NumericIndex, from_si, to_si
+from src.utils.relationship_graph import KIND_LABELS, RelationshipGraph
+
+PAGE_SIZES = [25, 50, 100, 200]
+# Related elements listed per relationship kind before summarising the rest
+MAX_RELATED = 20
 
 class ElementsTab:
     @staticmethod
@@ -19,6 +32,8 @@ class ElementsTab:
             st.warning("No elements found in the IFC file.")
             return
         
+        index = ElementsTab._element_index(data)
+        
         # Add element type filter
         element_types = data.get('summary', {}).get('element_types', [])
         selected_type = st.selectbox("Filter by Element Type", ["All"] + element_types)
@@ -26,50 +41,119 @@ class ElementsTab:
         # Add search box
         search_query = st.text_input("Search elements", "")
         
-        # Display elements with filtering and search
-        filtered_count = ElementsTab._display_filtered_elements(
-            elements, selected_type, search_query)
+        matches = index.search(search_query, None if selected_type == "All" else selected_type)
+        matches = ElementsTab._apply_numeric_filter(data, matches)
+        filtered_count = len(matches)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.selectbox("Elements per page", PAGE_SIZES, index=1)
+        with col2:
+            page_count = ElementIndex.page_count(filtered_count, page_size)
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1)
+        
+        # Display only the current page of matching elements
+        ElementsTab._display_filtered_elements(elements, ElementIndex.page(matches, page, page_size),
+                                               ElementsTab._relationship_graph(data), data.get('types'))
         
         # Show statistics
         st.sidebar.write(f"Showing {filtered_count} of {len(elements)} elements")
 
     @staticmethod
-    def _display_filtered_elements(elements, selected_type, search_query):
-        """Display filtered elements and return count."""
-        filtered_count = 0
-        for element in elements:
+    def _element_index(data):
+        """Search index for the loaded model, built once per model and shared by sessions."""
+        return FileLoader.shared_derived(data, 'element_index',
+                                         lambda: ElementIndex(data.get('elements', []), data.get('types')))
+
+    @staticmethod
+    def _numeric_index(data):
+        """SI-normalised property values for range filters, built once per model and shared by sessions."""
+        return FileLoader.shared_derived(data, 'numeric_index', lambda: NumericIndex(data))
+
+    @staticmethod
+    def _apply_numeric_filter(data, matches):
+        """Property picker and min/max inputs (in the project's units); returns the matches in range."""
+        numeric = ElementsTab._numeric_index(data)
+        if not len(numeric):
+            return matches
+        keys = {f"{pset} › {prop}": (pset, prop) for pset, prop in numeric.keys()}
+        selected = st.selectbox("Filter by numeric property", ["None"] + list(keys))
+        if selected == "None":
+            return matches
+        key = keys[selected]
+        unit, scale = numeric.project_unit(numeric.si_units[key])
+        low, high = (from_si(value, scale) for value in numeric.bounds(key))
+        suffix = f" ({unit})" if unit else ""
+        col1, col2 = st.columns(2)
+        with col1:
+            minimum = st.number_input(f"Minimum{suffix}", value=low, key=f"numeric_min_{selected}")
+        with col2:
+            maximum = st.number_input(f"Maximum{suffix}", value=high, key=f"numeric_max_{selected}")
+        ids, _ = numeric.range(key, to_si(minimum, scale), to_si(maximum, scale))
+        return np.intersect1d(matches, np.array(ids, dtype=np.int32))
+
+    @staticmethod
+    def _relationship_graph(data):
+        """Relationship graph stored with the model (None for models processed without one)."""
+        return FileLoader.shared_derived(data, 'relationship_graph', lambda: RelationshipGraph.from_data(data))
+
+    @staticmethod
+    def _display_filtered_elements(elements, indices, graph=None, types=None):
+        """Display the elements at the given indices."""
+        for i in indices:
             try:
-                if ElementsTab._should_display_element(element, selected_type, search_query):
-                    filtered_count += 1
-                    ElementsTab._display_element(element)
+                ElementsTab._display_element(elements[i], int(i), elements, graph, types)
             except Exception as e:
                 st.error(f"Error displaying element: {str(e)}")
                 continue
-        return filtered_count
-
-    @staticmethod
-    def _should_display_element(element, selected_type, search_query):
-        """Check if element should be displayed based on filters."""
-        return (selected_type == "All" or element.get('type') == selected_type) and \
-               (not search_query or search_query.lower() in str(element).lower())
 
     @staticmethod
-    def _display_element(element):
+    def _display_element(element, position, elements=None, graph=None, types=None):
         """Display a single element."""
         with st.expander(f"{element.get('type', 'Unknown')} - {element.get('name', 'Unnamed')}"):
             st.write("**ID:** ", element.get('id', 'No ID'))
             if element.get('description'):
                 st.write("**Description:** ", element['description'])
             
-            ElementsTab._display_properties(element)
-            ElementsTab._display_geometry(element)
+            # Property sets are only rendered for the elements a user opens up
+            psets = len(type_objects.effective_properties(element, types))
+            if st.toggle(f"Show details ({psets} property sets)", key=f"element_details_{position}"):
+                ElementsTab._display_properties(element, types)
+                ElementsTab._display_geometry(element)
+                if graph is not None and elements is not None:
+                    ElementsTab._display_relationships(elements, graph, position)
 
     @staticmethod
-    def _display_properties(element):
-        """Display element properties."""
-        if element.get('properties'):
-            for ps_name, properties in element['properties'].items():
-                st.write(f"**{ps_name}**")
+    def _display_relationships(elements, graph, position):
+        """List the elements and type object related to an element, per kind of relationship."""
+        edges = graph.edges(position)
+        if not edges:
+            return
+        st.write("**Relationships**")
+        for kind, group in groupby(edges, key=lambda edge: edge[0]):
+            nodes = [node for _, node in group]
+            labels = []
+            for node in nodes[:MAX_RELATED]:
+                if graph.is_type(node):
+                    info = graph.type_info(node)
+                    labels.append(f"{info['type']} {info['name']}".strip())
+                else:
+                    labels.append(f"{elements[node].get('type', 'Unknown')} {elements[node].get('name') or 'Unnamed'}")
+            more = f" and {len(nodes) - MAX_RELATED} more" if len(nodes) > MAX_RELATED else ""
+            st.write(f"- {KIND_LABELS[kind]}: {', '.join(labels)}{more}")
+
+    @staticmethod
+    def _display_properties(element, types=None):
+        """Display element properties, including those it inherits from its type object."""
+        all_properties = type_objects.effective_properties(element, types)
+        type_entry = type_objects.type_of(element, types)
+        own = element.get('properties') or {}
+        if all_properties:
+            for ps_name, properties in all_properties.items():
+                if type_entry and ps_name not in own:
+                    st.write(f"**{ps_name}** (from type {type_entry['name'] or type_entry['type']})")
+                else:
+                    st.write(f"**{ps_name}**")
                 for prop_name, prop_data in properties.items():
                     value = prop_data.get('value', '')
                     unit = prop_data.get('unit', '')
@@ -93,26 +177,64 @@ class ElementsTab:
         
         if isinstance(data, dict):
             ElementsTab._display_dict_data(data)
-        elif isinstance(data, list):
+        elif ElementsTab._is_array(data):
             ElementsTab._display_list_data(data)
         else:
             st.json(data)
 
     @staticmethod
     def _display_dict_data(data):
-        """Display dictionary data."""
-        search_query = st.text_input("Search in JSON", "")
-        for key, value in data.items():
-            if not search_query or search_query.lower() in str(key).lower() or \
-               search_query.lower() in str(value).lower():
-                with st.expander(f"Key: {key}"):
-                    st.json(value)
+        """Display dictionary data, one page of top-level keys at a time."""
+        search_query = st.text_input("Search in JSON", "").lower()
+        keys = [key for key, value in data.items()
+                if not search_query or search_query in str(key).lower() or
+                (not ElementsTab._is_lazy(value) and search_query in str(value).lower())]
+        if search_query and any(ElementsTab._is_lazy(value) for value in data.values()):
+            st.caption("Large arrays are searched by key name only; open them to page through their items.")
+        for key in ElementsTab._page_of(keys, "json_keys"):
+            value = data[key]
+            with st.expander(f"Key: {key} ({describe(value)})"):
+                ElementsTab._display_json_value(value, f"json_value_{key}")
 
     @staticmethod
     def _display_list_data(data):
-        """Display list data."""
-        search_query = st.text_input("Search in list items", "")
-        for i, item in enumerate(data):
-            if not search_query or search_query.lower() in str(item).lower():
-                with st.expander(f"Item {i+1}"):
-                    st.json(item)
+        """Display list data, one page of items at a time."""
+        search_query = st.text_input("Search in list items", "").lower()
+        if search_query:
+            # Items are visited one by one, so large streamed arrays are never held whole
+            indices = [i for i, item in enumerate(data) if search_query in str(item).lower()]
+        else:
+            indices = range(len(data))
+        for i in ElementsTab._page_of(indices, "json_items"):
+            with st.expander(f"Item {i+1}"):
+                st.json(preview(data[i]))
+
+    @staticmethod
+    def _display_json_value(value, key):
+        """Show a value; long arrays get their own page controls."""
+        if ElementsTab._is_array(value) and len(value) > PAGE_SIZES[0]:
+            for i in ElementsTab._page_of(range(len(value)), key):
+                st.json({f"[{i}]": preview(value[i])})
+        else:
+            st.json(preview(value))
+
+    @staticmethod
+    def _page_of(items, key):
+        """Page size and number inputs for a list of items; returns the current page."""
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.selectbox("Per page", PAGE_SIZES, key=f"{key}_page_size")
+        with col2:
+            page_count = ElementIndex.page_count(len(items), page_size)
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1,
+                                   key=f"{key}_page")
+        return ElementIndex.page(items, page, page_size)
+
+    @staticmethod
+    def _is_array(value):
+        return isinstance(value, Sequence) and not isinstance(value, (str, bytes))
+
+    @staticmethod
+    def _is_lazy(value):
+        """Streamed arrays that are decoded from their source on access."""
+        return ElementsTab._is_array(value) and not isinstance(value, list)
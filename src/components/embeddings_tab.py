@@ -1,49 +1,162 @@
 import streamlit as st
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from sklearn.manifold import TSNE
 import os
+from src.utils.embedding_jobs import EmbeddingJobManager
+from src.utils.text_profiles import PROFILE_LABELS
 
 class EmbeddingsTab:
     @staticmethod
     def render(embedding_processor):
-        """Render the Generate & Manage Embeddings tab."""
+        """Render the Generate & Manage Embeddings tab.
+        
+        Returns the chosen settings ('model', 'dimensions', 'search_dimensions'),
+        which are applied to the processor only when a job is started, so a
+        store loaded with other settings is left as it is.
+        """
         if 'api_key' not in st.session_state:
             st.warning("Please set your OpenAI API key in the API Key tab first.")
             return
             
         # Add model selection
         embedding_models = embedding_processor.get_available_models()
+        model_names = list(embedding_models.keys())
         selected_model = st.selectbox(
             "Select Embedding Model:",
-            list(embedding_models.keys()),
-            index=0,
+            model_names,
+            index=model_names.index(embedding_processor.model) if embedding_processor.model in model_names else 0,
             help="Choose the OpenAI embedding model to use"
         )
         st.info(f"Model Info: {embedding_models[selected_model]}")
         
-        return selected_model
+        settings = {'model': selected_model, 'dimensions': None, 'search_dimensions': None}
+        settings.update(EmbeddingsTab._render_dimension_options(embedding_processor, selected_model))
+        return settings
+
+    @staticmethod
+    def _render_dimension_options(embedding_processor, selected_model):
+        """Render reduced-dimension storage and search options, starting from the processor's."""
+        if selected_model not in embedding_processor.REDUCIBLE_MODELS:
+            return {}
+        
+        native = embedding_processor.MODEL_DIMENSIONS[selected_model]
+        choices = ["Full"] + [d for d in (256, 512, 1024) if d < native]
+        stored_index = choices.index(embedding_processor.dimensions) if embedding_processor.dimensions in choices else 0
+        search_index = choices.index(embedding_processor.search_dimensions) \
+            if embedding_processor.search_dimensions in choices else 0
+        with st.expander("⚙️ Reduced dimensions", expanded=False):
+            stored = st.selectbox(
+                "Stored vector dimensions",
+                choices,
+                index=stored_index,
+                help="Ask the API for shorter vectors. Smaller stores, but no full vectors to re-rank with."
+            )
+            search = st.selectbox(
+                "Search index dimensions",
+                choices,
+                index=search_index,
+                help="Search a truncated index and re-rank the top candidates with the stored vectors."
+            )
+        return {'dimensions': None if stored == "Full" else stored,
+                'search_dimensions': None if search == "Full" else search}
 
     @staticmethod
-    def process_and_generate(texts, embedding_processor, selected_model, openai_api_key):
-        """Process texts and generate embeddings."""
-        if texts and openai_api_key and st.button("🚀 Generate Embeddings"):
+    @st.cache_resource
+    def _job_manager():
+        """Background embedding job manager shared by all sessions."""
+        return EmbeddingJobManager()
+
+    @staticmethod
+    def select_text_profile():
+        """Let the user choose how element texts are written for embedding."""
+        return st.selectbox(
+            "Text profile:",
+            list(PROFILE_LABELS),
+            format_func=PROFILE_LABELS.get,
+            help="Compact texts name each property set once and leave out empty and repeated values, "
+                 "so embedding takes fewer tokens."
+        )
+
+    @staticmethod
+    def show_token_report(report, element_count):
+        """Show how many chunks and tokens are about to be embedded."""
+        approx = "" if report['exact'] else "about "
+        st.write(f"Found {element_count} elements to process: {report['chunks']} text chunks, "
+                 f"{approx}{report['tokens']:,} tokens (largest chunk {approx}{report['max_tokens']:,})")
+
+    @staticmethod
+    def process_and_generate(texts, embedding_processor, settings, openai_api_key):
+        """Process texts and generate embeddings in a background job.
+        
+        ``settings`` (from render) are applied to the processor when the job starts.
+        """
+        if not texts or not openai_api_key or not settings:
+            return
+        manager = EmbeddingsTab._job_manager()
+        job_id = manager.job_id(texts, settings['model'], settings['dimensions'])
+        status = manager.status(job_id)
+        
+        if status is not None and status['state'] in ('failed', 'cancelled', 'interrupted') \
+                and job_id != st.session_state.get('embedding_job_id'):
+            st.info(f"An earlier run embedded {status['batches_done']} of {status['batches_total']} batches "
+                    "for these elements. Generating resumes from there.")
+        
+        if st.button("🚀 Generate Embeddings"):
             try:
-                with st.spinner("Generating embeddings..."):
-                    progress_bar = st.progress(0)
-                    embeddings = embedding_processor.generate_embeddings(
-                        texts,
-                        progress_callback=progress_bar.progress
-                    )
-                    st.session_state['texts'] = texts
-                    st.success(f"✨ Generated {len(embeddings)} embeddings using {selected_model}!")
-                    
-                    EmbeddingsTab._handle_save_options(embedding_processor)
-                    EmbeddingsTab._show_query_section(embedding_processor)
-                    
+                embedding_processor.set_model(settings['model'])
+                embedding_processor.set_dimensions(settings['dimensions'])
+                embedding_processor.set_search_dimensions(settings['search_dimensions'])
+                st.session_state.embedding_job_id = manager.start(embedding_processor, texts)
+                st.session_state.embedding_job_loaded = None
             except Exception as e:
                 st.error(f"Error generating embeddings: {str(e)}")
+                return
+        
+        if st.session_state.get('embedding_job_id') == job_id:
+            EmbeddingsTab._show_job_progress(job_id, texts, embedding_processor, settings['model'])
+
+    @staticmethod
+    @st.fragment(run_every=1.0)
+    def _poll_job(job_id):
+        """Show a running job's progress and Cancel button, rerunning the app once it stops."""
+        manager = EmbeddingsTab._job_manager()
+        status = manager.status(job_id)
+        if status is None or status['state'] != 'running':
+            st.rerun()
+        done, total = status['batches_done'], status['batches_total']
+        eta = f", about {status['eta_s']:.0f} s left" if status['eta_s'] is not None else ""
+        st.progress(done / total if total else 1.0,
+                    text=f"Generating embeddings: batch {done} of {total}{eta}. You can keep using the other tabs.")
+        if st.button("⏹️ Cancel", key=f"cancel_{job_id}"):
+            manager.cancel(job_id)
+
+    @staticmethod
+    def _show_job_progress(job_id, texts, embedding_processor, selected_model):
+        """Poll a background embedding job and install its results once it finishes."""
+        if st.session_state.get('embedding_job_loaded') == job_id:
+            # Installed in the processor; the job itself was removed when its result was collected
+            st.success(f"✨ Generated {len(embedding_processor.embeddings)} embeddings using {selected_model}!")
+            
+            EmbeddingsTab._handle_save_options(embedding_processor)
+            EmbeddingsTab._show_query_section(embedding_processor)
+            return
+        
+        manager = EmbeddingsTab._job_manager()
+        status = manager.status(job_id)
+        if status is None:
+            return
+        
+        if status['state'] == 'running':
+            # Only the progress fragment reruns while the job is running
+            EmbeddingsTab._poll_job(job_id)
+        elif status['state'] == 'done':
+            embedding_processor.set_embeddings(texts, manager.result(job_id))
+            st.session_state['texts'] = texts
+            st.session_state.embedding_job_loaded = job_id
+            # Other tabs (chat, visualisation) need the new embeddings
+            st.rerun()
+        else:
+            st.error(f"Embedding job {status['state']} after {status['batches_done']} of "
+                     f"{status['batches_total']} batches: {status['error'] or 'stopped'}. "
+                     "Press Generate to resume from the last checkpoint.")
 
     @staticmethod
     def _handle_save_options(embedding_processor):
@@ -79,8 +192,8 @@ class EmbeddingsTab:
     def show_text_descriptions(texts):
         """Show text descriptions for embeddings."""
         st.write("### Text Descriptions")
-        st.write("Below are the text descriptions that will be used for embeddings. Each description includes all available properties of the building element.")
+        st.write("Below are the text descriptions that will be used for embeddings. Type objects get their own description, and elements too long for the embedding model are split over several.")
         
         for i, text in enumerate(texts):
-            with st.expander(f"Element {i+1}"):
+            with st.expander(f"Text {i+1}"):
                 st.write(text)
@@ -1,9 +1,13 @@
 import streamlit as st
 import os
+import tempfile
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from sklearn.manifold import TSNE
+from src.utils.context_builder import parse_element_text
+from src.utils.project_index import ProjectIndex
+from src.utils.projection import ProjectionService, METHODS
+from src.utils.similarity_stats import (
+    similarity_statistics, stratified_sample, sampled_similarity, type_mean_similarity, element_types
+)
 
 class LoadEmbeddingsTab:
     @staticmethod
@@ -19,6 +23,7 @@ class LoadEmbeddingsTab:
             return
             
         LoadEmbeddingsTab._handle_file_upload(embedding_processor)
+        LoadEmbeddingsTab._render_project_index(embedding_processor)
         
         if embedding_processor.embeddings:
             LoadEmbeddingsTab._show_embeddings_info(embedding_processor)
@@ -46,6 +51,49 @@ class LoadEmbeddingsTab:
                 except Exception as e:
                     st.error(f"Error loading embeddings: {str(e)}")
 
+    @staticmethod
+    def _render_project_index(embedding_processor):
+        """Manage the project index that lets chat search many models at once."""
+        st.write("### 🗂️ Project Index")
+        st.write("Combine the embedding stores of several models (architectural, structural, MEP...) "
+                 "so one chat query covers the whole project. Stores are loaded only when searched.")
+        
+        if 'project_index' not in st.session_state:
+            st.session_state.project_index = ProjectIndex()
+            st.session_state.project_index_dir = tempfile.mkdtemp(prefix="ifc_project_index_")
+        project_index = st.session_state.project_index
+        
+        budget = st.number_input("Memory budget (MB)", min_value=16, value=512, step=64,
+                                 help="Least recently used stores are unloaded above this budget.")
+        project_index.memory_budget_bytes = int(budget * 1024 * 1024)
+        
+        uploaded_files = st.file_uploader("Add embedding stores to the project", type=['pickle', 'json'],
+                                          accept_multiple_files=True, key="project_stores")
+        if uploaded_files and st.button("➕ Add to Project"):
+            for uploaded_file in uploaded_files:
+                format_type = "pickle" if uploaded_file.name.endswith('.pickle') else "json"
+                path = os.path.join(st.session_state.project_index_dir, uploaded_file.name)
+                with open(path, 'wb') as f:
+                    f.write(uploaded_file.getvalue())
+                project_index.add_shard(os.path.splitext(uploaded_file.name)[0], path, format=format_type)
+            st.success(f"Added {len(uploaded_files)} stores to the project.")
+        
+        if embedding_processor.embeddings:
+            source = st.text_input("Name for the current embeddings", "current_model")
+            if st.button("➕ Add Current Embeddings to Project"):
+                project_index.add_processor(source, embedding_processor, st.session_state.project_index_dir)
+                st.success(f"Added '{source}' to the project.")
+        
+        if len(project_index):
+            loaded = set(project_index.loaded_sources)
+            for source, shard in project_index.shards.items():
+                status = f"{shard['count']} vectors, {shard['model']}" if source in loaded else "not loaded"
+                st.write(f"- **{source}** ({status})")
+            st.caption(f"{len(loaded)} of {len(project_index)} stores in memory, "
+                       f"{project_index.memory_usage_bytes / (1024 * 1024):.1f} MB")
+            st.session_state.use_project_index = st.checkbox(
+                "Search the whole project in Chat", value=st.session_state.get('use_project_index', True))
+
     @staticmethod
     def _show_query_interface(embedding_processor):
         """Show query interface for loaded embeddings."""
@@ -67,41 +115,98 @@ class LoadEmbeddingsTab:
     @staticmethod
     def _show_visualization_options(embedding_processor):
         """Show visualization options for embeddings."""
-        import numpy as np
-        import plotly.express as px
-        from sklearn.manifold import TSNE
-
         st.write("### 📈 Visualize Embeddings")
         viz_type = st.selectbox("Choose Visualization Method", ["2D Plot", "3D Plot", "Similarity Matrix"])
-        
-        embeddings_array = np.array(embedding_processor.embeddings)
-        
-        # Compute similarity matrix
-        with st.spinner("Computing similarity matrix..."):
-            similarity_matrix = np.dot(embeddings_array, embeddings_array.T)
-            norms = np.linalg.norm(embeddings_array, axis=1)
-            similarity_matrix /= np.outer(norms, norms)
+        fingerprint = embedding_processor.fingerprint()
         
         if viz_type in ["2D Plot", "3D Plot"]:
-            LoadEmbeddingsTab._show_dimensional_plot(embeddings_array, embedding_processor.texts, viz_type)
+            LoadEmbeddingsTab._show_dimensional_plot(fingerprint, embedding_processor, viz_type)
         else:
-            LoadEmbeddingsTab._show_similarity_matrix(similarity_matrix)
+            LoadEmbeddingsTab._show_similarity_matrix(fingerprint, embedding_processor)
         
-        LoadEmbeddingsTab._show_statistics(similarity_matrix, embedding_processor)
+        LoadEmbeddingsTab._show_statistics(fingerprint, embedding_processor)
+
+    @staticmethod
+    @st.cache_data(max_entries=8, show_spinner=False)
+    def _similarity_summary(fingerprint, _embeddings):
+        """Blocked pairwise statistics for an embedding store, cached by its fingerprint."""
+        # Offloaded stores expose their memory-mapped matrix directly
+        return similarity_statistics(np.asarray(getattr(_embeddings, 'matrix', _embeddings), dtype=np.float32))
+
+    @staticmethod
+    @st.cache_data(max_entries=8, show_spinner=False)
+    def _similarity_heatmap(fingerprint, mode, max_points, _embeddings, _texts):
+        """Heatmap values and axis labels for a sample or per-type means, cached by fingerprint."""
+        matrix = np.asarray(getattr(_embeddings, 'matrix', _embeddings), dtype=np.float32)
+        types = element_types(_texts)
+        if mode == "Per-type means":
+            means = type_mean_similarity(matrix, types)
+            labels = [f"{name} ({size})" for name, size in zip(means['labels'], means['sizes'])]
+            return means['similarity'], labels
+        indices = stratified_sample(types, max_points=max_points)
+        labels = [f"{types[i]} #{i + 1}" for i in indices]
+        return sampled_similarity(matrix, indices), labels
+
+    @staticmethod
+    @st.cache_resource
+    def _projection_service():
+        """Background projection worker shared by all sessions."""
+        return ProjectionService()
 
     @staticmethod
-    def _show_dimensional_plot(embeddings_array, texts, viz_type):
+    def _show_dimensional_plot(fingerprint, embedding_processor, viz_type):
         """Show 2D or 3D plot of embeddings."""
         n_components = 3 if viz_type == "3D Plot" else 2
-        with st.spinner("Reducing dimensionality..."):
-            tsne = TSNE(n_components=n_components, random_state=42)
-            embeddings_reduced = tsne.fit_transform(embeddings_array)
+        method_label = st.radio("Projection", list(METHODS), horizontal=True,
+                                help="PCA is near-instant; t-SNE separates clusters better but takes longer.")
+        key = (fingerprint, METHODS[method_label], n_components)
+        
+        embeddings = embedding_processor.embeddings
+        matrix = getattr(embeddings, 'matrix', embeddings)
+        # Runs at most once per store, method and dimensions; reruns only poll
+        LoadEmbeddingsTab._projection_service().submit(key, matrix)
+        LoadEmbeddingsTab._render_projection(key, matrix, embedding_processor.texts, viz_type)
+
+    @staticmethod
+    @st.fragment(run_every=1.0)
+    def _poll_projection(key):
+        """Poll a running projection, rerunning the app once it has finished."""
+        if LoadEmbeddingsTab._projection_service().status(key) != "running":
+            st.rerun()
+        st.info("⏳ Computing projection in the background. You can keep using the other tabs.")
+
+    @staticmethod
+    def _render_projection(key, matrix, texts, viz_type):
+        """Plot a finished projection; while it is computed, only a polling fragment reruns."""
+        service = LoadEmbeddingsTab._projection_service()
+        status = service.status(key)
+        if status == "running":
+            LoadEmbeddingsTab._poll_projection(key)
+            return
+        if status != "done":
+            # Kept failed until retried, so a projection that cannot succeed is not recomputed on every rerun
+            st.error(f"Projection failed: {service.error(key)}. Retry, or try the PCA quick look instead.")
+            if st.button("🔄 Retry projection"):
+                service.submit(key, matrix, retry=True)
+                st.rerun()
+            return
+        
+        import plotly.express as px
+        
+        embeddings_reduced = service.result(key)
+        types = element_types(texts)
+        fields = [parse_element_text(text)['fields'] for text in texts]
+        names = [f.get('Name') or f"Element {i + 1}" for i, f in enumerate(fields)]
+        ids = [f.get('ID', '') for f in fields]
         
         if viz_type == "2D Plot":
             fig = px.scatter(
                 x=embeddings_reduced[:, 0],
                 y=embeddings_reduced[:, 1],
-                hover_name=[f"Element {i+1}" for i in range(len(texts))],
+                color=types,
+                hover_name=names,
+                hover_data={'ID': ids},
+                labels={'color': "Element Type"},
                 title="2D Visualization of Embeddings"
             )
         else:
@@ -109,35 +214,64 @@ class LoadEmbeddingsTab:
                 x=embeddings_reduced[:, 0],
                 y=embeddings_reduced[:, 1],
                 z=embeddings_reduced[:, 2],
-                hover_name=[f"Element {i+1}" for i in range(len(texts))],
+                color=types,
+                hover_name=names,
+                hover_data={'ID': ids},
+                labels={'color': "Element Type"},
                 title="3D Visualization of Embeddings"
             )
         st.plotly_chart(fig, use_container_width=True)
 
     @staticmethod
-    def _show_similarity_matrix(similarity_matrix):
-        """Show similarity matrix visualization."""
+    def _show_similarity_matrix(fingerprint, embedding_processor):
+        """Show a similarity heatmap over a stratified sample or per-type cluster means."""
+        col1, col2 = st.columns(2)
+        with col1:
+            mode = st.radio("Heatmap of", ["Stratified sample", "Per-type means"], horizontal=True)
+        with col2:
+            max_points = st.slider("Sample size", 50, 500, 200, step=50, disabled=mode != "Stratified sample")
+        
+        with st.spinner("Computing similarities..."):
+            similarity, labels = LoadEmbeddingsTab._similarity_heatmap(
+                fingerprint, mode, max_points, embedding_processor.embeddings, embedding_processor.texts)
+        
+        import plotly.express as px
         fig = px.imshow(
-            similarity_matrix,
+            similarity,
+            x=labels,
+            y=labels,
             title="Similarity Matrix of Embeddings",
             labels=dict(color="Cosine Similarity"),
             color_continuous_scale="RdBu"
         )
         st.plotly_chart(fig, use_container_width=True)
+        if mode == "Stratified sample" and len(labels) < len(embedding_processor.embeddings):
+            st.caption(f"{len(labels)} of {len(embedding_processor.embeddings)} embeddings, "
+                       "sampled in proportion to each element type")
 
     @staticmethod
-    def _show_statistics(similarity_matrix, embedding_processor):
+    def _show_statistics(fingerprint, embedding_processor):
         """Show statistics about embeddings."""
         st.write("### 📊 Embedding Statistics")
+        with st.spinner("Computing similarity statistics..."):
+            stats = LoadEmbeddingsTab._similarity_summary(fingerprint, embedding_processor.embeddings)
         col1, col2 = st.columns(2)
         with col1:
             st.metric("Number of Embeddings", len(embedding_processor.embeddings))
             st.metric("Vector Dimension", len(embedding_processor.embeddings[0]))
         with col2:
-            similarity_stats = {
-                "Min Similarity": np.min(similarity_matrix[np.triu_indices(len(similarity_matrix), k=1)]),
-                "Max Similarity": np.max(similarity_matrix[np.triu_indices(len(similarity_matrix), k=1)]),
-                "Avg Similarity": np.mean(similarity_matrix[np.triu_indices(len(similarity_matrix), k=1)])
-            }
-            for label, value in similarity_stats.items():
-                st.metric(label, f"{value:.3f}")
+            if stats['pairs']:
+                similarity_stats = {
+                    "Min Similarity": stats['min'],
+                    "Max Similarity": stats['max'],
+                    "Avg Similarity": stats['mean']
+                }
+                for label, value in similarity_stats.items():
+                    st.metric(label, f"{value:.3f}")
+        if stats['pairs']:
+            import plotly.express as px
+            centers = (stats['bin_edges'][:-1] + stats['bin_edges'][1:]) / 2
+            fig = px.bar(x=centers, y=stats['histogram'],
+                         labels={'x': "Cosine Similarity", 'y': "Pairs"},
+                         title=f"Distribution of {stats['pairs']:,} Pairwise Similarities")
+            st.plotly_chart(fig, use_container_width=True)
@@ -1,4 +1,8 @@
 import streamlit as st
+from collections.abc import Sequence
+from src.utils.json_stream import describe, preview
+
+MAX_LISTED_KEYS = 50
 
 class OverviewTab:
     @staticmethod
@@ -19,6 +23,9 @@ class OverviewTab:
         if 'size' in file_info:
             st.write(f"**File Size:** {file_info['size']/1024:.2f} KB")
         st.write(f"**Total Elements:** {data.get('summary', {}).get('total_elements', 0)}")
+        progress = file_info.get('progress')
+        if file_info.get('partial') and progress:
+            st.caption(f"Still loading: {progress['done']} of {progress['total'] or '?'} elements extracted so far")
         
         st.subheader("Element Types Found")
         for element_type in data.get('summary', {}).get('element_types', []):
@@ -31,11 +38,22 @@ class OverviewTab:
             st.write("**Structure:** Dictionary")
             st.write(f"**Number of Keys:** {len(data)}")
             st.write("**Top-level Keys:**")
-            for key in data.keys():
-                st.write(f"- {key}")
-        elif isinstance(data, list):
+            for key, value in list(data.items())[:MAX_LISTED_KEYS]:
+                st.write(f"- {key} ({describe(value)})")
+            if len(data) > MAX_LISTED_KEYS:
+                st.write(f"- ... and {len(data) - MAX_LISTED_KEYS} more")
+            
+            # Counted while the element list was streamed in
+            summary = data.get('summary')
+            type_counts = summary.get('element_type_counts') if isinstance(summary, dict) else None
+            if type_counts:
+                st.subheader("Element Types Found")
+                for element_type, count in type_counts.items():
+                    st.write(f"- {element_type}: {count}")
+        elif isinstance(data, Sequence) and not isinstance(data, str):
             st.write("**Structure:** List")
             st.write(f"**Number of Items:** {len(data)}")
         
         st.subheader("Data Preview")
-        st.json(data)
+        st.json(preview(data))
+        st.caption("Long arrays and objects are shortened here; the Building Elements tab pages through them.")
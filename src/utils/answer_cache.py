@@ -0,0 +1,130 @@
+"""
+Semantic cache of chat answers, looked up by query-embedding similarity.
+"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Hashable, List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """LRU cache of answers keyed on (embedding store, query embedding).
+
+    A lookup returns the cached answer of the most similar earlier question
+    asked against the same store key, provided its cosine similarity reaches
+    the threshold. Store keys include a fingerprint of the embeddings, so
+    answers computed against other or older embeddings are never returned.
+    The cache is thread-safe so a single instance can be shared by sessions.
+    """
+
+    def __init__(self, max_entries: int = 512, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # Per store key: entry ids and their stacked unit query vectors
+        self._by_store: Dict[Hashable, Dict[str, Any]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def lookup(self, store_key: Hashable, query_embedding: np.ndarray,
+               similarity_threshold: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Return the best cached entry for a query, or None on a miss.
+
+        The returned dict holds the cached 'query', 'answer', 'results' and
+        the 'similarity' between the cached and the new question.
+        """
+        threshold = self.similarity_threshold if similarity_threshold is None else similarity_threshold
+        query = self._normalise(query_embedding)
+        with self._lock:
+            store = self._by_store.get(store_key)
+            if not store or not store['ids']:
+                self.misses += 1
+                return None
+            if store['matrix'] is None:
+                store['matrix'] = np.stack([self._entries[i]['embedding'] for i in store['ids']])
+            if store['matrix'].shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            similarities = store['matrix'] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                self.misses += 1
+                return None
+            entry_id = store['ids'][best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            entry = self._entries[entry_id]
+            return {
+                'query': entry['query'],
+                'answer': entry['answer'],
+                'results': entry['results'],
+                'similarity': float(similarities[best]),
+                'created_at': entry['created_at']
+            }
+
+    def store(self, store_key: Hashable, query: str, query_embedding: np.ndarray, answer: str,
+              results: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Cache an answer, evicting the least recently used entries beyond max_entries."""
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                'store_key': store_key,
+                'query': query,
+                'embedding': self._normalise(query_embedding),
+                'answer': answer,
+                'results': results or [],
+                'created_at': time.time()
+            }
+            store = self._by_store.setdefault(store_key, {'ids': [], 'matrix': None})
+            store['ids'].append(entry_id)
+            store['matrix'] = None
+            while len(self._entries) > self.max_entries:
+                old_id, old = self._entries.popitem(last=False)
+                self._remove_from_store(old['store_key'], old_id)
+
+    def invalidate(self, store_key: Optional[Hashable] = None) -> None:
+        """Drop all entries for one store key, or everything if no key is given."""
+        with self._lock:
+            if store_key is None:
+                self._entries.clear()
+                self._by_store.clear()
+                return
+            store = self._by_store.pop(store_key, None)
+            if store:
+                for entry_id in store['ids']:
+                    self._entries.pop(entry_id, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Drop the entries of every store key the predicate accepts."""
+        with self._lock:
+            store_keys = [key for key in self._by_store if predicate(key)]
+        for store_key in store_keys:
+            self.invalidate(store_key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _remove_from_store(self, store_key: Hashable, entry_id: int) -> None:
+        store = self._by_store.get(store_key)
+        if store is None:
+            return
+        store['ids'].remove(entry_id)
+        store['matrix'] = None
+        if not store['ids']:
+            del self._by_store[store_key]
+
+    @staticmethod
+    def _normalise(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) + 1e-8)
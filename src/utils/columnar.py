@@ -0,0 +1,428 @@
+"""
+Compact columnar file format for processed IFC models (``.ifccol``).
+
+Layout: an 8-byte magic, the length of a JSON header (uint64), the header,
+then one 8-byte aligned blob per column. The header holds the top-level
+data (file info, summary) and the dtype, position and compression of each
+column. Strings (IDs, names, property set and property names, units,
+string values) are interned into one UTF-8 table, and property values
+into a table of distinct (kind, 8-byte value, unit) rows:
+
+    element  -> id, type, name, description (string indices), pset range
+    pset     -> name (string index), property range
+    property -> name (string index), value (value table index)
+    value    -> kind, 8-byte value, unit (string index)
+
+Uncompressed files are memory-mapped on load, so opening a model costs
+one header parse; elements are only decoded into dicts when accessed.
+Equal property values decode to one shared dict, so decoded elements must
+be treated as read-only (as the app already treats loaded models).
+Anything that does not fit the typed columns (extra element keys, nested
+values) is kept as JSON text, so every processed model round-trips. The
+integer arrays of the relationship graph (src.utils.relationship_graph)
+are stored as columns too, and read back as numpy arrays.
+
+    python -m src.utils.columnar to-columnar model.json model.ifccol --compress
+    python -m src.utils.columnar to-json model.ifccol model.json
+"""
+
+import argparse
+import io
+import json
+import mmap
+import struct
+import zlib
+from collections.abc import Sequence
+from typing import Dict, List, Any, Optional, Union, BinaryIO
+
+import numpy as np
+
+MAGIC = b"IFCCOL1\n"
+EXTENSION = ".ifccol"
+_ALIGN = 8
+
+# Kinds of the 8-byte property value
+KIND_NONE, KIND_BOOL, KIND_INT, KIND_FLOAT, KIND_STR, KIND_JSON, KIND_RAW = range(7)
+
+_ELEMENT_KEYS = ('id', 'type', 'name', 'description')
+# Arrays inside top-level values stored as columns named '<key>.<field>' instead of in the header
+_META_COLUMNS = {'relationships': {'offsets': np.int64, 'targets': np.int32, 'edge_kinds': np.int8}}
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+class _StringTable:
+    """Interns strings while writing."""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.index)
+        return idx
+
+    def add_json(self, value: Any) -> int:
+        return self.add(json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        encoded = [s.encode('utf-8') for s in self.index]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return {'strings_data': np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                'strings_offsets': offsets}
+
+
+def _encode_value(value: Any, strings: _StringTable):
+    """(kind, int64 payload) of a property value."""
+    if value is None:
+        return KIND_NONE, 0
+    if isinstance(value, bool):
+        return KIND_BOOL, int(value)
+    if isinstance(value, int) and _INT64_MIN <= value <= _INT64_MAX:
+        return KIND_INT, value
+    if isinstance(value, float):
+        return KIND_FLOAT, struct.unpack('<q', struct.pack('<d', value))[0]
+    if isinstance(value, str):
+        return KIND_STR, strings.add(value)
+    return KIND_JSON, strings.add_json(value)
+
+
+class ColumnBuilder:
+    """Accumulates elements one at a time into columns (used by writers and streaming loaders)."""
+
+    def __init__(self):
+        self.strings = _StringTable()
+        self.count = 0
+        self._keys = {key: [] for key in _ELEMENT_KEYS}
+        self._has_properties, self._extras, self._pset_offsets = [], [], [0]
+        self._pset_names, self._pset_raw, self._prop_offsets = [], [], [0]
+        self._prop_names, self._prop_values = [], []
+        self._value_index: Dict[tuple, int] = {}
+
+    def add(self, element: Dict) -> None:
+        if not isinstance(element, dict):
+            raise ValueError(f"Elements must be objects, not {type(element).__name__}")
+        strings = self.strings
+        for key in _ELEMENT_KEYS:
+            value = element.get(key)
+            self._keys[key].append(strings.add(value) if isinstance(value, str) else -1)
+        extra = {key: value for key, value in element.items()
+                 if key != 'properties' and not (key in _ELEMENT_KEYS and isinstance(value, str))}
+
+        properties = element.get('properties')
+        if isinstance(properties, dict):
+            self._has_properties.append(1)
+            for ps_name, props in properties.items():
+                self._pset_names.append(strings.add(str(ps_name)))
+                if not isinstance(props, dict):
+                    self._pset_raw.append(strings.add_json(props))
+                    self._prop_offsets.append(len(self._prop_names))
+                    continue
+                self._pset_raw.append(-1)
+                for prop_name, prop_data in props.items():
+                    self._prop_names.append(strings.add(str(prop_name)))
+                    self._prop_values.append(self._value_idx(prop_data))
+                self._prop_offsets.append(len(self._prop_names))
+        else:
+            self._has_properties.append(0)
+            if 'properties' in element:
+                extra['properties'] = properties
+        self._extras.append(strings.add_json(extra) if extra else -1)
+        self._pset_offsets.append(len(self._pset_names))
+        self.count += 1
+
+    def _value_idx(self, prop_data: Any) -> int:
+        """Index of a property's entry in the table of distinct values."""
+        unit = prop_data.get('unit') if isinstance(prop_data, dict) else None
+        if isinstance(prop_data, dict) and set(prop_data) == {'value', 'unit'} \
+                and (unit is None or isinstance(unit, str)):
+            kind, payload = _encode_value(prop_data['value'], self.strings)
+            unit_idx = self.strings.add(unit) if unit is not None else -1
+        else:
+            kind, payload, unit_idx = KIND_RAW, self.strings.add_json(prop_data), -1
+        value_key = (kind, payload, unit_idx)
+        value_idx = self._value_index.get(value_key)
+        if value_idx is None:
+            value_idx = self._value_index[value_key] = len(self._value_index)
+        return value_idx
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        columns = {f"element_{key}": np.array(column, dtype=np.int32) for key, column in self._keys.items()}
+        values = self._value_index
+        columns.update({
+            'element_has_properties': np.array(self._has_properties, dtype=np.uint8),
+            'element_extra': np.array(self._extras, dtype=np.int32),
+            'element_pset_offsets': np.array(self._pset_offsets, dtype=np.int64),
+            'pset_name': np.array(self._pset_names, dtype=np.int32),
+            'pset_raw': np.array(self._pset_raw, dtype=np.int32),
+            'pset_prop_offsets': np.array(self._prop_offsets, dtype=np.int64),
+            'prop_name': np.array(self._prop_names, dtype=np.int32),
+            'prop_value': np.array(self._prop_values, dtype=np.int32),
+            'value_kind': np.array([key[0] for key in values], dtype=np.uint8),
+            'value_payload': np.array([key[1] for key in values], dtype=np.int64),
+            'value_unit': np.array([key[2] for key in values], dtype=np.int32)
+        })
+        columns.update(self.strings.columns())
+        return columns
+
+    def elements(self) -> "ColumnarElements":
+        """The elements added so far, as an in-memory columnar sequence."""
+        return ColumnarElements(self.columns(), self.count)
+
+
+def to_columns(processed_data: Dict) -> Dict[str, Any]:
+    """Split processed data into its header metadata and typed columns."""
+    builder = ColumnBuilder()
+    for element in processed_data.get('elements', []):
+        builder.add(element)
+    meta = {key: value for key, value in processed_data.items() if key != 'elements'}
+    columns = builder.columns()
+    for key, fields in _META_COLUMNS.items():
+        if isinstance(meta.get(key), dict):
+            meta[key] = dict(meta[key])
+            for field, dtype in fields.items():
+                if field in meta[key]:
+                    columns[f"{key}.{field}"] = np.asarray(meta[key].pop(field), dtype=dtype)
+    return {'meta': meta, 'count': builder.count, 'columns': columns}
+
+
+def write(processed_data: Dict, target: Union[str, BinaryIO], compress: bool = False) -> None:
+    """Write processed data in the columnar format to a path or binary file.
+
+    With ``compress`` each column is zlib-compressed; smaller on disk, but
+    the file can no longer be memory-mapped.
+    """
+    table = to_columns(processed_data)
+    blobs, header_columns, offset = [], {}, 0
+    for name, array in table['columns'].items():
+        raw = np.ascontiguousarray(array).astype(array.dtype.newbyteorder('<'), copy=False).tobytes()
+        blob = zlib.compress(raw, 6) if compress else raw
+        header_columns[name] = {'dtype': array.dtype.newbyteorder('<').str, 'count': int(array.size),
+                                'offset': offset, 'length': len(blob),
+                                'compression': 'zlib' if compress else None}
+        padding = -len(blob) % _ALIGN
+        blobs.append(blob + b"\0" * padding)
+        offset += len(blob) + padding
+
+    header = json.dumps({'version': 1, 'meta': table['meta'], 'count': table['count'],
+                         'columns': header_columns}, ensure_ascii=False).encode('utf-8')
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % _ALIGN)
+    if isinstance(target, str):
+        with open(target, 'wb') as f:
+            _write_parts(f, header, blobs)
+    else:
+        _write_parts(target, header, blobs)
+
+
+def _write_parts(f: BinaryIO, header: bytes, blobs: List[bytes]) -> None:
+    f.write(MAGIC)
+    f.write(struct.pack('<Q', len(header)))
+    f.write(header)
+    for blob in blobs:
+        f.write(blob)
+
+
+def to_bytes(processed_data: Dict, compress: bool = False) -> bytes:
+    buffer = io.BytesIO()
+    write(processed_data, buffer, compress)
+    return buffer.getvalue()
+
+
+def read(source: Union[str, bytes]) -> Dict:
+    """Open a columnar file (path) or its contents (bytes) as processed data.
+
+    ``elements`` is a read-only sequence that decodes elements on access.
+    Files are memory-mapped unless their columns are compressed.
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        buffer = source
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a columnar IFC model file")
+    header_length = struct.unpack_from('<Q', buffer, len(MAGIC))[0]
+    header_start = len(MAGIC) + 8
+    header = json.loads(bytes(buffer[header_start:header_start + header_length]).decode('utf-8'))
+    data_start = header_start + header_length
+
+    columns = {}
+    for name, spec in header['columns'].items():
+        dtype = np.dtype(spec['dtype'])
+        start = data_start + spec['offset']
+        if spec['compression'] == 'zlib':
+            raw = zlib.decompress(buffer[start:start + spec['length']])
+            columns[name] = np.frombuffer(raw, dtype=dtype, count=spec['count'])
+        elif spec['compression'] is None:
+            columns[name] = np.frombuffer(buffer, dtype=dtype, count=spec['count'], offset=start)
+        else:
+            raise ValueError(f"Unsupported column compression: {spec['compression']}")
+
+    data = dict(header['meta'])
+    for key, fields in _META_COLUMNS.items():
+        if isinstance(data.get(key), dict):
+            data[key] = dict(data[key], **{field: columns.pop(f"{key}.{field}")
+                                           for field in fields if f"{key}.{field}" in columns})
+    data['elements'] = ColumnarElements(columns, header['count'])
+    return data
+
+
+def is_columnar(head: bytes) -> bool:
+    return head[:len(MAGIC)] == MAGIC
+
+
+class ColumnarElements(Sequence):
+    """Read-only list of element dicts decoded from columns on access.
+
+    Indexing decodes one element; iterating decodes columns in bulk and is
+    the fast way to visit every element.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], count: int):
+        self._columns = columns
+        self._count = count
+        self._strings: List[Optional[str]] = [None] * (len(columns['strings_offsets']) - 1)
+        self._string_offsets = columns['strings_offsets'].tolist()
+        self._values: List[Any] = [None] * len(columns['value_kind'])
+        self._values_decoded = np.zeros(len(self._values), dtype=bool)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("element index out of range")
+        c = self._columns
+        p0, p1 = int(c['element_pset_offsets'][index]), int(c['element_pset_offsets'][index + 1])
+        r0, r1 = int(c['pset_prop_offsets'][p0]), int(c['pset_prop_offsets'][p1])
+        prop_names = [self._string(idx) for idx in c['prop_name'][r0:r1].tolist()]
+        prop_values = [self._value(idx) for idx in c['prop_value'][r0:r1].tolist()]
+        return self._decode(
+            {key: int(c[f"element_{key}"][index]) for key in _ELEMENT_KEYS},
+            c['element_has_properties'][index], int(c['element_extra'][index]),
+            c['pset_name'][p0:p1].tolist(), c['pset_raw'][p0:p1].tolist(),
+            [offset - r0 for offset in c['pset_prop_offsets'][p0:p1 + 1].tolist()],
+            prop_names, prop_values)
+
+    def __iter__(self):
+        c = self._columns
+        strings = self._all_strings()
+        values = [self._value(idx) for idx in range(len(self._values))]
+        key_columns = {key: c[f"element_{key}"].tolist() for key in _ELEMENT_KEYS}
+        has_properties = c['element_has_properties'].tolist()
+        extras = c['element_extra'].tolist()
+        pset_offsets = c['element_pset_offsets'].tolist()
+        pset_names, pset_raw = c['pset_name'].tolist(), c['pset_raw'].tolist()
+        prop_offsets = c['pset_prop_offsets'].tolist()
+        prop_names = [strings[idx] for idx in c['prop_name'].tolist()]
+        prop_values = [values[idx] for idx in c['prop_value'].tolist()]
+        for i in range(self._count):
+            p0, p1 = pset_offsets[i], pset_offsets[i + 1]
+            r0, r1 = prop_offsets[p0], prop_offsets[p1]
+            yield self._decode(
+                {key: column[i] for key, column in key_columns.items()}, has_properties[i], extras[i],
+                pset_names[p0:p1], pset_raw[p0:p1], [offset - r0 for offset in prop_offsets[p0:p1 + 1]],
+                prop_names[r0:r1], prop_values[r0:r1])
+
+    def tolist(self) -> List[Dict]:
+        return list(self)
+
+    def _string(self, idx: int) -> str:
+        value = self._strings[idx]
+        if value is None:
+            data = self._columns['strings_data']
+            value = self._strings[idx] = data[self._string_offsets[idx]:self._string_offsets[idx + 1]] \
+                .tobytes().decode('utf-8')
+        return value
+
+    def _all_strings(self) -> List[str]:
+        """Decode the whole string table at once."""
+        if any(value is None for value in self._strings):
+            blob = self._columns['strings_data'].tobytes()
+            offsets = self._string_offsets
+            self._strings = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+        return self._strings
+
+    def _value(self, idx: int) -> Any:
+        """Decoded entry of the value table (a {'value', 'unit'} dict, or raw JSON data)."""
+        if self._values_decoded[idx]:
+            return self._values[idx]
+        c = self._columns
+        kind, payload, unit = int(c['value_kind'][idx]), int(c['value_payload'][idx]), int(c['value_unit'][idx])
+        if kind == KIND_RAW:
+            value = json.loads(self._string(payload))
+        else:
+            if kind == KIND_STR:
+                decoded = self._string(payload)
+            elif kind == KIND_FLOAT:
+                decoded = struct.unpack('<d', struct.pack('<q', payload))[0]
+            elif kind == KIND_INT:
+                decoded = payload
+            elif kind == KIND_BOOL:
+                decoded = bool(payload)
+            elif kind == KIND_JSON:
+                decoded = json.loads(self._string(payload))
+            else:
+                decoded = None
+            value = {'value': decoded, 'unit': self._string(unit) if unit >= 0 else None}
+        self._values[idx] = value
+        self._values_decoded[idx] = True
+        return value
+
+    def _decode(self, keys, has_properties, extra, pset_names, pset_raw, prop_offsets,
+                prop_names, prop_values) -> Dict:
+        string = self._string
+        element = {key: string(idx) for key, idx in keys.items() if idx >= 0}
+        if has_properties:
+            properties = element['properties'] = {}
+            for p, name_idx in enumerate(pset_names):
+                if pset_raw[p] >= 0:
+                    properties[string(name_idx)] = json.loads(string(pset_raw[p]))
+                else:
+                    r0, r1 = prop_offsets[p], prop_offsets[p + 1]
+                    properties[string(name_idx)] = dict(zip(prop_names[r0:r1], prop_values[r0:r1]))
+        if extra >= 0:
+            element.update(json.loads(string(extra)))
+        return element
+
+
+def json_default(value: Any) -> Any:
+    """``default`` hook letting json.dump serialise lazily decoded sequences.
+
+    Covers columnar element lists, streamed JSON arrays (src.utils.json_stream)
+    and numpy arrays read from columnar files.
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Convert processed IFC models between JSON and columnar files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    to_columnar = commands.add_parser("to-columnar", help="JSON -> columnar")
+    to_columnar.add_argument("input")
+    to_columnar.add_argument("output")
+    to_columnar.add_argument("--compress", action="store_true", help="zlib-compress columns (no memory mapping)")
+    to_json = commands.add_parser("to-json", help="columnar -> JSON")
+    to_json.add_argument("input")
+    to_json.add_argument("output")
+    args = parser.parse_args(argv)
+
+    if args.command == "to-columnar":
+        with open(args.input, 'r', encoding='utf-8') as f:
+            write(json.load(f), args.output, compress=args.compress)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(read(args.input), f, ensure_ascii=False, default=json_default)
+
+
+if __name__ == "__main__":
+    main()
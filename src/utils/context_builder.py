@@ -0,0 +1,210 @@
+"""
+Token-budgeted context packing for chat prompts built from element search hits.
+"""
+
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+from src.utils.tokens import TokenCounter
+
+# Fields of an element text that identify it rather than describe it
+IDENTITY_FIELDS = ("ID", "Global ID")
+HEADER_FIELDS = ("Element Type", "Name", "Description")
+
+# Properties that answer the most common questions even when the query does not name them
+KEY_PROPERTIES = ("loadbearing", "isexternal", "material", "firerating", "thickness",
+                  "buildability", "precast", "width", "height", "reference")
+
+STOPWORDS = {
+    "the", "and", "are", "for", "with", "what", "which", "where", "how", "many", "much",
+    "any", "all", "there", "this", "that", "have", "has", "does", "show", "list", "tell",
+    "about", "find", "give", "model", "building", "element", "elements", "from", "its", "they"
+}
+
+
+def parse_element_text(text: str) -> Dict[str, Any]:
+    """Split an element text chunk into header fields and (pset, property, value) facts.
+
+    Reads both "pset - property: value" parts and the grouped
+    "[pset] property: value; property: value" parts of compact texts.
+    """
+    fields: Dict[str, str] = {}
+    properties: List[Tuple[str, str, str]] = []
+    for part in text.split(" | "):
+        if part.startswith("[") and "] " in part:
+            pset, _, grouped = part[1:].partition("] ")
+            for item in grouped.split("; "):
+                prop, sep, value = item.partition(": ")
+                if sep:
+                    properties.append((pset, prop, value))
+            continue
+        label, sep, value = part.partition(": ")
+        if not sep:
+            continue
+        if label in HEADER_FIELDS or label in IDENTITY_FIELDS:
+            fields[label] = value
+        else:
+            pset, sep, prop = label.partition(" - ")
+            properties.append((pset, prop, value) if sep else ("", label, value))
+    return {'fields': fields, 'properties': properties}
+
+
+def query_terms(query: str) -> List[str]:
+    """Lowercase content words of a query, with a plural 's' stripped."""
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", query.lower()):
+        if len(word) < 3 or word in STOPWORDS:
+            continue
+        terms.append(word[:-1] if word.endswith("s") and len(word) > 3 else word)
+    return terms
+
+
+class ContextBuilder:
+    """Pack the most relevant facts from search hits into a fixed token budget.
+
+    Hits that are identical apart from their IDs are merged into one entry
+    ("12 identical IfcDoor elements"). Entries are ordered by similarity and
+    their properties by overlap with the query, then added greedily: first a
+    header and the top few query-relevant properties of every entry, then the
+    rest of the relevant properties, then everything else, until the budget
+    is used up.
+    """
+
+    def __init__(self, token_budget: int = 1500, max_ids_listed: int = 5,
+                 properties_per_entry: int = 3, token_counter: Optional[TokenCounter] = None):
+        self.token_budget = token_budget
+        self.max_ids_listed = max_ids_listed
+        self.properties_per_entry = properties_per_entry
+        self.token_counter = token_counter or TokenCounter()
+
+    def build(self, query: str, search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the prompt context for a query.
+
+        Returns:
+            Dict with the 'context' text, its 'tokens', the number of hits and
+            distinct elements included, and how many were left out
+        """
+        terms = query_terms(query)
+        groups = self._group_identical(search_results)
+
+        entries = []
+        for group in groups:
+            scored = [(self._property_relevance(p, terms), p) for p in group['properties']]
+            scored.sort(key=lambda item: -item[0])
+            entries.append({
+                'group': group,
+                'header': self._header(group, len(entries) + 1),
+                'relevant': [p for score, p in scored if score > 0],
+                'others': [p for score, p in scored if score == 0],
+                'lines': []
+            })
+
+        used = 0
+        included = []
+        first = self.properties_per_entry
+        # Pass 1: every entry that fits gets its header and its most relevant properties
+        for entry in entries:
+            cost = self._count_line(entry['header'])
+            if used + cost > self.token_budget:
+                break
+            used += cost
+            included.append(entry)
+            used = self._add_properties(entry, entry['relevant'][:first], used)
+        # Pass 2 and 3: spend what is left on the remaining properties, best entries first
+        for entry in included:
+            used = self._add_properties(entry, entry['relevant'][first:], used)
+        for entry in included:
+            used = self._add_properties(entry, entry['others'], used)
+
+        blocks = ["\n".join([entry['header']] + entry['lines']) for entry in included]
+        omitted_groups = len(entries) - len(included)
+        if omitted_groups:
+            omitted_hits = sum(len(e['group']['ids']) for e in entries[len(included):])
+            blocks.append(f"({omitted_hits} further lower-scoring matches omitted to fit the context budget)")
+        context = "\n\n".join(blocks)
+
+        return {
+            'context': context,
+            'tokens': self.token_counter.count(context),
+            'hits_included': sum(len(e['group']['ids']) for e in included),
+            'groups_included': len(included),
+            'groups_omitted': omitted_groups,
+            'hits_total': len(search_results)
+        }
+
+    def _add_properties(self, entry: Dict[str, Any], properties, used: int) -> int:
+        """Add property lines to an entry while they fit; returns the new token total."""
+        for pset, prop, value in properties:
+            line = f"- {pset} - {prop}: {value}" if pset else f"- {prop}: {value}"
+            cost = self._count_line(line)
+            if used + cost > self.token_budget:
+                continue
+            entry['lines'].append(line)
+            used += cost
+        return used
+
+    def _count_line(self, line: str) -> int:
+        # +1 for the separating newline
+        return self.token_counter.count(line) + 1
+
+    def _group_identical(self, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge hits whose text differs only in ID fields, keeping best-score order."""
+        groups: Dict[Tuple, Dict[str, Any]] = {}
+        for result in search_results:
+            parsed = parse_element_text(result['text'])
+            fields = parsed['fields']
+            signature = (
+                result.get('source'),
+                tuple((k, fields.get(k, "")) for k in HEADER_FIELDS),
+                tuple(parsed['properties'])
+            )
+            group = groups.get(signature)
+            if group is None:
+                group = groups[signature] = {
+                    'fields': fields,
+                    'properties': [p for p in parsed['properties'] if p[2] not in ("", "None")],
+                    'source': result.get('source'),
+                    'best_score': result['similarity_score'],
+                    'ids': []
+                }
+            group['best_score'] = max(group['best_score'], result['similarity_score'])
+            group['ids'].append(fields.get("ID", "?"))
+        return sorted(groups.values(), key=lambda g: -g['best_score'])
+
+    def _header(self, group: Dict[str, Any], position: int) -> str:
+        fields = group['fields']
+        element_type = fields.get("Element Type", "Unknown")
+        ids = group['ids']
+        if len(ids) == 1:
+            parts = [f"Element {position} (Similarity: {group['best_score']:.2f}): {element_type}",
+                     f"ID: {ids[0]}"]
+        else:
+            listed = ", ".join(ids[:self.max_ids_listed])
+            if len(ids) > self.max_ids_listed:
+                listed += f" (+{len(ids) - self.max_ids_listed} more)"
+            parts = [f"Element {position} (Similarity: {group['best_score']:.2f}): "
+                     f"{len(ids)} identical {element_type} elements", f"IDs: {listed}"]
+        if fields.get("Name"):
+            parts.append(f"Name: {fields['Name']}")
+        if fields.get("Description"):
+            parts.append(f"Description: {fields['Description']}")
+        if group['source']:
+            parts.append(f"Model: {group['source']}")
+        return " | ".join(parts)
+
+    @staticmethod
+    def _property_relevance(prop: Tuple[str, str, str], terms: List[str]) -> int:
+        """Score a property by how well its name and value match the query."""
+        pset, name, value = prop
+        name_text = f"{pset} {name}".lower()
+        value_text = value.lower()
+        score = 0
+        for term in terms:
+            if term in name_text:
+                score += 2
+            elif term in value_text:
+                score += 1
+        compact_name = name.lower().replace(" ", "")
+        if any(key in compact_name for key in KEY_PROPERTIES):
+            score += 1
+        return score
@@ -0,0 +1,102 @@
+"""
+Precomputed search index over processed elements for filtering and pagination.
+"""
+
+from collections import defaultdict
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from src.utils import type_objects
+
+
+class ElementIndex:
+    """Lowercase search strings, type buckets and a trigram index over elements.
+
+    Everything is built once per model. A search then intersects the posting
+    lists of the query's trigrams (starting from the rarest) and verifies the
+    remaining candidates with a substring check, so its cost follows the
+    number of matches rather than the size of the model. Queries shorter
+    than a trigram fall back to a scan of the precomputed strings.
+    """
+
+    NGRAM = 3
+
+    def __init__(self, elements: List[Dict[str, Any]], types: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.elements = elements
+        # Properties inherited from type objects are searchable too
+        self.search_text: List[str] = [self._element_text(type_objects.resolve(element, types))
+                                       for element in elements]
+
+        buckets: Dict[str, List[int]] = defaultdict(list)
+        for i, element in enumerate(elements):
+            buckets[element.get('type', 'Unknown')].append(i)
+        self.by_type: Dict[str, np.ndarray] = {t: np.array(ids, dtype=np.int32) for t, ids in buckets.items()}
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for i, text in enumerate(self.search_text):
+            for gram in self._ngrams(text):
+                postings[gram].append(i)
+        self.postings: Dict[str, np.ndarray] = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def search(self, query: str = "", element_type: Optional[str] = None) -> np.ndarray:
+        """Indices of elements of a type (None for all) whose text contains the query."""
+        if element_type is None:
+            candidates = None
+        else:
+            candidates = self.by_type.get(element_type, np.empty(0, dtype=np.int32))
+
+        needle = query.strip().lower()
+        if not needle:
+            return candidates if candidates is not None else np.arange(len(self.elements), dtype=np.int32)
+
+        grams = sorted(self._ngrams(needle), key=lambda g: len(self.postings.get(g, ())))
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                return np.empty(0, dtype=np.int32)
+            candidates = posting if candidates is None else np.intersect1d(candidates, posting, assume_unique=True)
+            if not len(candidates):
+                return candidates
+        if candidates is None:
+            candidates = np.arange(len(self.elements), dtype=np.int32)
+        # Trigrams can all occur without the full string occurring
+        return np.array([i for i in candidates if needle in self.search_text[i]], dtype=np.int32)
+
+    @staticmethod
+    def page(indices: np.ndarray, page: int, page_size: int) -> np.ndarray:
+        """Slice of indices for a 1-based page number."""
+        if page_size <= 0:
+            raise ValueError("page_size must be positive")
+        start = max(page - 1, 0) * page_size
+        return indices[start:start + page_size]
+
+    @staticmethod
+    def page_count(total: int, page_size: int) -> int:
+        return max(1, -(-total // page_size))
+
+    @classmethod
+    def _ngrams(cls, text: str) -> set:
+        return {text[i:i + cls.NGRAM] for i in range(len(text) - cls.NGRAM + 1)}
+
+    @staticmethod
+    def _element_text(element: Dict[str, Any]) -> str:
+        """Everything a user may search for in an element, lowercased once."""
+        parts = [str(element.get(key, '')) for key in ('type', 'name', 'id', 'description')]
+        for ps_name, properties in (element.get('properties') or {}).items():
+            parts.append(str(ps_name))
+            for prop_name, prop_data in properties.items():
+                parts.append(str(prop_name))
+                if isinstance(prop_data, dict):
+                    parts.append(str(prop_data.get('value', '')))
+                    if prop_data.get('unit'):
+                        parts.append(str(prop_data['unit']))
+                else:
+                    parts.append(str(prop_data))
+        for geo_key, geo_value in (element.get('geometry') or {}).items():
+            parts.append(f"{geo_key} {geo_value}")
+        # A separator that no query contains, so matches never span two fields
+        return "\x00".join(parts).lower()
@@ -2,11 +2,44 @@
 Embedding utilities for processing and generating embeddings using OpenAI API.
 """
 
+import hashlib
 import json
+import os
 import pickle
-import openai
+import tempfile
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Sequence
+from src.utils.metrics import METRICS
+from src.utils.openai_clients import OpenAIClientManager
+from src.utils.tracing import PipelineTrace, ensure_trace
+
+
+class EmbeddingRows(Sequence):
+    """Read-only list-like view over the rows of an embedding matrix.
+
+    Stores are kept as one float32 matrix (in memory, or memory-mapped once
+    offloaded) rather than a list of lists of Python floats, which costs ~8x
+    more. Existing callers can keep using ``len(processor.embeddings)`` and
+    ``processor.embeddings[0]``, and numpy reads the matrix directly.
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [row.tolist() for row in self.matrix[idx]]
+        return self.matrix[idx].tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.matrix, dtype=dtype)
+
+    def tolist(self) -> List[List[float]]:
+        return np.asarray(self.matrix).tolist()
+
 
 class EmbeddingProcessor:
     """Class for handling text embeddings and similarity search."""
@@ -17,116 +50,357 @@ class EmbeddingProcessor:
         "text-embedding-ada-002": "Legacy model (1536 dimensions)"
     }
 
+    MODEL_DIMENSIONS = {
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536
+    }
+
+    # Models trained so that a prefix of the vector is itself a usable embedding,
+    # which is what makes truncated search indexes and the API's ``dimensions``
+    # parameter possible.
+    REDUCIBLE_MODELS = ("text-embedding-3-small", "text-embedding-3-large")
+
+    # Texts sent per embeddings API call (the API accepts up to 2048 inputs)
+    BATCH_SIZE = 100
+
+    # Stores at least this large are memory-mapped from ``offload_dir``, when set
+    OFFLOAD_BYTES = 64 << 20
+
     def __init__(self):
         self.api_key: Optional[str] = None
+        self.base_url: Optional[str] = None
         self.model: str = "text-embedding-3-small"
         self.embeddings: List[List[float]] = []
         self.texts: List[str] = []
+        # Dimensions requested from the API (None = the model's native size)
+        self.dimensions: Optional[int] = None
+        # Dimensions of the primary search index (None = search full vectors)
+        self.search_dimensions: Optional[int] = None
+        # How many candidates per requested result are re-ranked with full vectors
+        self.rerank_factor: int = 4
+        self._index_cache: Optional[Dict[str, Any]] = None
+        self._fingerprint_cache: Optional[Tuple[Any, Any, str]] = None
+        # Optional SharedModelCache so sessions with identical embeddings share one index
+        self.shared_cache = None
+        # Directory for memory-mapped copies of large stores (None keeps them in memory)
+        self.offload_dir: Optional[str] = None
 
-    def set_api_key(self, api_key: str) -> None:
-        """Set the OpenAI API key."""
+    def set_api_key(self, api_key: str, base_url: Optional[str] = None) -> None:
+        """Set the OpenAI API key (and optionally an OpenAI-compatible base URL)."""
         self.api_key = api_key
-        openai.api_key = api_key
+        self.base_url = base_url
+
+    def _client(self):
+        """Pooled OpenAI client for this processor's API key."""
+        return OpenAIClientManager.get_client(self.api_key, self.base_url)
 
     def set_model(self, model: str) -> None:
         """Set the embedding model to use."""
         if model in self.AVAILABLE_MODELS:
             self.model = model
+            if model not in self.REDUCIBLE_MODELS:
+                self.dimensions = None
+                self.set_search_dimensions(None, self.rerank_factor)
         else:
             raise ValueError(f"Model {model} not supported. Choose from {list(self.AVAILABLE_MODELS.keys())}")
 
+    def fingerprint(self) -> str:
+        """Content hash of the current embedding store (model, vector size and texts).
+
+        Changes whenever embeddings are generated or loaded for different
+        content, so it can key caches of derived results.
+        """
+        cached = self._fingerprint_cache
+        if cached is not None and cached[0] is self.texts and cached[1] is self.embeddings:
+            return cached[2]
+        digest = hashlib.sha1()
+        dims = len(self.embeddings[0]) if len(self.embeddings) else 0
+        digest.update(f"{self.model}|{dims}|{len(self.texts)}".encode('utf-8'))
+        for text in self.texts:
+            digest.update(text.encode('utf-8'))
+            digest.update(b"\0")
+        fingerprint = digest.hexdigest()
+        self._fingerprint_cache = (self.texts, self.embeddings, fingerprint)
+        return fingerprint
+
+    def set_dimensions(self, dimensions: Optional[int]) -> None:
+        """Request reduced-dimension vectors from the API via its ``dimensions`` parameter.
+
+        Only affects embeddings generated afterwards. Pass None to request the
+        model's native size.
+        """
+        if dimensions is not None:
+            self._validate_dimensions(dimensions)
+        self.dimensions = dimensions
+
+    def set_search_dimensions(self, dimensions: Optional[int], rerank_factor: int = 4) -> None:
+        """Search a truncated index and re-rank the top candidates with full vectors.
+
+        Args:
+            dimensions: Size of the primary search index, e.g. 256 or 512.
+                None disables the two-stage search.
+            rerank_factor: Candidates fetched per requested result before
+                re-ranking with the full-dimension vectors
+        """
+        if dimensions is not None:
+            self._validate_dimensions(dimensions)
+        if rerank_factor < 1:
+            raise ValueError("rerank_factor must be at least 1")
+        if dimensions == self.search_dimensions and rerank_factor == self.rerank_factor:
+            return
+        self.search_dimensions = dimensions
+        self.rerank_factor = rerank_factor
+        self._index_cache = None
+
+    def offload_full_embeddings(self, file_path: str) -> None:
+        """Move the full-dimension vectors to a memory-mapped .npy file.
+
+        After this only the search index stays resident; the full vectors are
+        paged in from disk when candidates are re-ranked. The file is removed
+        as soon as it is mapped where the OS allows it.
+        """
+        full = self._full_matrix()
+        np.save(file_path, full)
+        self.embeddings = EmbeddingRows(np.load(file_path, mmap_mode='r'))
+        self._index_cache = None
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def _install(self, embeddings) -> None:
+        """Keep a store as a float32 matrix, memory-mapped when it is large and offload_dir is set."""
+        self._index_cache = None
+        if not len(embeddings):
+            self.embeddings = []
+            return
+        self.embeddings = EmbeddingRows(np.asarray(embeddings, dtype=np.float32))
+        if self.offload_dir is not None and self.embeddings.matrix.nbytes >= self.OFFLOAD_BYTES:
+            fd, path = tempfile.mkstemp(suffix='.npy', prefix='embeddings_', dir=self.offload_dir)
+            os.close(fd)
+            self.offload_full_embeddings(path)
+
+    def _validate_dimensions(self, dimensions: int) -> None:
+        """Check that the current model can produce vectors of the given size."""
+        if self.model not in self.REDUCIBLE_MODELS:
+            raise ValueError(f"Model {self.model} does not support reduced dimensions. "
+                             f"Choose from {list(self.REDUCIBLE_MODELS)}")
+        native = self.MODEL_DIMENSIONS[self.model]
+        if not 0 < dimensions <= native:
+            raise ValueError(f"Dimensions must be between 1 and {native} for {self.model}")
+
+    @METRICS.timed()
     def generate_embeddings(self, texts: List[str], progress_callback=None) -> List[List[float]]:
         """Generate embeddings for a list of texts."""
         if not self.api_key:
             raise ValueError("API key not set. Call set_api_key first.")
 
-        # Enhance text descriptions with additional context
-        enhanced_texts = []
-        for text in texts:
-            # Add more context for walls
-            if "IfcWall" in text:
-                # Include keywords that might help identify loadbearing walls
-                context = " This wall has properties that may indicate if it's loadbearing: "
-                context += text
-                enhanced_texts.append(context)
-            else:
-                enhanced_texts.append(text)
-
         embeddings = []
-        for i, text in enumerate(enhanced_texts):
-            response = openai.embeddings.create(
-                input=text,
-                model=self.model
-            )
-            embeddings.append(response.data[0].embedding)
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            embeddings.extend(self.embed_batch(texts[start:start + self.BATCH_SIZE]))
             
             if progress_callback:
-                progress_callback((i + 1) / len(texts))
+                progress_callback(len(embeddings) / len(texts))
 
-        self.embeddings = embeddings
-        self.texts = texts  # Store original texts
+        self.set_embeddings(texts, embeddings)
         return embeddings
 
+    @METRICS.timed()
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of element texts with a single API call."""
+        if not self.api_key:
+            raise ValueError("API key not set. Call set_api_key first.")
+        response = self._client().embeddings.create(
+            **self._embedding_request(list(texts))
+        )
+        self._record_usage(response, len(texts))
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def set_embeddings(self, texts: List[str], embeddings: List[List[float]]) -> None:
+        """Install embeddings computed elsewhere (e.g. by a background job) for texts."""
+        if len(texts) != len(embeddings):
+            raise ValueError("Number of texts and embeddings must match")
+        self._install(embeddings)
+        self.texts = texts  # Store original texts
+
+    def copy_settings(self) -> "EmbeddingProcessor":
+        """A new processor with the same credentials, model and dimensions but no data."""
+        processor = EmbeddingProcessor()
+        processor.set_api_key(self.api_key, self.base_url)
+        processor.model = self.model
+        processor.dimensions = self.dimensions
+        return processor
+
+    @METRICS.timed()
+    def embed_query(self, query: str, trace: Optional[PipelineTrace] = None) -> np.ndarray:
+        """Embed a search query with the same model and size as the stored vectors."""
+        trace = ensure_trace(trace)
+        with trace.stage('query_embedding'):
+            response = self._client().embeddings.create(**self._embedding_request(query))
+        self._record_usage(response, 1)
+        if getattr(response, 'usage', None) is not None:
+            trace.incr('embedding_tokens', response.usage.total_tokens)
+        return np.array(response.data[0].embedding, dtype=np.float32)
+
+    def _record_usage(self, response: Any, inputs: int) -> None:
+        """Count an embeddings API call, its inputs and its tokens."""
+        METRICS.incr('api_requests', api='embeddings', model=self.model)
+        METRICS.incr('embedding_inputs', inputs, model=self.model)
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            METRICS.incr('api_tokens', usage.total_tokens, api='embeddings', model=self.model, kind='total')
+
+    def _embedding_request(self, text) -> Dict[str, Any]:
+        """Build the keyword arguments for an embeddings API call."""
+        request = {'input': text, 'model': self.model}
+        if self.dimensions is not None:
+            request['dimensions'] = self.dimensions
+        return request
+
+    def _full_matrix(self) -> np.ndarray:
+        """Return the stored vectors as a float32 matrix (memory-mapped if offloaded)."""
+        if isinstance(self.embeddings, EmbeddingRows):
+            return self.embeddings.matrix
+        return np.asarray(self.embeddings, dtype=np.float32)
+
+    def _search_index(self) -> Dict[str, Any]:
+        """Return the cached search matrices, rebuilding them if the store changed.
+
+        The primary index holds unit-length rows, truncated to
+        ``search_dimensions`` when two-stage search is enabled. The full matrix
+        is only touched to re-rank candidates. With a shared cache attached,
+        the read-only matrices are shared by every session whose store has
+        the same fingerprint.
+        """
+        cache = self._index_cache
+        if cache is not None and cache['source'] is self.embeddings and cache['count'] == len(self.embeddings):
+            METRICS.incr('cache_requests', cache='search_index', result='hit')
+            return cache
+        METRICS.incr('cache_requests', cache='search_index', result='miss')
+
+        shared_key = None
+        # Offloaded stores are backed by a session's own file and are not shared
+        if self.shared_cache is not None and not isinstance(self._full_matrix(), np.memmap):
+            shared_key = ('search_index', self.fingerprint(), self.search_dimensions)
+            shared = self.shared_cache.get(shared_key)
+            if shared is not None:
+                self._index_cache = dict(shared, source=self.embeddings, count=len(self.embeddings))
+                return self._index_cache
+
+        full = self._full_matrix()
+        dims = self.search_dimensions
+        if dims is not None and dims < full.shape[1]:
+            primary = np.array(full[:, :dims], dtype=np.float32)
+        else:
+            dims = None
+            primary = np.array(full, dtype=np.float32)
+        primary /= np.linalg.norm(primary, axis=1, keepdims=True) + 1e-8
+
+        index = {'dims': dims, 'primary': primary, 'full': full}
+        if shared_key is not None:
+            index = self.shared_cache.put(shared_key, index)
+        self._index_cache = dict(index, source=self.embeddings, count=len(self.embeddings))
+        return self._index_cache
+
+    def _score_candidates(self, query_embedding: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """Exact cosine similarity between the query and the given rows of the full matrix."""
+        full = self._search_index()['full']
+        rows = np.asarray(full[np.sort(candidates)], dtype=np.float32)
+        order = np.argsort(np.argsort(candidates))
+        scores = rows @ query_embedding / (
+            np.linalg.norm(rows, axis=1) * np.linalg.norm(query_embedding) + 1e-8
+        )
+        return scores[order]
+
+    def _primary_scores(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query against every row of the primary index."""
+        index = self._search_index()
+        query = query_embedding[:index['dims']] if index['dims'] else query_embedding
+        query = query / (np.linalg.norm(query) + 1e-8)
+        return index['primary'] @ query
+
     def find_most_similar(self, query: str) -> Dict[str, Any]:
         """Find the most similar text to a query."""
         return self.find_top_similar(query, top_k=1)[0]
 
-    def find_top_similar(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Find exactly K most similar texts, regardless of similarity score."""
+    @METRICS.timed()
+    def find_top_similar(self, query: str, top_k: int = 3,
+                         query_embedding: Optional[np.ndarray] = None,
+                         trace: Optional[PipelineTrace] = None) -> List[Dict[str, Any]]:
+        """Find exactly K most similar texts, regardless of similarity score.
+
+        With ``search_dimensions`` set, the reduced index picks
+        ``top_k * rerank_factor`` candidates which are then re-ranked with the
+        full-dimension vectors.
+        """
         if not self.embeddings or not self.texts:
             raise ValueError("No embeddings generated yet. Call generate_embeddings first.")
 
-        query_response = openai.embeddings.create(
-            input=query,
-            model=self.model
-        )
-        query_embedding = np.array(query_response.data[0].embedding)
-        doc_embeddings = np.array(self.embeddings)
-        
-        # Calculate similarities using dot product and normalization
-        similarities = np.dot(doc_embeddings, query_embedding) / (
-            np.linalg.norm(doc_embeddings, axis=1) * np.linalg.norm(query_embedding) + 1e-8
-        )
+        trace = ensure_trace(trace)
+        if query_embedding is None:
+            query_embedding = self.embed_query(query, trace)
+        with trace.stage('similarity_scan'):
+            similarities = self._primary_scores(query_embedding)
         
         # Get top K indices
         top_k = min(top_k, len(similarities))  # Make sure we don't exceed array length
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        if self._search_index()['dims']:
+            with trace.stage('rerank'):
+                n_candidates = min(top_k * self.rerank_factor, len(similarities))
+                candidates = np.argpartition(-similarities, n_candidates - 1)[:n_candidates]
+                scores = self._score_candidates(query_embedding, candidates)
+                order = np.argsort(scores)[::-1][:top_k]
+                top_indices, top_scores = candidates[order], scores[order]
+            trace.set('rerank_candidates', int(n_candidates))
+        else:
+            top_indices = np.argsort(similarities)[::-1][:top_k]
+            top_scores = similarities[top_indices]
+        trace.set('vectors_scanned', len(similarities))
         
         # Create result list
         results = []
-        for idx in top_indices:
+        for idx, score in zip(top_indices, top_scores):
             results.append({
                 'text': self.texts[idx],
-                'similarity_score': float(similarities[idx]),
+                'similarity_score': float(score),
                 'index': int(idx)
             })
         
+        trace.set('search_results', len(results))
         return results
     
-    def find_similar_by_threshold(self, query: str, threshold: float = 0.7) -> List[Dict[str, Any]]:
-        """Find all texts with similarity above the given threshold."""
+    @METRICS.timed()
+    def find_similar_by_threshold(self, query: str, threshold: float = 0.7,
+                                  query_embedding: Optional[np.ndarray] = None,
+                                  rerank_margin: float = 0.05,
+                                  trace: Optional[PipelineTrace] = None) -> List[Dict[str, Any]]:
+        """Find all texts with similarity above the given threshold.
+
+        With ``search_dimensions`` set, rows scoring within ``rerank_margin`` of
+        the threshold on the reduced index are re-scored with full vectors.
+        """
         if not self.embeddings or not self.texts:
             raise ValueError("No embeddings or texts found. Please generate embeddings first.")
-            
-        # Debug print
-        print(f"Number of embeddings: {len(self.embeddings)}")
-        print(f"Number of texts: {len(self.texts)}")
         
-        query_response = openai.embeddings.create(
-            input=query,
-            model=self.model
-        )
-        query_embedding = np.array(query_response.data[0].embedding)
-        doc_embeddings = np.array(self.embeddings)
+        trace = ensure_trace(trace)
+        if query_embedding is None:
+            query_embedding = self.embed_query(query, trace)
+        with trace.stage('similarity_scan'):
+            similarities = self._primary_scores(query_embedding)
+        trace.set('vectors_scanned', len(similarities))
         
-        # Calculate similarities
-        similarities = np.dot(doc_embeddings, query_embedding) / (
-            np.linalg.norm(doc_embeddings, axis=1) * np.linalg.norm(query_embedding) + 1e-8
-        )
+        if self._search_index()['dims']:
+            with trace.stage('rerank'):
+                candidates = np.flatnonzero(similarities >= threshold - rerank_margin)
+                scored = list(zip(candidates, self._score_candidates(query_embedding, candidates)))
+            trace.set('rerank_candidates', len(candidates))
+        else:
+            scored = enumerate(similarities)
         
         # Filter by threshold and sort by similarity
         results = []
-        for idx, score in enumerate(similarities):
+        for idx, score in scored:
             if score >= threshold:
                 results.append({
                     'text': self.texts[idx],
@@ -136,6 +410,7 @@ class EmbeddingProcessor:
         
         # Sort by similarity score (highest first)
         results.sort(key=lambda x: x['similarity_score'], reverse=True)
+        trace.set('search_results', len(results))
         return results
 
     @classmethod
@@ -143,6 +418,7 @@ class EmbeddingProcessor:
         """Get dictionary of available embedding models and their descriptions."""
         return cls.AVAILABLE_MODELS.copy()
         
+    @METRICS.timed()
     def save_embeddings(self, file_path: str, format: str = 'pickle') -> None:
         """Save embeddings and texts to a file.
         
@@ -150,10 +426,14 @@ class EmbeddingProcessor:
             file_path: Path to save the embeddings file
             format: 'pickle' or 'json' format for saving
         """
+        embeddings = self.embeddings
+        if isinstance(embeddings, EmbeddingRows):
+            embeddings = embeddings.tolist()
         data = {
-            'embeddings': self.embeddings,
+            'embeddings': embeddings,
             'texts': self.texts,
-            'model': self.model
+            'model': self.model,
+            'dimensions': self.dimensions
         }
         
         try:
@@ -168,6 +448,7 @@ class EmbeddingProcessor:
         except Exception as e:
             raise ValueError(f"Error saving embeddings: {e}")
     
+    @METRICS.timed()
     def load_embeddings(self, file_path: str, format: str = 'pickle') -> None:
         """Load embeddings and texts from a file.
         
@@ -185,8 +466,9 @@ class EmbeddingProcessor:
             else:
                 raise ValueError("Format must be either 'pickle' or 'json'")
             
-            self.embeddings = data['embeddings']
+            self._install(data['embeddings'])
             self.texts = data['texts']
             self.model = data['model']
+            self.dimensions = data.get('dimensions')
         except Exception as e:
             raise ValueError(f"Error loading embeddings: {e}")
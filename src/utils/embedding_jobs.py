@@ -0,0 +1,177 @@
+"""
+Background embedding jobs that checkpoint completed batches and resume after restarts.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from src.utils.embedding import EmbeddingProcessor
+
+DEFAULT_JOBS_DIR = os.environ.get("IFC_EMBEDDING_JOBS_DIR", "embedding_jobs")
+
+
+class EmbeddingJobManager:
+    """Run embedding generation on worker threads with on-disk checkpoints.
+
+    A job's ID is a hash of the model, vector size, batch size and texts,
+    so the same request always maps to the same job directory. Every
+    finished batch is written there as ``batch_NNNNN.npy`` before the next
+    one starts;
+    starting a job again (after a failure, a cancel or a process restart)
+    only embeds the batches that have no checkpoint yet. The directory is
+    removed when the result is collected.
+    """
+
+    def __init__(self, jobs_dir: str = DEFAULT_JOBS_DIR, batch_size: int = EmbeddingProcessor.BATCH_SIZE):
+        self.jobs_dir = jobs_dir
+        self.batch_size = batch_size
+        self._threads: Dict[str, threading.Thread] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def job_id(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> str:
+        # The batch size is part of the ID because checkpoints are numbered by batch
+        digest = hashlib.sha1(f"{model}|{dimensions}|{self.batch_size}|{len(texts)}".encode('utf-8'))
+        for text in texts:
+            digest.update(b"\0")
+            digest.update(text.encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def start(self, processor: EmbeddingProcessor, texts: List[str]) -> str:
+        """Start (or resume) embedding texts with the processor's settings; returns the job ID."""
+        if not processor.api_key:
+            raise ValueError("API key not set. Call set_api_key first.")
+        job_id = self.job_id(texts, processor.model, processor.dimensions)
+        with self._lock:
+            thread = self._threads.get(job_id)
+            if thread is not None and thread.is_alive():
+                return job_id
+            job_dir = self._job_dir(job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            self._write_meta(job_id, {
+                'job_id': job_id,
+                'model': processor.model,
+                'dimensions': processor.dimensions,
+                'count': len(texts),
+                'batch_size': self.batch_size,
+                'state': 'running',
+                'error': None
+            })
+            self._cancel[job_id] = threading.Event()
+            self._progress[job_id] = {'started_at': time.time(), 'resumed_batches': len(self._done_batches(job_id))}
+            # The worker gets its own processor so later changes in the session do not affect it
+            thread = threading.Thread(
+                target=self._run, args=(job_id, processor.copy_settings(), texts),
+                name=f"embedding-job-{job_id}", daemon=True
+            )
+            self._threads[job_id] = thread
+            thread.start()
+        return job_id
+
+    def cancel(self, job_id: str) -> None:
+        """Stop a job after its current batch; completed batches are kept."""
+        event = self._cancel.get(job_id)
+        if event is not None:
+            event.set()
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """State, batch counts, elapsed time and ETA of a job, or None if it does not exist."""
+        meta = self._read_meta(job_id)
+        if meta is None:
+            return None
+        total = -(-meta['count'] // meta['batch_size'])
+        done = len(self._done_batches(job_id))
+        state = meta['state']
+        thread = self._threads.get(job_id)
+        if state == 'running' and (thread is None or not thread.is_alive()):
+            # Left 'running' by a process that stopped; resumable from its checkpoints
+            state = 'interrupted'
+        status = {'job_id': job_id, 'state': state, 'batches_done': done, 'batches_total': total,
+                  'elements_total': meta['count'], 'error': meta.get('error'),
+                  'elapsed_s': None, 'eta_s': None}
+        progress = self._progress.get(job_id)
+        if progress is not None:
+            elapsed = time.time() - progress['started_at']
+            status['elapsed_s'] = elapsed
+            new_batches = done - progress['resumed_batches']
+            if state == 'running' and new_batches > 0:
+                status['eta_s'] = elapsed / new_batches * (total - done)
+        return status
+
+    def result(self, job_id: str) -> np.ndarray:
+        """Embeddings of a finished job as a float32 matrix, in text order.
+
+        The job's checkpoints are deleted once they have been read, so a
+        result can be collected once; the job no longer exists afterwards.
+        """
+        status = self.status(job_id)
+        if status is None or status['state'] != 'done':
+            raise ValueError(f"Embedding job {job_id} has not finished")
+        batches = [np.load(self._batch_path(job_id, b)) for b in range(status['batches_total'])]
+        vectors = np.vstack(batches).astype(np.float32, copy=False)
+        with self._lock:
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+            self._threads.pop(job_id, None)
+            self._cancel.pop(job_id, None)
+            self._progress.pop(job_id, None)
+        return vectors
+
+    def _run(self, job_id: str, processor: EmbeddingProcessor, texts: List[str]) -> None:
+        cancel = self._cancel[job_id]
+        try:
+            done = self._done_batches(job_id)
+            for batch, start in enumerate(range(0, len(texts), self.batch_size)):
+                if batch in done:
+                    continue
+                if cancel.is_set():
+                    self._update_meta(job_id, state='cancelled')
+                    return
+                vectors = np.asarray(processor.embed_batch(texts[start:start + self.batch_size]), dtype=np.float32)
+                path = self._batch_path(job_id, batch)
+                # Write then rename, so a crash never leaves a truncated checkpoint
+                tmp_path = path + ".tmp.npy"
+                np.save(tmp_path, vectors)
+                os.replace(tmp_path, path)
+            self._update_meta(job_id, state='done')
+        except Exception as e:
+            self._update_meta(job_id, state='failed', error=str(e))
+
+    def _done_batches(self, job_id: str) -> set:
+        job_dir = self._job_dir(job_id)
+        if not os.path.isdir(job_dir):
+            return set()
+        return {int(name[6:11]) for name in os.listdir(job_dir)
+                if name.startswith("batch_") and name.endswith(".npy") and ".tmp" not in name}
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _batch_path(self, job_id: str, batch: int) -> str:
+        return os.path.join(self._job_dir(job_id), f"batch_{batch:05d}.npy")
+
+    def _read_meta(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._job_dir(job_id), "job.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, job_id: str, meta: Dict[str, Any]) -> None:
+        path = os.path.join(self._job_dir(job_id), "job.json")
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def _update_meta(self, job_id: str, **changes) -> None:
+        with self._lock:
+            meta = self._read_meta(job_id) or {}
+            meta.update(changes)
+            self._write_meta(job_id, meta)
@@ -1,8 +1,13 @@
 import os
-import json
 from typing import Dict, Optional, Union
 import streamlit as st
-from src.utils.ifc_processing import IFCProcessor, check_ifcopenshell_installation, install_ifcopenshell_message
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from src.utils import columnar, json_stream
+from src.utils.ifc_processing import check_ifcopenshell_installation, install_ifcopenshell_message
+from src.utils.ingest import IngestManager
+from src.utils.metrics import METRICS
+from src.utils.model_cache import SharedModelCache
 
 class FileLoader:
     @staticmethod
@@ -10,37 +15,104 @@ class FileLoader:
         """List all sample models in the given directory."""
         return [
             f for f in os.listdir(sample_models_dir)
-            if (f.endswith(".json") or f.endswith(".ifc")) and os.path.isfile(os.path.join(sample_models_dir, f))
+            if f.endswith((".json", ".ifc", columnar.EXTENSION)) and os.path.isfile(os.path.join(sample_models_dir, f))
         ]
 
     @staticmethod
+    @METRICS.timed()
     def load_sample_file(sample_file_path: str) -> Optional[Dict]:
-        """Load a sample file (JSON or IFC)."""
+        """Load a sample file (JSON, IFC or columnar)."""
         if not os.path.exists(sample_file_path):
             st.error(f"Sample model not found at {sample_file_path}")
             return None
 
+        stat = os.stat(sample_file_path)
+        content_hash = FileLoader._hash_file(sample_file_path, stat.st_mtime_ns, stat.st_size)
         if sample_file_path.endswith('.json'):
-            return FileLoader._load_json_file(sample_file_path)
+            return FileLoader._shared_model(content_hash, lambda: FileLoader._load_json_file(sample_file_path))
         elif sample_file_path.endswith('.ifc'):
-            return FileLoader._load_ifc_file(sample_file_path)
+            return FileLoader._load_ifc_file(sample_file_path, content_hash)
+        elif sample_file_path.endswith(columnar.EXTENSION):
+            return FileLoader._shared_model(content_hash, lambda: FileLoader._load_columnar(sample_file_path))
         return None
 
     @staticmethod
+    @METRICS.timed()
     def load_uploaded_file(uploaded_file) -> Optional[Dict]:
-        """Load an uploaded file (JSON or IFC)."""
+        """Load an uploaded file (JSON, IFC or columnar)."""
+        content_hash = SharedModelCache.content_hash(uploaded_file.getvalue())
         if uploaded_file.name.endswith('.json'):
-            return FileLoader._load_uploaded_json(uploaded_file)
+            return FileLoader._shared_model(content_hash, lambda: FileLoader._load_uploaded_json(uploaded_file))
         elif uploaded_file.name.endswith('.ifc'):
-            return FileLoader._load_uploaded_ifc(uploaded_file)
+            return FileLoader._load_uploaded_ifc(uploaded_file, content_hash)
+        elif uploaded_file.name.endswith(columnar.EXTENSION):
+            return FileLoader._shared_model(content_hash, lambda: FileLoader._load_columnar(uploaded_file.getvalue()))
         return None
 
+    @staticmethod
+    @st.cache_resource
+    def shared_cache() -> SharedModelCache:
+        """Process-wide cache of processed models, shared by all sessions."""
+        cache = SharedModelCache(memory_budget_mb=float(os.environ.get("IFC_MODEL_CACHE_MB", 1024)))
+        METRICS.register_gauge('model_cache', cache.stats)
+        return cache
+
+    @staticmethod
+    @st.cache_resource
+    def ingest_manager() -> IngestManager:
+        """Background IFC ingest jobs, shared by all sessions."""
+        return IngestManager()
+
+    @staticmethod
+    def shared_derived(data: Dict, name: str, factory):
+        """Data derived from a loaded model (text chunks, indexes), built once per model for all sessions."""
+        content_hash = data.get('file_info', {}).get('hash') if isinstance(data, dict) else None
+        if content_hash is None:
+            return factory()
+        return FileLoader.shared_cache().get_or_create((name, content_hash), factory, FileLoader._session_id())
+
+    @staticmethod
+    def _shared_model(content_hash: str, loader) -> Optional[Union[Dict, list]]:
+        """Load a model through the shared cache and return this session's view of it."""
+        cache = FileLoader.shared_cache()
+        session_id = FileLoader._session_id()
+        if Runtime.exists():
+            cache.prune_sessions(Runtime.instance().is_active_session)
+
+        data = cache.get_or_create(('model', content_hash), loader, session_id)
+        if data is None:
+            return None
+
+        # Let the model this session had open before become evictable
+        previous = st.session_state.get('model_cache_hash')
+        if previous is not None and previous != content_hash and session_id is not None:
+            cache.release_content(previous, session_id)
+        st.session_state.model_cache_hash = content_hash
+
+        if not isinstance(data, dict):
+            return data
+        # A shallow copy: sessions share the element lists, which are never modified
+        view = dict(data)
+        view['file_info'] = dict(data.get('file_info', {}), hash=content_hash)
+        return view
+
+    @staticmethod
+    def _session_id() -> Optional[str]:
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx is not None else None
+
+    @staticmethod
+    @st.cache_data(max_entries=64, show_spinner=False)
+    def _hash_file(file_path: str, mtime_ns: int, size: int) -> str:
+        """Content hash of a file, recomputed only when its modification time or size changes."""
+        with open(file_path, 'rb') as f:
+            return SharedModelCache.content_hash(f.read())
+
     @staticmethod
     def _load_json_file(file_path: str) -> Optional[Dict]:
-        """Load a JSON file from disk."""
+        """Load a JSON file from disk, streaming its element list instead of parsing it whole."""
         try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
+            data = json_stream.load_document(file_path)
             st.success(f"Sample JSON model loaded!")
             return data
         except Exception as e:
@@ -49,9 +121,9 @@ class FileLoader:
 
     @staticmethod
     def _load_uploaded_json(uploaded_file) -> Optional[Dict]:
-        """Load an uploaded JSON file."""
+        """Load an uploaded JSON file, streaming its element list instead of parsing it whole."""
         try:
-            data = json.load(uploaded_file)
+            data = json_stream.load_document(uploaded_file.getvalue())
             st.success("JSON file uploaded successfully!")
             return data
         except Exception as e:
@@ -59,37 +131,81 @@ class FileLoader:
             return None
 
     @staticmethod
-    def _load_ifc_file(file_path: str) -> Optional[Dict]:
-        """Load an IFC file from disk."""
-        if not check_ifcopenshell_installation():
-            st.error("ifcopenshell is required to process IFC files")
-            st.info(install_ifcopenshell_message())
-            return None
-
+    def _load_columnar(source) -> Optional[Dict]:
+        """Open a columnar model; files on disk are memory-mapped, not parsed."""
         try:
-            processor = IFCProcessor()
-            data = processor.process_sample_ifc(file_path)
-            st.success(f"Sample IFC model processed!")
-            st.info(f"Processed {data['summary']['total_elements']} elements from IFC file")
+            data = columnar.read(source)
+            st.success("Columnar model loaded!")
             return data
         except Exception as e:
-            st.error(f"Error processing IFC file: {e}")
+            st.error(f"Error reading columnar file: {e}")
             return None
 
     @staticmethod
-    def _load_uploaded_ifc(uploaded_file) -> Optional[Dict]:
-        """Load an uploaded IFC file."""
-        if not check_ifcopenshell_installation():
-            st.error("ifcopenshell is required to process IFC files")
-            st.info(install_ifcopenshell_message())
-            return None
+    def _load_ifc_file(file_path: str, content_hash: str) -> Optional[Dict]:
+        """Load an IFC file from disk, in the background on first use."""
+        file_info = {'name': os.path.basename(file_path), 'path': file_path, 'type': 'IFC'}
+        return FileLoader._ingest_ifc(content_hash, file_path, file_info, "Sample IFC model processed!")
 
-        try:
-            processor = IFCProcessor()
-            data = processor.process_uploaded_ifc(uploaded_file)
-            st.success("IFC file uploaded and processed successfully!")
+    @staticmethod
+    def _load_uploaded_ifc(uploaded_file, content_hash: str) -> Optional[Dict]:
+        """Load an uploaded IFC file, in the background on first use."""
+        content = uploaded_file.getvalue()
+        file_info = {'name': uploaded_file.name, 'size': len(content), 'type': 'IFC'}
+        return FileLoader._ingest_ifc(content_hash, content, file_info, "IFC file uploaded and processed successfully!")
+
+    @staticmethod
+    def _ingest_ifc(content_hash: str, source, file_info: Dict, success_message: str) -> Optional[Dict]:
+        """Return the processed model, or the partial model while its ingest is still running."""
+        if ('model', content_hash) not in FileLoader.shared_cache():
+            if not check_ifcopenshell_installation():
+                st.error("ifcopenshell is required to process IFC files")
+                st.info(install_ifcopenshell_message())
+                return None
+
+            manager = FileLoader.ingest_manager()
+            job = manager.start(content_hash, source, file_info)
+            if job.state == 'failed':
+                # The failed job stays until retried, so the file is not parsed again on every rerun
+                st.error(f"Error processing IFC file: {job.error}")
+                if st.button("🔄 Retry", key=f"retry_ingest_{content_hash}"):
+                    manager.start(content_hash, source, file_info, retry=True)
+                    st.rerun()
+                return None
+            if job.state != 'done':
+                FileLoader._show_ingest_progress(content_hash)
+                return job.partial_data()
+
+            data = FileLoader._shared_model(content_hash, job.result)
+            manager.discard(content_hash)
+            st.success(success_message)
             st.info(f"Processed {data['summary']['total_elements']} elements from IFC file")
             return data
-        except Exception as e:
-            st.error(f"Error processing IFC file: {e}")
-            return None
+        return FileLoader._shared_model(content_hash, lambda: None)
+
+    @staticmethod
+    @st.fragment(run_every=1.0)
+    def _show_ingest_progress(content_hash: str) -> None:
+        """Report ingest progress, rerunning the app whenever more elements are available."""
+        job = FileLoader.ingest_manager().get(content_hash)
+        if job is None:
+            return
+        progress = job.progress()
+        # Rerun the whole app when a new element type appears or another quarter is extracted
+        quarter = progress['done'] * 4 // progress['total'] if progress['total'] else 0
+        published = (len(progress['types']), quarter)
+        seen_key = f"ingest_seen_{content_hash}"
+        previous = st.session_state.get(seen_key, published)
+        st.session_state[seen_key] = published
+        if progress['state'] in ('done', 'failed') or published != previous:
+            st.rerun()
+
+        if progress['state'] == 'extracting' and progress['total']:
+            eta = f", about {progress['eta_s']:.0f} s left" if progress['eta_s'] is not None else ""
+            st.progress(progress['done'] / progress['total'],
+                        text=f"Extracting elements: {progress['done']} of {progress['total']} "
+                             f"({progress['elapsed_s']:.0f} s elapsed{eta})")
+            if progress['types']:
+                st.caption(" · ".join(f"{t}: {n}" for t, n in sorted(progress['types'].items())))
+        else:
+            st.progress(0.0, text=f"Opening IFC file... ({progress['elapsed_s']:.0f} s elapsed)")
@@ -2,11 +2,18 @@
 IFC Processing utilities for extracting and structuring building information from IFC files.
 """
 
+import gzip
+import io
 import json
 import os
-from typing import Dict, List, Any, Optional
+from collections import Counter
+from typing import Dict, List, Any, Optional, Iterator, Tuple
 import tempfile
 
+from src.utils import columnar, numeric_index, text_profiles, type_objects
+from src.utils.relationship_graph import RelationshipGraph
+from src.utils.metrics import METRICS
+
 try:
     import ifcopenshell
     IFCOPENSHELL_AVAILABLE = True
@@ -26,6 +33,7 @@ class IFCProcessor:
         # Cache for storing text chunks
         self._text_chunks_cache = {}
     
+    @METRICS.timed()
     def load_ifc_file(self, file_path: str) -> Any:
         """Load an IFC file using ifcopenshell."""
         try:
@@ -34,41 +42,82 @@ class IFCProcessor:
         except Exception as e:
             raise ValueError(f"Error loading IFC file: {e}")
     
-    def extract_building_elements(self, ifc_file: Any) -> List[Dict]:
-        """Extract building elements from IFC file with their properties."""
+    # Common IFC element types to extract
+    ELEMENT_TYPES = [
+        'IfcWall', 'IfcSlab', 'IfcBeam', 'IfcColumn', 'IfcDoor', 'IfcWindow',
+        'IfcStair', 'IfcRailing', 'IfcRoof', 'IfcCurtainWall', 'IfcBuildingElementProxy'
+    ]
+    
+    @METRICS.timed()
+    def extract_building_elements(self, ifc_file: Any, progress_callback=None, progress_every: int = 100,
+                                  types: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+        """Extract building elements from IFC file with their properties.
+        
+        Args:
+            ifc_file: The opened IFC file
+            progress_callback: Optional callable(element_type, done, total, elements), called
+                every ``progress_every`` elements and after each element type. ``elements`` is
+                the list being built, so callers can publish partial results.
+            progress_every: How many elements to extract between progress calls
+            types: Type objects from extract_types; properties elements share with
+                their type are then left to the type (see extract_element_data)
+        """
         elements = []
+        project_units = self.project_units(ifc_file)
+        type_ids = self.type_assignments(ifc_file) if types else {}
         
-        # Common IFC element types to extract
-        element_types = [
-            'IfcWall', 'IfcSlab', 'IfcBeam', 'IfcColumn', 'IfcDoor', 'IfcWindow',
-            'IfcStair', 'IfcRailing', 'IfcRoof', 'IfcCurtainWall', 'IfcBuildingElementProxy'
-        ]
+        instances = {}
+        for element_type in self.ELEMENT_TYPES:
+            try:
+                instances[element_type] = ifc_file.by_type(element_type)
+            except Exception as e:
+                print(f"Warning: Error processing {element_type}: {e}")
+        total = sum(len(ifc_elements) for ifc_elements in instances.values())
+        done = 0
         
-        for element_type in element_types:
+        for element_type, ifc_elements in instances.items():
+            extracted_before = len(elements)
             try:
-                ifc_elements = ifc_file.by_type(element_type)
                 for element in ifc_elements:
                     # Changed to include_properties=True
                     element_data = self.extract_element_data(
                         element, 
                         include_properties=True,  # Set to True to extract properties
-                        include_geometry=False
+                        include_geometry=False,
+                        project_units=project_units,
+                        types=types,
+                        type_id=type_ids.get(element.id())
                     )
                     if element_data:
                         elements.append(element_data)
+                    done += 1
+                    if progress_callback and done % progress_every == 0:
+                        progress_callback(element_type, done, total, elements)
             except Exception as e:
                 print(f"Warning: Error processing {element_type}: {e}")
                 continue
+            finally:
+                METRICS.incr('elements_extracted', len(elements) - extracted_before, type=element_type)
+                if progress_callback:
+                    progress_callback(element_type, done, total, elements)
         
         return elements
     
-    def extract_element_data(self, element: Any, include_properties: bool = False, include_geometry: bool = False) -> Dict:
+    def extract_element_data(self, element: Any, include_properties: bool = False, include_geometry: bool = False,
+                             project_units: Optional[Dict[str, str]] = None,
+                             types: Optional[Dict[str, Dict]] = None, type_id: Optional[str] = None) -> Dict:
         """Extract relevant data from a single IFC element.
         
         Args:
             element: The IFC element to process
             include_properties: Whether to include detailed property information
             include_geometry: Whether to include geometry information
+            project_units: Unit label per unit type (see project_units), used for
+                measure values that carry no unit of their own
+            types: Type objects from extract_types
+            type_id: Id of the element's type object (see type_assignments); when it is
+                in ``types``, the element records it and keeps only the properties that
+                differ from the type's
         """
         try:
             # Extract basic element data (fast)
@@ -84,19 +133,15 @@ class IFCProcessor:
             if include_properties and hasattr(element, 'IsDefinedBy'):
                 for definition in element.IsDefinedBy:
                     if definition.is_a('IfcRelDefinesByProperties'):
-                        property_set = definition.RelatingPropertyDefinition
-                        if property_set.is_a('IfcPropertySet'):
-                            ps_name = property_set.Name
-                            element_data['properties'][ps_name] = {}
-                            
-                            for prop in property_set.HasProperties:
-                                if prop.is_a('IfcPropertySingleValue'):
-                                    prop_name = prop.Name
-                                    prop_value = prop.NominalValue.wrappedValue if prop.NominalValue else None
-                                    element_data['properties'][ps_name][prop_name] = {
-                                        'value': prop_value,
-                                        'unit': getattr(prop.NominalValue, 'Unit', None) if prop.NominalValue else None
-                                    }
+                        decoded = self._decode_property_set(definition.RelatingPropertyDefinition, project_units)
+                        if decoded:
+                            element_data['properties'].setdefault(decoded[0], {}).update(decoded[1])
+                
+                # Keep only what differs from the type's property sets
+                if types and type_id in types:
+                    element_data['type_id'] = type_id
+                    element_data['properties'] = type_objects.strip_inherited(
+                        element_data['properties'], types[type_id]['properties'])
             
             # Only extract geometry if requested (slow operation)
             if include_geometry:
@@ -108,6 +153,205 @@ class IFCProcessor:
             print(f"Warning: Error extracting data from element {element}: {e}")
             return None
     
+    def _decode_property_set(self, property_set: Any,
+                             project_units: Optional[Dict[str, str]]) -> Optional[Tuple[str, Dict[str, Dict]]]:
+        """(name, properties) of an IfcPropertySet or IfcElementQuantity; None for other definitions."""
+        properties = {}
+        if property_set.is_a('IfcPropertySet'):
+            for prop in property_set.HasProperties:
+                if prop.is_a('IfcPropertySingleValue'):
+                    nominal = prop.NominalValue
+                    unit_type = numeric_index.measure_unit_type(nominal.is_a()) if nominal else None
+                    properties[prop.Name] = {
+                        'value': nominal.wrappedValue if nominal else None,
+                        'unit': self._value_unit(prop.Unit, unit_type, project_units)
+                    }
+        elif property_set.is_a('IfcElementQuantity'):
+            for quantity in property_set.Quantities:
+                if quantity.is_a('IfcPhysicalSimpleQuantity'):
+                    # Attribute 3 is the measure value for every simple quantity type
+                    properties[quantity.Name] = {
+                        'value': quantity[3],
+                        'unit': self._value_unit(
+                            quantity.Unit, numeric_index.QUANTITY_UNIT_TYPES.get(quantity.is_a()), project_units)
+                    }
+        else:
+            return None
+        METRICS.incr('psets_decoded', pset=property_set.Name)
+        return property_set.Name, properties
+    
+    @staticmethod
+    def type_assignments(ifc_file: Any) -> Dict[int, str]:
+        """Type object id per typed entity (by entity id), from every IfcRelDefinesByType.
+        
+        One pass over the relationships; much cheaper than following the
+        inverse attributes of each element.
+        """
+        assignments = {}
+        for rel in ifc_file.by_type('IfcRelDefinesByType'):
+            if rel.RelatingType is not None:
+                type_id = IFCProcessor._entity_id(rel.RelatingType)
+                for related in rel.RelatedObjects or []:
+                    assignments[related.id()] = type_id
+        return assignments
+    
+    @staticmethod
+    def _entity_id(entity: Any) -> str:
+        return getattr(entity, 'GlobalId', None) or str(entity.id())
+    
+    @METRICS.timed()
+    def extract_types(self, ifc_file: Any) -> Dict[str, Dict[str, Any]]:
+        """Property sets of every type object, decoded once per type.
+        
+        Returns:
+            Type id (GlobalId) -> {'type', 'name', 'properties'}, the form stored
+            with the processed data as ``types`` (see src.utils.type_objects)
+        """
+        project_units = self.project_units(ifc_file)
+        types = {}
+        for type_object in ifc_file.by_type('IfcTypeObject'):
+            properties = {}
+            for property_set in type_object.HasPropertySets or []:
+                decoded = self._decode_property_set(property_set, project_units)
+                if decoded:
+                    properties.setdefault(decoded[0], {}).update(decoded[1])
+            types[self._entity_id(type_object)] = {
+                'type': type_object.is_a(),
+                'name': getattr(type_object, 'Name', '') or '',
+                'properties': properties
+            }
+        return types
+    
+    @staticmethod
+    def _value_unit(unit: Any, unit_type: Optional[str], project_units: Optional[Dict[str, str]]) -> Optional[str]:
+        """Label of a value's explicit unit, else of the project unit for its unit type."""
+        if unit is not None:
+            return IFCProcessor._unit_label(unit)
+        if unit_type and project_units:
+            return project_units.get(unit_type)
+        return None
+
+    @staticmethod
+    def _unit_label(unit: Any) -> Optional[str]:
+        """Readable name of an IFC unit, e.g. 'MILLIMETRE' or 'kg·s^-3·K^-1' for a derived unit."""
+        if unit is None:
+            return None
+        if unit.is_a('IfcSIUnit'):
+            return f"{unit.Prefix or ''}{unit.Name}"
+        if unit.is_a('IfcDerivedUnit'):
+            if getattr(unit, 'UserDefinedType', None):
+                return unit.UserDefinedType
+            info = IFCProcessor._unit_info(unit)
+            if info and info['scale'] == 1.0:
+                return info['si_unit']
+            return "·".join(IFCProcessor._power(IFCProcessor._unit_label(e.Unit), e.Exponent) for e in unit.Elements)
+        return getattr(unit, 'Name', None) or unit.is_a()
+
+    @staticmethod
+    def _unit_info(unit: Any) -> Optional[Dict[str, Any]]:
+        """Unit type, SI unit and scale to SI of an IFC unit; None if it cannot be converted."""
+        try:
+            if unit.is_a('IfcSIUnit'):
+                resolved = numeric_index.si_unit(unit.Name, unit.Prefix)
+            elif unit.is_a('IfcConversionBasedUnit'):
+                factor = unit.ConversionFactor
+                base = IFCProcessor._unit_info(factor.UnitComponent)
+                resolved = (base['si_unit'], float(factor.ValueComponent.wrappedValue) * base['scale']) if base else None
+            elif unit.is_a('IfcDerivedUnit'):
+                parts = [(IFCProcessor._unit_info(e.Unit), e.Exponent) for e in unit.Elements]
+                if not parts or not all(info for info, _ in parts):
+                    return None
+                scale = 1.0
+                for info, exponent in parts:
+                    scale *= info['scale'] ** exponent
+                resolved = ("·".join(IFCProcessor._power(info['si_unit'], exponent) for info, exponent in parts), scale)
+            else:
+                return None
+        except Exception:
+            return None
+        if resolved is None:
+            return None
+        return {'type': unit.UnitType, 'si_unit': resolved[0], 'scale': resolved[1]}
+
+    @staticmethod
+    def _power(symbol: str, exponent: int) -> str:
+        return symbol if exponent == 1 else f"{symbol}^{exponent}"
+
+    @staticmethod
+    def project_units(ifc_file: Any) -> Dict[str, str]:
+        """Unit label per unit type from the project's IfcUnitAssignment, e.g. {'LENGTHUNIT': 'MILLIMETRE'}."""
+        units = {}
+        for project in ifc_file.by_type('IfcProject'):
+            assignment = project.UnitsInContext
+            for unit in (assignment.Units if assignment else None) or []:
+                unit_type = getattr(unit, 'UnitType', None)
+                if unit_type and unit_type != 'USERDEFINED':
+                    units.setdefault(unit_type, IFCProcessor._unit_label(unit))
+        return units
+
+    @METRICS.timed()
+    def extract_units(self, ifc_file: Any) -> Dict[str, Dict[str, Any]]:
+        """Every convertible unit in the file by label, with its type, SI unit and scale to SI.
+
+        Units assigned to the project are marked with ``'project': True``;
+        the table is stored with the processed data as ``units`` so values can
+        be normalised to SI without the IFC file (see numeric_index).
+        """
+        project = set(self.project_units(ifc_file).values())
+        units = {}
+        for unit in ifc_file.by_type('IfcNamedUnit') + ifc_file.by_type('IfcDerivedUnit'):
+            label = self._unit_label(unit)
+            info = self._unit_info(unit)
+            if label and info and label not in units:
+                units[label] = dict(info, project=label in project)
+        return units
+
+    @METRICS.timed()
+    def extract_relationships(self, ifc_file: Any, elements: List[Dict]) -> Dict[str, Any]:
+        """Relationship graph between extracted elements, in the form stored with the processed data.
+
+        Doors and windows are linked to the element whose opening they fill,
+        and elements of the same type object share a type node (see
+        src.utils.relationship_graph). Relationships to anything that was
+        not extracted are left out.
+        """
+        index = {element['id']: i for i, element in enumerate(elements)}
+
+        def node(entity):
+            return index.get(getattr(entity, 'GlobalId', None)) if entity is not None else None
+
+        edges = []
+
+        def add(source, target, kind):
+            if source is not None and target is not None:
+                edges.append((source, target, kind))
+
+        for rel in ifc_file.by_type('IfcRelVoidsElement'):
+            host = node(rel.RelatingBuildingElement)
+            for filling in getattr(rel.RelatedOpeningElement, 'HasFillings', None) or []:
+                add(host, node(filling.RelatedBuildingElement), 'hosts')
+        for rel in ifc_file.by_type('IfcRelConnectsElements'):
+            add(node(rel.RelatingElement), node(rel.RelatedElement), 'connects')
+        for rel in ifc_file.by_type('IfcRelAggregates'):
+            whole = node(rel.RelatingObject)
+            for part in rel.RelatedObjects or []:
+                add(whole, node(part), 'aggregates')
+
+        types, type_nodes = [], {}
+        for rel in ifc_file.by_type('IfcRelDefinesByType'):
+            members = [n for n in map(node, rel.RelatedObjects or []) if n is not None]
+            type_object = rel.RelatingType
+            if not members or type_object is None:
+                continue
+            if type_object.id() not in type_nodes:
+                type_nodes[type_object.id()] = len(elements) + len(types)
+                types.append({'id': self._entity_id(type_object),
+                              'type': type_object.is_a(), 'name': getattr(type_object, 'Name', '') or ''})
+            for member in members:
+                add(member, type_nodes[type_object.id()], 'typed_by')
+
+        return RelationshipGraph.from_edges(len(elements), edges, types).to_dict()
+
     def extract_geometry_info(self, element: Any) -> Dict:
         """Extract basic geometry information from an element."""
         geometry = {}
@@ -135,6 +379,7 @@ class IFCProcessor:
         """Clear the text chunks cache."""
         self._text_chunks_cache = {}
 
+    @METRICS.timed()
     def process_uploaded_ifc(self, uploaded_file) -> Dict:
         """Process an uploaded IFC file from Streamlit file uploader."""
         try:
@@ -145,112 +390,112 @@ class IFCProcessor:
             
             # Process the IFC file
             ifc_file = self.load_ifc_file(tmp_path)
-            elements = self.extract_building_elements(ifc_file)
+            types = self.extract_types(ifc_file)
+            elements = self.extract_building_elements(ifc_file, types=types)
             
             # Clean up temporary file
             os.unlink(tmp_path)
             
             # Structure data similar to JSON format expected by the app
-            processed_data = {
-                'file_info': {
-                    'name': uploaded_file.name,
-                    'size': len(uploaded_file.getvalue()),
-                    'type': 'IFC'
-                },
-                'elements': elements,
-                'summary': {
-                    'total_elements': len(elements),
-                    'element_types': list(set(el['type'] for el in elements))
-                }
-            }
-            
-            return processed_data
+            return self.structure_data(elements, {
+                'name': uploaded_file.name,
+                'size': len(uploaded_file.getvalue()),
+                'type': 'IFC'
+            }, units=self.extract_units(ifc_file), relationships=self.extract_relationships(ifc_file, elements),
+               types=types)
             
         except Exception as e:
             raise ValueError(f"Error processing uploaded IFC file: {e}")
     
+    @staticmethod
+    def structure_data(elements: List[Dict], file_info: Dict, units: Optional[Dict[str, Dict]] = None,
+                       relationships: Optional[Dict[str, Any]] = None,
+                       types: Optional[Dict[str, Dict]] = None) -> Dict:
+        """Wrap extracted elements (with the model's unit table, relationship graph and type
+        objects, when extracted) in the processed-data structure the app expects.
+        
+        Only the type objects that elements refer to by ``type_id`` are kept.
+        """
+        data = {
+            'file_info': file_info,
+            'elements': elements,
+            'summary': {
+                'total_elements': len(elements),
+                'element_types': list(set(el['type'] for el in elements))
+            }
+        }
+        if units is not None:
+            data['units'] = units
+        if relationships is not None:
+            data['relationships'] = relationships
+        if types is not None:
+            used = {el['type_id'] for el in elements if 'type_id' in el}
+            data['types'] = {type_id: entry for type_id, entry in types.items() if type_id in used}
+        return data
+    
+    @METRICS.timed()
     def process_sample_ifc(self, file_path: str) -> Dict:
         """Process a sample IFC file from the sample_models folder."""
         try:
             ifc_file = self.load_ifc_file(file_path)
-            elements = self.extract_building_elements(ifc_file)
+            types = self.extract_types(ifc_file)
+            elements = self.extract_building_elements(ifc_file, types=types)
             
             # Structure data similar to JSON format expected by the app
-            processed_data = {
-                'file_info': {
-                    'name': os.path.basename(file_path),
-                    'path': file_path,
-                    'type': 'IFC'
-                },
-                'elements': elements,
-                'summary': {
-                    'total_elements': len(elements),
-                    'element_types': list(set(el['type'] for el in elements))
-                }
-            }
-            
-            return processed_data
+            return self.structure_data(elements, {
+                'name': os.path.basename(file_path),
+                'path': file_path,
+                'type': 'IFC'
+            }, units=self.extract_units(ifc_file), relationships=self.extract_relationships(ifc_file, elements),
+               types=types)
             
         except Exception as e:
             raise ValueError(f"Error processing sample IFC file: {e}")
     
-    def convert_to_text_chunks(self, processed_data: Dict, batch_size: int = 100, use_cache: bool = True) -> List[str]:
-        """Convert processed IFC data to text chunks suitable for embedding."""
+    @METRICS.timed()
+    def convert_to_text_chunks(self, processed_data: Dict, batch_size: int = 100, use_cache: bool = True,
+                               profile: str = 'full',
+                               max_tokens: Optional[int] = text_profiles.MAX_EMBEDDING_TOKENS) -> List[str]:
+        """Convert processed IFC data to text chunks suitable for embedding.
+        
+        Args:
+            processed_data: Processed IFC data
+            batch_size: Elements converted per batch
+            use_cache: Whether to reuse chunks converted earlier for the same file
+            profile: Serialisation profile, 'full' or 'compact' (see src.utils.text_profiles)
+            max_tokens: Token limit per chunk; longer elements are split (None to never split)
+        """
         # Generate cache key
         file_info = processed_data.get('file_info', {})
-        cache_key = f"{file_info.get('name', '')}_{file_info.get('size', 0)}"
+        cache_key = f"{file_info.get('name', '')}_{file_info.get('size', 0)}_{profile}_{max_tokens}"
         
         if use_cache and cache_key in self._text_chunks_cache:
+            METRICS.incr('cache_requests', cache='text_chunks', result='hit')
             return self._text_chunks_cache[cache_key]
+        if use_cache:
+            METRICS.incr('cache_requests', cache='text_chunks', result='miss')
             
+        serializer = text_profiles.TextSerializer(profile, max_tokens)
         texts = []
         elements = processed_data.get('elements', [])
+        types = processed_data.get('types') or {}
         
         for i in range(0, len(elements), batch_size):
             batch = elements[i:i + batch_size]
             
             for element in batch:
-                text_parts = []
-                
-                # Basic element information
-                text_parts.append(f"Element Type: {element.get('type', 'Unknown')}")
-                text_parts.append(f"ID: {element.get('id', 'Unknown')}")
-                text_parts.append(f"Global ID: {element.get('globalId', 'Unknown')}")
-                
-                if element.get('name'):
-                    text_parts.append(f"Name: {element.get('name')}")
-                
-                if element.get('description'):
-                    text_parts.append(f"Description: {element.get('description')}")
-                
-                # Include ALL properties
-                for ps_name, properties in element.get('properties', {}).items():
-                    if isinstance(properties, dict):
-                        # Handle nested property structure
-                        for prop_name, prop_data in properties.items():
-                            if isinstance(prop_data, dict):
-                                value = prop_data.get('value')
-                                unit = prop_data.get('unit', '')
-                                prop_type = prop_data.get('type', '')
-                                
-                                if value is not None:
-                                    prop_text = f"{ps_name} - {prop_name}: {value}"
-                                    if unit:
-                                        prop_text += f" {unit}"
-                                    if prop_type:
-                                        prop_text += f" (Type: {prop_type})"
-                                    text_parts.append(prop_text)
-                            else:
-                                # Direct property value
-                                text_parts.append(f"{ps_name} - {prop_name}: {prop_data}")
-                    else:
-                        # Direct property set value
-                        text_parts.append(f"{ps_name}: {properties}")
-                
-                # Join all information with separators
-                element_text = " | ".join(filter(None, text_parts))
-                texts.append(element_text)
+                # Type properties are described once, in the type's own chunk below
+                type_entry = type_objects.type_of(element, types)
+                type_name = (type_entry['name'] or type_entry['type']) if type_entry else None
+                texts.extend(serializer.element(element, type_name))
+        
+        instances = Counter(element['type_id'] for element in elements if 'type_id' in element)
+        for type_id, type_entry in types.items():
+            if instances[type_id] and type_entry.get('properties'):
+                texts.extend(serializer.type_object(type_id, type_entry, instances[type_id]))
         
+        if serializer.split_elements:
+            METRICS.incr('text_chunks_split', serializer.split_elements, profile=serializer.profile.name)
         if use_cache:
             self._text_chunks_cache[cache_key] = texts
         
@@ -269,13 +514,24 @@ class IFCProcessor:
                 output_path = json_name
             
             with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(processed_data, f, indent=2, ensure_ascii=False)
+                json.dump(processed_data, f, indent=2, ensure_ascii=False, default=columnar.json_default)
             
             return output_path
             
         except Exception as e:
             raise ValueError(f"Error saving JSON file: {e}")
     
+    def save_to_columnar(self, processed_data: Dict, output_path: str = None, compress: bool = False) -> str:
+        """Save processed IFC data to a columnar file (see src.utils.columnar)."""
+        try:
+            if output_path is None:
+                original_name = processed_data.get('file_info', {}).get('name', 'processed_ifc')
+                output_path = f"{os.path.splitext(original_name)[0]}_processed{columnar.EXTENSION}"
+            columnar.write(processed_data, output_path, compress=compress)
+            return output_path
+        except Exception as e:
+            raise ValueError(f"Error saving columnar file: {e}")
+    
     def get_json_string(self, processed_data: Dict, compact: bool = True) -> str:
         """Convert processed IFC data to JSON string for download.
         
@@ -289,13 +545,53 @@ class IFCProcessor:
                 return json.dumps(
                     processed_data,
                     ensure_ascii=False,
-                    separators=(',', ':')  # Remove whitespace
+                    separators=(',', ':'),  # Remove whitespace
+                    default=columnar.json_default
                 )
-            return json.dumps(processed_data, indent=2, ensure_ascii=False)
+            return json.dumps(processed_data, indent=2, ensure_ascii=False, default=columnar.json_default)
         except Exception as e:
             raise ValueError(f"Error converting to JSON string: {e}")
     
+    def iter_ndjson(self, processed_data: Dict) -> Iterator[str]:
+        """Yield processed IFC data as NDJSON lines.
+        
+        The first line holds everything except the elements (file info and
+        summary); every following line is one element.
+        """
+        header = {key: value for key, value in processed_data.items() if key != 'elements'}
+        yield json.dumps(header, ensure_ascii=False, separators=(',', ':'), default=columnar.json_default) + "\n"
+        for element in processed_data.get('elements', []):
+            yield json.dumps(element, ensure_ascii=False, separators=(',', ':')) + "\n"
+    
+    @METRICS.timed()
+    def get_export_bytes(self, processed_data: Dict, format: str = 'json', compress: bool = False) -> bytes:
+        """Serialise processed IFC data for download.
+        
+        Args:
+            processed_data: The data to export
+            format: 'json' for one compact document, 'ndjson' for one element per line
+                or 'columnar' for the binary columnar format
+            compress: If True, gzip the output (columnar files compress their columns instead)
+        """
+        if format not in ('json', 'ndjson', 'columnar'):
+            raise ValueError(f"Unsupported export format: {format}")
+        if format == 'columnar':
+            return columnar.to_bytes(processed_data, compress=compress)
+        buffer = io.BytesIO()
+        # mtime=0 keeps the compressed bytes identical for identical data
+        stream = gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) if compress else buffer
+        if format == 'ndjson':
+            # Written line by line, so no full-document string is built
+            for line in self.iter_ndjson(processed_data):
+                stream.write(line.encode('utf-8'))
+        else:
+            stream.write(self.get_json_string(processed_data).encode('utf-8'))
+        if compress:
+            stream.close()
+        return buffer.getvalue()
+    
     @staticmethod
+    @METRICS.timed()
     def process_ifc(ifc_file) -> Dict[str, Any]:
         """Process an IFC file and extract all available parameters."""
         ifc = ifcopenshell.open(ifc_file)
@@ -337,8 +633,8 @@ class IFCProcessor:
                                             'unit': str(prop.Unit) if hasattr(prop, 'Unit') else None
                                         }
 
-                # 3. Extract quantities
-                for definition in entity.IsDefinedBy:
+                # 3. Extract quantities (only objects have IsDefinedBy)
+                for definition in getattr(entity, 'IsDefinedBy', None) or []:
                     if definition.is_a('IfcRelDefinesByProperties'):
                         qset = definition.RelatingPropertyDefinition
                         if qset.is_a('IfcElementQuantity'):
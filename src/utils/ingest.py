@@ -0,0 +1,153 @@
+"""
+Background IFC ingest that publishes partial results while elements are extracted.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, Optional, Union
+
+from src.utils.ifc_processing import IFCProcessor
+from src.utils.metrics import METRICS
+
+
+class IngestJob:
+    """Open and extract one IFC model on a worker thread.
+
+    Progress (elements done per type, elapsed time, ETA) and the elements
+    extracted so far can be read at any time, so the UI can render a
+    partial model while extraction continues.
+    """
+
+    def __init__(self, source: Union[str, bytes], file_info: Dict[str, Any]):
+        self.file_info = file_info
+        self.state = 'queued'
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._extract_started_at: Optional[float] = None
+        self._elements = []
+        self._units: Optional[Dict[str, Dict]] = None
+        self._relationships: Optional[Dict[str, Any]] = None
+        self._types: Optional[Dict[str, Dict]] = None
+        self._published = 0
+        self._done = 0
+        self._total: Optional[int] = None
+        self._type_counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, args=(source,), daemon=True,
+                                        name=f"ifc-ingest-{file_info.get('name', '')}")
+
+    def start(self) -> "IngestJob":
+        self._thread.start()
+        return self
+
+    def progress(self) -> Dict[str, Any]:
+        """Current state, element counts (overall and per type), elapsed seconds and ETA."""
+        with self._lock:
+            done, total = self._done, self._total
+            type_counts = dict(self._type_counts)
+        end = self.finished_at or time.time()
+        eta = None
+        if self.state == 'extracting' and done and total:
+            eta = (end - self._extract_started_at) / done * (total - done)
+        return {
+            'state': self.state,
+            'error': self.error,
+            'done': done,
+            'total': total,
+            'types': type_counts,
+            'elapsed_s': end - self.started_at,
+            'eta_s': eta
+        }
+
+    def partial_data(self) -> Dict[str, Any]:
+        """The elements extracted so far in the processed-data structure, marked as partial."""
+        with self._lock:
+            elements = self._elements[:self._published]
+        progress = self.progress()
+        return IFCProcessor.structure_data(elements, dict(self.file_info, partial=True, progress=progress),
+                                           units=self._units, types=self._types)
+
+    def result(self) -> Dict[str, Any]:
+        """The complete processed data of a finished job."""
+        if self.state != 'done':
+            raise ValueError(f"IFC ingest has not finished (state: {self.state})")
+        return IFCProcessor.structure_data(self._elements, dict(self.file_info), units=self._units,
+                                           relationships=self._relationships, types=self._types)
+
+    def _run(self, source: Union[str, bytes]) -> None:
+        # Profiled with cProfile when requested through METRICS.request_profile()
+        with METRICS.profiled(f"ingest_{self.file_info.get('name', 'model')}"):
+            self._ingest(source)
+
+    def _ingest(self, source: Union[str, bytes]) -> None:
+        tmp_path = None
+        try:
+            processor = IFCProcessor()
+            self.state = 'opening'
+            if isinstance(source, bytes):
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.ifc') as tmp_file:
+                    tmp_file.write(source)
+                    tmp_path = tmp_file.name
+            ifc_file = processor.load_ifc_file(tmp_path or source)
+            self._units = processor.extract_units(ifc_file)
+            self._types = processor.extract_types(ifc_file)
+            self._extract_started_at = time.time()
+            self.state = 'extracting'
+            self._elements = processor.extract_building_elements(ifc_file, progress_callback=self._on_progress,
+                                                                 types=self._types)
+            self._relationships = processor.extract_relationships(ifc_file, self._elements)
+            self._published = len(self._elements)
+            self.state = 'done'
+            METRICS.observe('ingest_seconds', time.time() - self.started_at)
+        except Exception as e:
+            self.error = str(e)
+            self._elements, self._published = [], 0
+            self.state = 'failed'
+        finally:
+            self.finished_at = time.time()
+            if tmp_path:
+                os.unlink(tmp_path)
+
+    def _on_progress(self, element_type: str, done: int, total: int, elements) -> None:
+        with self._lock:
+            self._elements = elements
+            # Counted from what has been published since the last call
+            for element in elements[self._published:]:
+                self._type_counts[element.get('type', 'Unknown')] += 1
+            self._published = len(elements)
+            self._done = done
+            self._total = total
+
+
+class IngestManager:
+    """One ingest job per model content hash, shared by every session."""
+
+    def __init__(self):
+        self._jobs: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+
+    def start(self, content_hash: str, source: Union[str, bytes], file_info: Dict[str, Any],
+              retry: bool = False) -> IngestJob:
+        """Return the job for a model, starting one if there is none.
+
+        A failed job is kept, so its error can be reported, and only
+        replaced by a new one when ``retry`` is set.
+        """
+        with self._lock:
+            job = self._jobs.get(content_hash)
+            if job is None or (retry and job.state == 'failed'):
+                job = IngestJob(source, file_info).start()
+                self._jobs[content_hash] = job
+            return job
+
+    def get(self, content_hash: str) -> Optional[IngestJob]:
+        return self._jobs.get(content_hash)
+
+    def discard(self, content_hash: str) -> None:
+        """Forget a job once its result has been stored elsewhere."""
+        with self._lock:
+            self._jobs.pop(content_hash, None)
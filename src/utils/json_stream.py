@@ -0,0 +1,351 @@
+"""
+Incremental JSON reading for large model exports.
+
+``JSONEventReader`` reads a document in chunks and emits events for the
+top level: each value of a top-level object, and each item of a top-level
+array (or of an array held by a top-level key) one at a time, with its
+byte range. Items are parsed by the C JSON decoder, so only one item is
+materialised at a time.
+
+``load_document`` builds on it:
+
+- the ``elements`` array is streamed into a columnar element store
+  (src.utils.columnar), with summary statistics computed along the way
+- other arrays are kept as Python lists while small; larger ones become
+  ``LazyJSONArray``s, which re-read items from the source on access
+- other values are kept as is
+"""
+
+import codecs
+import json
+import re
+from array import array
+from collections import Counter
+from collections.abc import Sequence
+from typing import Dict, List, Any, Iterator, Optional, Tuple, Union
+
+from src.utils.columnar import ColumnBuilder
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+# Arrays with more JSON text than this are not kept in memory
+LARGE_ARRAY_BYTES = 1 << 20
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+Source = Union[str, bytes, bytearray, memoryview]
+
+
+class JSONEventReader:
+    """Chunked reader emitting top-level JSON events.
+
+    Events are tuples:
+
+    - ``('start_object',)`` / ``('end_object',)``
+    - ``('value', key, value, start, end)`` for a non-array value (key is
+      None for a scalar or object document)
+    - ``('start_array', key)``, then ``('item', key, index, value, start,
+      end)`` per item, then ``('end_array', key, count, start, end)``; key
+      is None for a top-level array
+
+    ``start``/``end`` are byte offsets into the source.
+    """
+
+    def __init__(self, source: Source, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.source = source
+        self.chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._read_pos = 0
+        # Byte offset of a known character position, advanced as the buffer is consumed
+        self._mark_pos = 0
+        self._mark_byte = 0
+        self._file = None
+
+    def events(self) -> Iterator[Tuple]:
+        if isinstance(self.source, str):
+            self._file = open(self.source, 'rb')
+        try:
+            yield from self._document()
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _document(self) -> Iterator[Tuple]:
+        char = self._peek()
+        if char == '[':
+            yield from self._array(None)
+        elif char == '{':
+            self._pos += 1
+            yield ('start_object',)
+            if self._peek() == '}':
+                self._pos += 1
+            else:
+                while True:
+                    key = self._decode()[0]
+                    if not isinstance(key, str):
+                        raise ValueError("Object keys must be strings")
+                    self._expect(':')
+                    if self._peek() == '[':
+                        yield from self._array(key)
+                    else:
+                        value, start, end = self._decode()
+                        yield ('value', key, value, start, end)
+                    if self._expect(',}') == '}':
+                        break
+            yield ('end_object',)
+        else:
+            value, start, end = self._decode()
+            yield ('value', None, value, start, end)
+        if self._peek(required=False) is not None:
+            raise ValueError(f"Extra data after the JSON document at byte {self._byte_offset(self._pos)}")
+
+    def _array(self, key: Optional[str]) -> Iterator[Tuple]:
+        start = self._byte_offset(self._pos)
+        self._pos += 1
+        yield ('start_array', key)
+        count = 0
+        if self._peek() == ']':
+            self._pos += 1
+        else:
+            while True:
+                value, item_start, item_end = self._decode()
+                yield ('item', key, count, value, item_start, item_end)
+                count += 1
+                if self._expect(',]') == ']':
+                    break
+        yield ('end_array', key, count, start, self._byte_offset(self._pos))
+
+    def _peek(self, required: bool = True) -> Optional[str]:
+        """Next non-whitespace character, without consuming it."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                if required:
+                    raise ValueError("Unexpected end of JSON document")
+                return None
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at byte {self._byte_offset(self._pos)}, found {char!r}")
+        self._pos += 1
+        return char
+
+    def _decode(self) -> Tuple[Any, int, int]:
+        """Decode the value at the current position; returns it with its byte range."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number at the end of the buffer, or cut before its fraction or
+                # exponent ("2." + "5"), may continue in the next chunk
+                if self._eof or end < len(self._buf) and not (
+                        self._buf[end] in '.eE+-' and isinstance(value, (int, float))):
+                    break
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill(min_chars=len(self._buf) - self._pos)
+        start = self._byte_offset(self._pos)
+        self._pos = end
+        result = (value, start, self._byte_offset(end))
+        self._compact()
+        return result
+
+    def _fill(self, min_chars: int = 0) -> bool:
+        """Read at least one chunk (more for values larger than the buffer); False at the end."""
+        if self._eof:
+            return False
+        wanted = max(self.chunk_size, min_chars)
+        read = 0
+        while read < wanted:
+            chunk = self._read(wanted - read)
+            if not chunk:
+                self._buf += self._text_decoder.decode(b"", final=True)
+                self._eof = True
+                break
+            read += len(chunk)
+            self._buf += self._text_decoder.decode(chunk)
+        return read > 0 or bool(self._buf[self._pos:])
+
+    def _read(self, size: int) -> bytes:
+        if self._file is not None:
+            return self._file.read(size)
+        chunk = bytes(self.source[self._read_pos:self._read_pos + size])
+        self._read_pos += len(chunk)
+        return chunk
+
+    def _byte_offset(self, pos: int) -> int:
+        if pos >= self._mark_pos:
+            self._mark_byte += len(self._buf[self._mark_pos:pos].encode('utf-8'))
+        else:
+            self._mark_byte -= len(self._buf[pos:self._mark_pos].encode('utf-8'))
+        self._mark_pos = pos
+        return self._mark_byte
+
+    def _compact(self) -> None:
+        """Drop the consumed part of the buffer once it is larger than a chunk."""
+        if self._pos > self.chunk_size:
+            self._byte_offset(self._pos)
+            self._buf = self._buf[self._pos:]
+            self._mark_pos -= self._pos
+            self._pos = 0
+
+
+class LazyJSONArray(Sequence):
+    """Read-only array whose items are re-read from the source by byte range."""
+
+    def __init__(self, source: Source, starts: array, ends: array):
+        self.source = source
+        self._starts = starts
+        self._ends = ends
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._read_items(range(*index.indices(len(self)))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("array index out of range")
+        return next(self._read_items([index]))
+
+    def __iter__(self):
+        return self._read_items(range(len(self)))
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the array's JSON text in the source."""
+        return self._ends[-1] - self._starts[0] if len(self) else 0
+
+    def _read_items(self, indices) -> Iterator[Any]:
+        if isinstance(self.source, str):
+            with open(self.source, 'rb') as f:
+                for i in indices:
+                    f.seek(self._starts[i])
+                    yield json.loads(f.read(self._ends[i] - self._starts[i]))
+        else:
+            for i in indices:
+                yield json.loads(bytes(self.source[self._starts[i]:self._ends[i]]))
+
+
+class _ArrayCollector:
+    """Keeps a streamed array as a list until it grows large, then as byte ranges only."""
+
+    def __init__(self, source: Source, large_bytes: int):
+        self.source = source
+        self.large_bytes = large_bytes
+        self.items: Optional[List[Any]] = []
+        self.starts, self.ends = array('q'), array('q')
+
+    def add(self, value: Any, start: int, end: int) -> None:
+        self.starts.append(start)
+        self.ends.append(end)
+        if self.items is not None:
+            self.items.append(value)
+            if end - self.starts[0] > self.large_bytes:
+                self.items = None
+
+    def result(self) -> Union[List[Any], LazyJSONArray]:
+        return self.items if self.items is not None else LazyJSONArray(self.source, self.starts, self.ends)
+
+
+def load_document(source: Source, elements_key: str = 'elements',
+                  large_array_bytes: int = LARGE_ARRAY_BYTES,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Any:
+    """Load a JSON document (path or bytes) without materialising its large arrays.
+
+    A top-level ``elements`` array of objects is streamed into a columnar
+    element store. If the document has no ``summary``, one is added with
+    the element count, the element types and the count per type.
+    """
+    reader = JSONEventReader(source, chunk_size)
+    document: Any = None
+    collectors: Dict[Optional[str], _ArrayCollector] = {}
+    builder: Optional[ColumnBuilder] = None
+    type_counts: Counter = Counter()
+
+    for event in reader.events():
+        kind = event[0]
+        if kind == 'start_object':
+            document = {}
+        elif kind == 'value':
+            _, key, value, _, _ = event
+            if key is None:
+                document = value
+            else:
+                document[key] = value
+        elif kind == 'start_array':
+            key = event[1]
+            collectors[key] = _ArrayCollector(source, large_array_bytes)
+            if key is not None and key == elements_key:
+                builder = ColumnBuilder()
+                # Byte ranges only, in case the array turns out not to hold elements
+                collectors[key].items = None
+        elif kind == 'item':
+            _, key, _, value, start, end = event
+            collectors[key].add(value, start, end)
+            if builder is not None and key == elements_key:
+                if isinstance(value, dict):
+                    builder.add(value)
+                    type_counts[value.get('type', 'Unknown')] += 1
+                else:
+                    builder = None
+        elif kind == 'end_array':
+            key = event[1]
+            collector = collectors.pop(key)
+            if builder is not None and key == elements_key:
+                result = builder.elements()
+            else:
+                result = collector.result()
+            if key is None:
+                document = result
+            else:
+                document[key] = result
+
+    if isinstance(document, dict) and builder is not None and 'summary' not in document:
+        document['summary'] = {
+            'total_elements': builder.count,
+            'element_types': sorted(type_counts),
+            'element_type_counts': dict(type_counts.most_common())
+        }
+    return document
+
+
+def preview(value: Any, max_items: int = 20, depth: int = 3) -> Any:
+    """A bounded copy of a value for display: long arrays and objects are cut
+    to ``max_items`` entries and nesting below ``depth`` is summarised."""
+    if isinstance(value, dict):
+        if depth <= 0:
+            return f"{{...}} ({len(value)} keys)"
+        result = {key: preview(item, max_items, depth - 1) for key, item in list(value.items())[:max_items]}
+        if len(value) > max_items:
+            result["..."] = f"{len(value) - max_items} more keys"
+        return result
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        if depth <= 0:
+            return f"[...] ({len(value)} items)"
+        result = [preview(item, max_items, depth - 1) for item in value[:max_items]]
+        if len(value) > max_items:
+            result.append(f"... {len(value) - max_items} more items")
+        return result
+    return value
+
+
+def describe(value: Any) -> str:
+    """Short description of a value's type and size, e.g. 'array, 12,000 items'."""
+    if isinstance(value, dict):
+        return f"object, {len(value):,} keys"
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return f"array, {len(value):,} items"
+    if isinstance(value, str):
+        return f"string, {len(value):,} characters"
+    return type(value).__name__ if value is not None else "null"
@@ -0,0 +1,213 @@
+"""
+Opt-in metrics (counters, timing histograms, gauges) and ingest profiling.
+
+Collection is off unless ``IFC_METRICS=1`` is set or ``METRICS.enable()`` is
+called; disabled instrumentation costs one attribute check per call.
+
+    from src.utils.metrics import METRICS
+    METRICS.enable()
+    ...
+    print(METRICS.to_prometheus())
+
+With ``IFC_METRICS_PORT`` set, /metrics (Prometheus text) and /metrics.json
+are also served from a background HTTP server.
+"""
+
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Any, Optional, Tuple
+
+# Upper bounds in seconds of the timing histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe counters, timing histograms and callback gauges."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.profile_dir = os.environ.get("IFC_PROFILE_DIR", "profiles")
+        self._profile_requested = os.environ.get("IFC_PROFILE_INGEST") == "1"
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._timings: Dict[str, Dict[LabelKey, Dict[str, Any]]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+    def incr(self, name: str, amount: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record one duration in a histogram (count, sum and buckets)."""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._timings.setdefault(name, {})
+            timing = series.get(key)
+            if timing is None:
+                timing = series[key] = {'count': 0, 'sum': 0.0, 'buckets': [0] * (len(BUCKETS) + 1)}
+            timing['count'] += 1
+            timing['sum'] += seconds
+            timing['buckets'][bisect_left(BUCKETS, seconds)] += 1
+
+    def register_gauge(self, name: str, callback: Callable[[], Dict[str, float]]) -> None:
+        """Read values (e.g. cache hit ratios) from callback whenever metrics are exported."""
+        with self._lock:
+            self._gauges[name] = callback
+
+    def timed(self, name: Optional[str] = None):
+        """Decorator counting calls and timing them in the 'method_seconds' histogram."""
+        def decorator(fn):
+            method = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe('method_seconds', time.perf_counter() - start, method=method)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All current values as plain data."""
+        with self._lock:
+            counters = {name: [{'labels': dict(k), 'value': v} for k, v in series.items()]
+                        for name, series in self._counters.items()}
+            timings = {name: [{'labels': dict(k), 'count': t['count'], 'sum': t['sum'],
+                               'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], t['buckets']))}
+                              for k, t in series.items()]
+                       for name, series in self._timings.items()}
+            gauges = dict(self._gauges)
+        gauge_values = {}
+        for name, callback in gauges.items():
+            try:
+                gauge_values[name] = callback()
+            except Exception as e:
+                gauge_values[name] = {'error': str(e)}
+        return {'enabled': self.enabled, 'counters': counters, 'timings': timings, 'gauges': gauge_values}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, default=str)
+
+    def to_prometheus(self, prefix: str = "ifc_") -> str:
+        """Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, series in sorted(snapshot['counters'].items()):
+            lines.append(f"# TYPE {prefix}{name} counter")
+            for item in series:
+                lines.append(f"{prefix}{name}{_format_labels(_label_key(item['labels']))} {item['value']}")
+        for name, series in sorted(snapshot['timings'].items()):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            for item in series:
+                key = _label_key(item['labels'])
+                cumulative = 0
+                for bound, count in item['buckets'].items():
+                    cumulative += count
+                    lines.append(f"{prefix}{name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+                lines.append(f"{prefix}{name}_sum{_format_labels(key)} {item['sum']}")
+                lines.append(f"{prefix}{name}_count{_format_labels(key)} {item['count']}")
+        for name, values in sorted(snapshot['gauges'].items()):
+            for field, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}{name}_{field} gauge")
+                    lines.append(f"{prefix}{name}_{field} {value}")
+        return "\n".join(lines) + "\n"
+
+    def request_profile(self) -> None:
+        """Profile the next ingest with cProfile."""
+        self._profile_requested = True
+
+    @contextmanager
+    def profiled(self, label: str):
+        """Run a block under cProfile if a profile was requested; yields the stats path or None."""
+        if not self._profile_requested:
+            yield None
+            return
+        self._profile_requested = os.environ.get("IFC_PROFILE_INGEST") == "1"
+        os.makedirs(self.profile_dir, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() or c in "-_." else "_" for c in label)
+        path = os.path.join(self.profile_dir, f"{safe_label}_{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield path
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> None:
+        """Serve /metrics and /metrics.json from a daemon thread (once per process)."""
+        if self._server is not None:
+            return
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, content_type = registry.to_json(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                payload = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics-server").start()
+
+
+METRICS = MetricsRegistry(enabled=os.environ.get("IFC_METRICS") == "1")
+
+if os.environ.get("IFC_METRICS_PORT"):
+    METRICS.serve(int(os.environ["IFC_METRICS_PORT"]))
@@ -0,0 +1,190 @@
+"""
+Process-wide cache of processed models and derived read-only data, shared by sessions.
+"""
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+import numpy as np
+
+
+class SharedModelCache:
+    """Reference-counted LRU cache with a global memory budget.
+
+    Entries are keyed by content hash (e.g. ``('model', sha256)``) and are
+    treated as immutable: numpy arrays are frozen read-only and callers get
+    shallow views rather than copies. Sessions holding an entry are tracked
+    by id; only entries no live session holds are evicted, least recently
+    used first, once the budget is exceeded. Loading is serialised per key,
+    so sessions opening the same model at the same time parse it once.
+    """
+
+    def __init__(self, memory_budget_mb: float = 1024):
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks: Dict[Hashable, threading.Lock] = {}
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry['value']
+
+    def put(self, key: Hashable, value: Any, nbytes: Optional[int] = None,
+            session_id: Optional[str] = None) -> Any:
+        """Store a value and evict unheld entries beyond the budget. Returns the stored value."""
+        value = self._freeze(value)
+        if nbytes is None:
+            nbytes = self._estimate_size(value)
+        with self._lock:
+            holders = self._entries[key]['holders'] if key in self._entries else set()
+            if session_id is not None:
+                holders.add(session_id)
+            self._entries[key] = {
+                'value': value,
+                'nbytes': nbytes,
+                'holders': holders
+            }
+            self._entries.move_to_end(key)
+            self._evict()
+        return value
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any],
+                      session_id: Optional[str] = None) -> Optional[Any]:
+        """Return the cached value, building it with factory on a miss.
+
+        A factory result of None (a failed load) is not cached. When a
+        session id is given the session becomes a holder of the entry.
+        """
+        value = self.get(key)
+        if value is None:
+            with self._lock:
+                load_lock = self._load_locks.setdefault(key, threading.Lock())
+            with load_lock:
+                value = self.get(key)
+                if value is None:
+                    with self._lock:
+                        self.misses += 1
+                    value = factory()
+                    if value is None:
+                        return None
+                    return self.put(key, value, session_id=session_id)
+                with self._lock:
+                    self.hits += 1
+        else:
+            with self._lock:
+                self.hits += 1
+        if session_id is not None:
+            self.acquire(key, session_id)
+        return value
+
+    def acquire(self, key: Hashable, session_id: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['holders'].add(session_id)
+
+    def release(self, key: Hashable, session_id: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['holders'].discard(session_id)
+            self._evict()
+
+    def release_content(self, content_hash: str, session_id: str) -> None:
+        """Release a session's hold on every entry keyed ``(kind, content_hash)``."""
+        with self._lock:
+            for key, entry in self._entries.items():
+                if isinstance(key, tuple) and len(key) == 2 and key[1] == content_hash:
+                    entry['holders'].discard(session_id)
+            self._evict()
+
+    def prune_sessions(self, is_active: Callable[[str], bool]) -> None:
+        """Drop holders whose sessions have ended, then evict if over budget."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry['holders'] = {s for s in entry['holders'] if is_active(s)}
+            self._evict()
+
+    def memory_usage_bytes(self) -> int:
+        with self._lock:
+            return sum(entry['nbytes'] for entry in self._entries.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions: Set[str] = set()
+            for entry in self._entries.values():
+                sessions |= entry['holders']
+            return {
+                'entries': len(self._entries),
+                'memory_mb': self.memory_usage_bytes() / (1024 * 1024),
+                'budget_mb': self.memory_budget_bytes / (1024 * 1024),
+                'sessions': len(sessions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _evict(self) -> None:
+        """Evict least recently used unheld entries until within budget (caller holds the lock)."""
+        used = sum(entry['nbytes'] for entry in self._entries.values())
+        for key in list(self._entries):
+            if used <= self.memory_budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry['holders']:
+                continue
+            used -= entry['nbytes']
+            del self._entries[key]
+            self._load_locks.pop(key, None)
+
+    @staticmethod
+    def _freeze(value: Any) -> Any:
+        """Make arrays (also those directly inside a dict) read-only."""
+        arrays = value.values() if isinstance(value, dict) else [value]
+        for array in arrays:
+            if isinstance(array, np.ndarray):
+                array.setflags(write=False)
+        return value
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        """Approximate deep size in bytes of nested dicts, lists and arrays."""
+        seen = set()
+        total = 0
+        stack = [value]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            if isinstance(obj, np.ndarray):
+                total += obj.nbytes
+                continue
+            total += sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+            elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+                stack.append(vars(obj))
+        return total
@@ -0,0 +1,278 @@
+"""
+Numeric property index with SI unit normalisation for range queries.
+
+Ingest records a unit label with every numeric property and quantity value
+(the explicit unit, or the project unit from ``IfcUnitAssignment`` for the
+value's measure type) and stores the model's units in the processed data as
+``units``: label -> {'type', 'si_unit', 'scale', 'project'}. ``NumericIndex``
+converts every numeric value to SI with that table and keeps, per
+(property set, property), the values sorted next to their element indices,
+so a range query is two bisections.
+"""
+
+import math
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+
+from src.utils import type_objects
+
+# IfcSIUnitName -> (SI symbol, power the prefix applies with, scale of the unprefixed unit)
+SI_UNITS = {
+    'METRE': ('m', 1, 1.0),
+    'SQUARE_METRE': ('m2', 2, 1.0),
+    'CUBIC_METRE': ('m3', 3, 1.0),
+    'GRAM': ('kg', 1, 1e-3),
+    'SECOND': ('s', 1, 1.0),
+    'AMPERE': ('A', 1, 1.0),
+    'KELVIN': ('K', 1, 1.0),
+    # Kept in Celsius: normalising would need an offset as well as a scale
+    'DEGREE_CELSIUS': ('°C', 1, 1.0),
+    'MOLE': ('mol', 1, 1.0),
+    'CANDELA': ('cd', 1, 1.0),
+    'RADIAN': ('rad', 1, 1.0),
+    'STERADIAN': ('sr', 1, 1.0),
+    'HERTZ': ('Hz', 1, 1.0),
+    'NEWTON': ('N', 1, 1.0),
+    'PASCAL': ('Pa', 1, 1.0),
+    'JOULE': ('J', 1, 1.0),
+    'WATT': ('W', 1, 1.0),
+    'COULOMB': ('C', 1, 1.0),
+    'VOLT': ('V', 1, 1.0),
+    'FARAD': ('F', 1, 1.0),
+    'OHM': ('ohm', 1, 1.0),
+    'SIEMENS': ('S', 1, 1.0),
+    'WEBER': ('Wb', 1, 1.0),
+    'TESLA': ('T', 1, 1.0),
+    'HENRY': ('H', 1, 1.0),
+    'LUMEN': ('lm', 1, 1.0),
+    'LUX': ('lx', 1, 1.0),
+    'BECQUEREL': ('Bq', 1, 1.0),
+    'GRAY': ('Gy', 1, 1.0),
+    'SIEVERT': ('Sv', 1, 1.0),
+}
+
+SI_PREFIXES = {
+    'EXA': 1e18, 'PETA': 1e15, 'TERA': 1e12, 'GIGA': 1e9, 'MEGA': 1e6, 'KILO': 1e3, 'HECTO': 1e2,
+    'DECA': 1e1, 'DECI': 1e-1, 'CENTI': 1e-2, 'MILLI': 1e-3, 'MICRO': 1e-6, 'NANO': 1e-9,
+    'PICO': 1e-12, 'FEMTO': 1e-15, 'ATTO': 1e-18
+}
+
+# Measure types whose unit type is not simply the measure name, e.g. IfcPositiveLengthMeasure -> LENGTHUNIT
+MEASURE_UNIT_TYPES = {
+    'IfcThermalConductivityMeasure': 'THERMALCONDUCTANCEUNIT',
+    'IfcMassMeasure': 'MASSUNIT',
+    'IfcRatioMeasure': None,
+    'IfcNormalisedRatioMeasure': None,
+    'IfcPositiveRatioMeasure': None,
+    'IfcCountMeasure': None,
+    'IfcNumericMeasure': None,
+    'IfcParameterValue': None,
+}
+
+# Unit types -> SI symbol, for values stored without a unit but with their measure type
+UNIT_TYPE_SI = {
+    'LENGTHUNIT': 'm', 'AREAUNIT': 'm2', 'VOLUMEUNIT': 'm3', 'MASSUNIT': 'kg', 'TIMEUNIT': 's',
+    'PLANEANGLEUNIT': 'rad', 'THERMODYNAMICTEMPERATUREUNIT': 'K',
+}
+
+QUANTITY_UNIT_TYPES = {
+    'IfcQuantityLength': 'LENGTHUNIT',
+    'IfcQuantityArea': 'AREAUNIT',
+    'IfcQuantityVolume': 'VOLUMEUNIT',
+    'IfcQuantityWeight': 'MASSUNIT',
+    'IfcQuantityTime': 'TIMEUNIT',
+}
+
+# Units people type in questions -> (SI unit, scale)
+QUERY_UNITS = {
+    'mm': ('m', 1e-3), 'cm': ('m', 1e-2), 'm': ('m', 1.0), 'km': ('m', 1e3),
+    'in': ('m', 0.0254), 'inch': ('m', 0.0254), 'inches': ('m', 0.0254), 'ft': ('m', 0.3048), 'feet': ('m', 0.3048),
+    'mm2': ('m2', 1e-6), 'cm2': ('m2', 1e-4), 'm2': ('m2', 1.0), 'sqm': ('m2', 1.0),
+    'mm3': ('m3', 1e-9), 'cm3': ('m3', 1e-6), 'm3': ('m3', 1.0), 'l': ('m3', 1e-3), 'litres': ('m3', 1e-3),
+    'g': ('kg', 1e-3), 'kg': ('kg', 1.0), 't': ('kg', 1e3), 'tonnes': ('kg', 1e3),
+    'deg': ('rad', math.pi / 180), 'degrees': ('rad', math.pi / 180), 'rad': ('rad', 1.0),
+}
+
+_SUPERSCRIPTS = str.maketrans('²³', '23')
+
+
+def si_unit(name: str, prefix: Optional[str] = None) -> Optional[Tuple[str, float]]:
+    """SI symbol and scale of an IfcSIUnit, e.g. ('METRE', 'MILLI') -> ('m', 0.001)."""
+    if name not in SI_UNITS:
+        return None
+    symbol, power, scale = SI_UNITS[name]
+    return symbol, scale * SI_PREFIXES.get(prefix, 1.0) ** power
+
+
+def parse_si_label(label: str) -> Optional[Tuple[str, float]]:
+    """SI symbol and scale of a unit label written by ingest, e.g. 'MILLIMETRE' -> ('m', 0.001)."""
+    if label in SI_UNITS:
+        return si_unit(label)
+    for prefix in SI_PREFIXES:
+        if label.startswith(prefix) and label[len(prefix):] in SI_UNITS:
+            return si_unit(label[len(prefix):], prefix)
+    return None
+
+
+@lru_cache(maxsize=None)
+def measure_unit_type(measure_type: str) -> Optional[str]:
+    """Unit type a measure value is expressed in, e.g. 'IfcPositiveLengthMeasure' -> 'LENGTHUNIT'."""
+    if measure_type in MEASURE_UNIT_TYPES:
+        return MEASURE_UNIT_TYPES[measure_type]
+    match = re.fullmatch(r"Ifc(?:Positive|NonNegative)?(\w+)Measure", measure_type)
+    return f"{match.group(1).upper()}UNIT" if match else None
+
+
+def parse_query_unit(text: Optional[str]) -> Optional[Tuple[str, float]]:
+    """SI unit and scale of a unit typed in a question ('mm', 'm²', ...), or None."""
+    if not text:
+        return None
+    return QUERY_UNITS.get(text.lower().translate(_SUPERSCRIPTS).rstrip('.'))
+
+
+def to_si(value: float, scale: float) -> float:
+    """Value times scale; sub-unit scales divide by their exact inverse, so 1500 mm is exactly 1.5 m."""
+    if 0 < scale < 1:
+        inverse = round(1 / scale)
+        if abs(inverse * scale - 1) < 1e-12:
+            return value / inverse
+    return value * scale
+
+
+def from_si(value: float, scale: float) -> float:
+    """Inverse of to_si."""
+    if 0 < scale < 1:
+        inverse = round(1 / scale)
+        if abs(inverse * scale - 1) < 1e-12:
+            return value * inverse
+    return value / scale
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def normalize_key(name: str) -> str:
+    """Property name for matching: lowercase without spaces or underscores."""
+    return re.sub(r"[\s_]+", "", name).lower()
+
+
+class NumericIndex:
+    """Sorted SI values per (property set, property) for range queries.
+
+    Values whose unit is in the model's ``units`` table (or is a plain SI
+    label such as 'MILLIMETRE') are converted to SI; values without a unit
+    are kept as they are. When elements disagree on the unit of a property,
+    the most common one is indexed and the rest are counted in ``skipped``.
+    """
+
+    TOLERANCE = 1e-9
+
+    def __init__(self, data: Dict[str, Any]):
+        self.units: Dict[str, Dict[str, Any]] = (data.get('units') or {}) if isinstance(data, dict) else {}
+        self._conversions: Dict[Optional[str], Tuple[Optional[str], float]] = {None: (None, 1.0)}
+        collected: Dict[Tuple[str, str], Dict[Optional[str], List[Tuple[float, int]]]] = \
+            defaultdict(lambda: defaultdict(list))
+        measure_types: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+        # Type object properties count for every element of the type
+        for i, element in enumerate(type_objects.resolved_elements(data)):
+            for pset_name, properties in (element.get('properties') or {}).items():
+                if not isinstance(properties, dict):
+                    continue
+                for prop_name, prop in properties.items():
+                    if not isinstance(prop, dict) or not is_number(prop.get('value')):
+                        continue
+                    unit, scale = self._conversion(prop.get('unit'))
+                    collected[(pset_name, prop_name)][unit].append((to_si(prop['value'], scale), i))
+                    if unit is None and prop.get('type'):
+                        measure_types[(pset_name, prop_name)][prop['type']] += 1
+
+        self.values: Dict[Tuple[str, str], array] = {}
+        self.element_ids: Dict[Tuple[str, str], array] = {}
+        self.si_units: Dict[Tuple[str, str], Optional[str]] = {}
+        self.skipped = 0
+        for key, by_unit in collected.items():
+            unit, pairs = max(by_unit.items(), key=lambda item: len(item[1]))
+            self.skipped += sum(len(other) for other in by_unit.values()) - len(pairs)
+            pairs.sort()
+            self.values[key] = array('d', (value for value, _ in pairs))
+            self.element_ids[key] = array('i', (i for _, i in pairs))
+            self.si_units[key] = unit
+        # SI unit implied by the measure type of values indexed without a unit
+        self._measure_units: Dict[Tuple[str, str], str] = {}
+        for key, counts in measure_types.items():
+            unit_type = measure_unit_type(counts.most_common(1)[0][0])
+            if self.si_units[key] is None and unit_type in UNIT_TYPE_SI:
+                self._measure_units[key] = UNIT_TYPE_SI[unit_type]
+
+        self._by_name: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        for key in sorted(self.values):
+            self._by_name[normalize_key(key[1])].append(key)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def keys(self) -> List[Tuple[str, str]]:
+        """Indexed (property set, property) pairs, sorted."""
+        return sorted(self.values)
+
+    def find(self, prop_name: str) -> List[Tuple[str, str]]:
+        """Keys of every property set holding a property of this name (ignoring case and spaces)."""
+        return list(self._by_name.get(normalize_key(prop_name), []))
+
+    def dimension(self, key: Tuple[str, str]) -> Optional[str]:
+        """SI unit of a property's values: their own, else the one their measure type implies (or None)."""
+        return self.si_units.get(key) or self._measure_units.get(key)
+
+    def bounds(self, key: Tuple[str, str]) -> Tuple[float, float]:
+        values = self.values[key]
+        return values[0], values[-1]
+
+    def range(self, key: Tuple[str, str], low: Optional[float] = None, high: Optional[float] = None,
+              include_low: bool = True, include_high: bool = True) -> Tuple[array, array]:
+        """Element indices and SI values of a property within [low, high], sorted by value.
+
+        Either bound may be None for an open range; ``include_low`` and
+        ``include_high`` make the bounds exclusive when False. Values within
+        a relative TOLERANCE of a bound count as equal to it, since authoring
+        tools store e.g. 1500 mm as 1499.9999999999998.
+        """
+        values = self.values.get(key)
+        if values is None:
+            return array('i'), array('d')
+        start, end = 0, len(values)
+        if low is not None:
+            margin = abs(low) * self.TOLERANCE
+            start = bisect_left(values, low - margin) if include_low else bisect_right(values, low + margin)
+        if high is not None:
+            margin = abs(high) * self.TOLERANCE
+            end = bisect_right(values, high + margin) if include_high else bisect_left(values, high - margin)
+        end = max(start, end)
+        return self.element_ids[key][start:end], values[start:end]
+
+    def project_unit(self, si_symbol: Optional[str]) -> Tuple[Optional[str], float]:
+        """The project's display unit for an SI unit, as (label, scale to SI).
+
+        Used to show values the way the model was authored and to read
+        numbers typed without a unit; falls back to the SI unit itself.
+        """
+        if si_symbol is not None:
+            for label, info in self.units.items():
+                if info.get('project') and info.get('si_unit') == si_symbol and info.get('scale'):
+                    return label, info['scale']
+        return si_symbol, 1.0
+
+    def _conversion(self, unit: Optional[str]) -> Tuple[Optional[str], float]:
+        """SI unit and scale for a unit label; unknown units are kept as they are."""
+        if unit not in self._conversions:
+            info = self.units.get(unit)
+            if info and info.get('si_unit') and info.get('scale'):
+                self._conversions[unit] = (info['si_unit'], info['scale'])
+            else:
+                self._conversions[unit] = parse_si_label(str(unit)) or (str(unit), 1.0)
+        return self._conversions[unit]
+
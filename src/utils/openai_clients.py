@@ -0,0 +1,93 @@
+"""
+Shared, connection-pooled OpenAI clients.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, TYPE_CHECKING
+
+from src.utils.metrics import METRICS
+
+if TYPE_CHECKING:
+    import openai
+
+
+class OpenAIClientManager:
+    """Process-wide pool of OpenAI clients, one per (API key, base URL).
+
+    Reusing a client keeps its HTTP connections alive between requests, so a
+    chat turn or embedding batch does not pay for client construction and a
+    fresh TLS handshake. Each session passes its own key explicitly, instead
+    of setting the module-global ``openai.api_key`` that concurrent sessions
+    would overwrite.
+
+    The SDK is imported on first use rather than with this module, as it
+    takes about half a second to import.
+    """
+
+    TIMEOUT_S = 60.0
+    CONNECT_TIMEOUT_S = 5.0
+    MAX_CONNECTIONS = 50
+    MAX_KEEPALIVE_CONNECTIONS = 20
+    KEEPALIVE_EXPIRY_S = 120.0
+    MAX_RETRIES = 3
+    MAX_CLIENTS = 32
+
+    _clients: "OrderedDict[Tuple[str, Optional[str]], openai.OpenAI]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, api_key: str, base_url: Optional[str] = None) -> "openai.OpenAI":
+        """Return the pooled client for an API key, creating it on first use."""
+        if not api_key:
+            raise ValueError("API key not set. Call set_api_key first.")
+        # Keys are only held by the client itself, not as dictionary keys
+        pool_key = (hashlib.sha256(api_key.encode('utf-8')).hexdigest(), base_url)
+        with cls._lock:
+            client = cls._clients.get(pool_key)
+            if client is not None:
+                cls._clients.move_to_end(pool_key)
+                return client
+            import openai
+
+            timeout = openai.Timeout(cls.TIMEOUT_S, connect=cls.CONNECT_TIMEOUT_S)
+            # Built from the SDK's own Limits type so the HTTP backend it bundles is used
+            limits = type(openai.DEFAULT_CONNECTION_LIMITS)(
+                max_connections=cls.MAX_CONNECTIONS,
+                max_keepalive_connections=cls.MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=cls.KEEPALIVE_EXPIRY_S
+            )
+            client = openai.OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=cls.MAX_RETRIES,
+                timeout=timeout,
+                http_client=openai.DefaultHttpxClient(
+                    limits=limits, timeout=timeout,
+                    event_hooks={'request': [cls._on_request], 'response': [cls._on_response]}
+                )
+            )
+            cls._clients[pool_key] = client
+            while len(cls._clients) > cls.MAX_CLIENTS:
+                # Not closed here: a session may still be mid-request with it
+                cls._clients.popitem(last=False)
+            return client
+
+    @staticmethod
+    def _on_request(request) -> None:
+        # The SDK numbers its own retries in this header
+        if request.headers.get('x-stainless-retry-count', '0') != '0':
+            METRICS.incr('api_retries', path=request.url.path)
+
+    @staticmethod
+    def _on_response(response) -> None:
+        METRICS.incr('api_http_responses', path=response.request.url.path, status=response.status_code)
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Close every pooled client and its connections."""
+        with cls._lock:
+            for client in cls._clients.values():
+                client.close()
+            cls._clients.clear()
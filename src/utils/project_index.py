@@ -0,0 +1,242 @@
+"""
+Project-level embedding index spanning the embedding stores of many IFC files.
+"""
+
+import hashlib
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from src.utils.embedding import EmbeddingProcessor, EmbeddingRows
+from src.utils.tracing import PipelineTrace, ensure_trace
+
+
+class ProjectIndex:
+    """Searchable index over one embedding shard per source model file.
+
+    Shards are registered by path and only loaded when a search needs them.
+    Loaded shards are kept in least-recently-used order and evicted once their
+    combined size exceeds the memory budget. Searches fan out over all shards
+    in a thread pool and merge the per-shard results into a global ranking.
+    """
+
+    def __init__(self, memory_budget_mb: float = 512, max_workers: int = 4):
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.max_workers = max_workers
+        self.search_dimensions: Optional[int] = None
+        self.shards: Dict[str, Dict[str, Any]] = {}
+        self._loaded: "OrderedDict[str, EmbeddingProcessor]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_shard(self, source: str, file_path: str, format: str = 'pickle') -> None:
+        """Register a saved embedding store as the shard for a source file."""
+        if format not in ('pickle', 'json'):
+            raise ValueError("Format must be either 'pickle' or 'json'")
+        with self._lock:
+            self.shards[source] = {'path': file_path, 'format': format, 'count': None, 'model': None}
+            self._loaded.pop(source, None)
+
+    def add_processor(self, source: str, embedding_processor: EmbeddingProcessor, directory: str) -> str:
+        """Save an in-memory embedding store as a shard and register it."""
+        os.makedirs(directory, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in source)
+        file_path = os.path.join(directory, f"{safe_name}.pickle")
+        embedding_processor.save_embeddings(file_path, format='pickle')
+        self.add_shard(source, file_path, format='pickle')
+        return file_path
+
+    def remove_shard(self, source: str) -> None:
+        """Forget a shard. The file on disk is left untouched."""
+        with self._lock:
+            self.shards.pop(source, None)
+            self._loaded.pop(source, None)
+
+    def set_search_dimensions(self, dimensions: Optional[int]) -> None:
+        """Use reduced-dimension search with re-ranking in every shard."""
+        with self._lock:
+            self.search_dimensions = dimensions
+            for processor in self._loaded.values():
+                processor.set_search_dimensions(dimensions)
+
+    @property
+    def loaded_sources(self) -> List[str]:
+        """Sources currently resident in memory, least recently used first."""
+        with self._lock:
+            return list(self._loaded.keys())
+
+    @property
+    def memory_usage_bytes(self) -> int:
+        with self._lock:
+            return sum(self._shard_bytes(p) for p in self._loaded.values())
+
+    def fingerprint(self) -> str:
+        """Hash identifying the current set of shards and their file versions."""
+        digest = hashlib.sha1()
+        with self._lock:
+            for source in sorted(self.shards):
+                path = self.shards[source]['path']
+                mtime = os.path.getmtime(path) if os.path.exists(path) else 0
+                digest.update(f"{source}|{path}|{mtime}\0".encode('utf-8'))
+        return digest.hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def find_top_similar(self, query: str, top_k: int = 3, query_processor: Optional[EmbeddingProcessor] = None,
+                         query_embedding: Optional[np.ndarray] = None,
+                         trace: Optional[PipelineTrace] = None) -> List[Dict[str, Any]]:
+        """Find the K most similar texts across all shards.
+
+        Args:
+            query: Search text
+            top_k: Number of results in the merged ranking
+            query_processor: Processor (with API key) used to embed the query
+            query_embedding: Precomputed query vector, skips the API call
+            trace: Optional trace receiving embedding and shard search timings
+        """
+        trace = ensure_trace(trace)
+        query_embedding = self._query_embedding(query, query_processor, query_embedding, trace)
+        per_shard = self._search_all(
+            lambda processor: processor.find_top_similar(query, top_k=top_k, query_embedding=query_embedding),
+            trace, query_processor, query_embedding
+        )
+        return heapq.nlargest(top_k, per_shard, key=lambda r: r['similarity_score'])
+
+    def find_similar_by_threshold(self, query: str, threshold: float = 0.7,
+                                  query_processor: Optional[EmbeddingProcessor] = None,
+                                  query_embedding: Optional[np.ndarray] = None,
+                                  trace: Optional[PipelineTrace] = None) -> List[Dict[str, Any]]:
+        """Find all texts across all shards with similarity above the threshold."""
+        trace = ensure_trace(trace)
+        query_embedding = self._query_embedding(query, query_processor, query_embedding, trace)
+        results = self._search_all(
+            lambda processor: processor.find_similar_by_threshold(query, threshold=threshold,
+                                                                  query_embedding=query_embedding),
+            trace, query_processor, query_embedding
+        )
+        results.sort(key=lambda r: r['similarity_score'], reverse=True)
+        trace.set('search_results', len(results))
+        return results
+
+    def _query_embedding(self, query: str, query_processor: Optional[EmbeddingProcessor],
+                         query_embedding: Optional[np.ndarray], trace: PipelineTrace) -> np.ndarray:
+        if query_embedding is not None:
+            return query_embedding
+        if query_processor is None:
+            raise ValueError("A query_processor or query_embedding is required to search the project index.")
+        return query_processor.embed_query(query, trace)
+
+    def _search_all(self, search, trace: PipelineTrace, query_processor: Optional[EmbeddingProcessor],
+                    query_embedding: np.ndarray) -> List[Dict[str, Any]]:
+        """Run a per-shard search on every shard in parallel and tag results with their source.
+
+        Every shard is checked against the query first: against the querying
+        processor's model and dimensions when there is one, else against the
+        length of the query vector.
+        """
+        if not self.shards:
+            raise ValueError("No shards in the project index. Add embedding stores first.")
+        query_model = (query_processor.model, query_processor.dimensions) if query_processor is not None else None
+
+        def search_shard(source):
+            if source not in self._loaded:
+                trace.incr('shards_loaded')
+            processor = self._get_shard(source)
+            self._check_query(processor, source, query_model, len(query_embedding))
+            results = search(processor)
+            for result in results:
+                result['source'] = source
+            return results
+
+        sources = list(self.shards.keys())
+        # Shards run concurrently, so only the whole fan-out is timed
+        with trace.stage('shard_search'):
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(sources))) as pool:
+                results = [result for results in pool.map(search_shard, sources) for result in results]
+        trace.set('shards_searched', len(sources))
+        return results
+
+    def _get_shard(self, source: str) -> EmbeddingProcessor:
+        """Return a loaded shard, loading it and evicting others if needed."""
+        with self._lock:
+            if source in self._loaded:
+                self._loaded.move_to_end(source)
+                return self._loaded[source]
+            shard = self.shards[source]
+
+        processor = EmbeddingProcessor()
+        processor.load_embeddings(shard['path'], format=shard['format'])
+        if self.search_dimensions is not None:
+            processor.set_search_dimensions(self.search_dimensions)
+        if len(processor.embeddings):
+            # Built now, so the memory budget accounts for it
+            processor._search_index()
+
+        with self._lock:
+            if source not in self.shards:
+                return processor
+            shard['count'] = len(processor.embeddings)
+            shard['model'] = processor.model
+            self._check_model(processor, source)
+            self._loaded[source] = processor
+            self._loaded.move_to_end(source)
+            self._evict(keep=source)
+        return processor
+
+    def _check_model(self, processor: EmbeddingProcessor, source: str) -> None:
+        """All shards must be comparable with a single query vector."""
+        for other_source, other in self._loaded.items():
+            if other_source != source and (other.model, other.dimensions) != (processor.model, processor.dimensions):
+                raise ValueError(
+                    f"Shard '{source}' uses {self._describe_model(processor.model, processor.dimensions)} but "
+                    f"'{other_source}' uses {self._describe_model(other.model, other.dimensions)}. "
+                    "All shards in a project must use the same embedding model and dimensions."
+                )
+
+    def _check_query(self, processor: EmbeddingProcessor, source: str, query_model: Optional[tuple],
+                     query_dims: int) -> None:
+        """A shard must be searchable with the query vector."""
+        if query_model is not None and (processor.model, processor.dimensions) != query_model:
+            raise ValueError(
+                f"Shard '{source}' uses {self._describe_model(processor.model, processor.dimensions)} but the "
+                f"query uses {self._describe_model(*query_model)}. Select the shards' embedding model to search them."
+            )
+        shard_dims = len(processor.embeddings[0]) if len(processor.embeddings) else query_dims
+        if shard_dims != query_dims:
+            raise ValueError(f"Shard '{source}' has {shard_dims}-dimension vectors but the query vector has {query_dims}.")
+
+    @staticmethod
+    def _describe_model(model: str, dimensions: Optional[int]) -> str:
+        return f"{model} ({dimensions} dimensions)" if dimensions else model
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used shards until the loaded set fits the budget."""
+        total = sum(self._shard_bytes(p) for p in self._loaded.values())
+        for source in list(self._loaded.keys()):
+            if total <= self.memory_budget_bytes:
+                break
+            if source == keep:
+                continue
+            total -= self._shard_bytes(self._loaded.pop(source))
+
+    @staticmethod
+    def _shard_bytes(processor: EmbeddingProcessor) -> int:
+        """Approximate resident size of a loaded shard: its vectors, texts and search index."""
+        count = len(processor.embeddings)
+        dims = len(processor.embeddings[0]) if count else 0
+        # A list of Python floats costs ~32 bytes per value; stores are normally float32 matrices
+        bytes_per_value = 36 if isinstance(processor.embeddings, list) else 4
+        vectors = count * dims * bytes_per_value
+        if isinstance(processor.embeddings, EmbeddingRows) and isinstance(processor.embeddings.matrix, np.memmap):
+            # Offloaded vectors are paged in from disk on demand
+            vectors = 0
+        index = processor._index_cache
+        if index is not None:
+            # The normalised (possibly truncated) search matrix; 'full' is the store itself
+            vectors += index['primary'].nbytes
+        return vectors + sum(len(t) for t in processor.texts)
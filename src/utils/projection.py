@@ -0,0 +1,130 @@
+"""
+2D/3D projections of embedding stores, computed in the background and cached.
+"""
+
+import importlib.util
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+# scikit-learn and openTSNE take over a second to import, so they are only
+# imported once a projection is actually computed
+OPENTSNE_AVAILABLE = importlib.util.find_spec("openTSNE") is not None
+
+METHODS = {
+    "PCA (quick look)": "pca",
+    "t-SNE": "tsne"
+}
+
+
+def project(matrix: np.ndarray, method: str = "pca", n_components: int = 2,
+            pre_dims: int = 50, random_state: int = 42) -> np.ndarray:
+    """Project vectors to 2 or 3 dimensions.
+
+    Vectors are first reduced to ``pre_dims`` with randomized PCA. 'pca'
+    keeps the leading components of that; 'tsne' runs Barnes-Hut t-SNE on
+    the reduced vectors (FFT-accelerated openTSNE for 2D when installed).
+    """
+    if method not in ("pca", "tsne"):
+        raise ValueError(f"Unknown projection method: {method}")
+    if n_components not in (2, 3):
+        raise ValueError("n_components must be 2 or 3")
+    data = np.asarray(matrix, dtype=np.float32)
+    n, d = data.shape
+    if n <= n_components:
+        # Too few points to fit anything; lay them out on the first axes
+        result = np.zeros((n, n_components), dtype=np.float32)
+        result[:, :min(d, n_components)] = data[:, :n_components]
+        return result
+
+    from sklearn.decomposition import PCA
+
+    dims = min(pre_dims, n, d)
+    reduced = PCA(n_components=dims, svd_solver='randomized', random_state=random_state).fit_transform(data)
+    if method == "pca":
+        result = np.zeros((n, n_components), dtype=np.float32)
+        result[:, :min(dims, n_components)] = reduced[:, :n_components]
+        return result
+
+    perplexity = float(min(30, max(2, (n - 1) // 3)))
+    if OPENTSNE_AVAILABLE and n_components == 2:
+        from openTSNE import TSNE as FastTSNE
+        embedding = FastTSNE(n_components=2, perplexity=perplexity, random_state=random_state,
+                             n_jobs=-1).fit(reduced)
+        return np.asarray(embedding, dtype=np.float32)
+    from sklearn.manifold import TSNE
+    tsne = TSNE(n_components=n_components, perplexity=perplexity, init='pca',
+                method='barnes_hut', random_state=random_state)
+    return tsne.fit_transform(reduced).astype(np.float32)
+
+
+class ProjectionService:
+    """Run projections on a worker thread and keep the finished ones.
+
+    Jobs are keyed by (store fingerprint, method, dimensions); asking for a
+    key that is running or done never starts a second computation, so
+    reruns and tab switches only poll for the result.
+    """
+
+    def __init__(self, max_workers: int = 1, max_results: int = 16):
+        self.max_results = max_results
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="projection")
+        self._jobs: "OrderedDict[Hashable, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key: Tuple[str, str, int], matrix: np.ndarray, retry: bool = False, **kwargs) -> Future:
+        """Start a projection for key unless there is one already.
+
+        A failed projection is kept, with its error, until it is submitted
+        again with ``retry``.
+        """
+        fingerprint, method, n_components = key
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not (retry and job.done() and job.exception() is not None):
+                self._jobs.move_to_end(key)
+                return job
+            job = self._executor.submit(project, matrix, method, n_components, **kwargs)
+            self._jobs[key] = job
+            self._trim()
+            return job
+
+    def result(self, key: Hashable) -> Optional[np.ndarray]:
+        """The finished projection for key, or None while it is pending or unknown."""
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is None or not job.done():
+            return None
+        return job.result()
+
+    def error(self, key: Hashable) -> Optional[str]:
+        """Why the projection for key failed, or None if it has not."""
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is None or not job.done() or job.exception() is None:
+            return None
+        return str(job.exception())
+
+    def status(self, key: Hashable) -> str:
+        """'missing', 'running', 'failed' or 'done'."""
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is None:
+            return "missing"
+        if not job.done():
+            return "running"
+        return "failed" if job.exception() is not None else "done"
+
+    def _trim(self) -> None:
+        # Only finished jobs are dropped; running ones keep their place
+        for key in list(self._jobs):
+            if len(self._jobs) <= self.max_results:
+                break
+            if self._jobs[key].done():
+                del self._jobs[key]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
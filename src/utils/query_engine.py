@@ -0,0 +1,478 @@
+"""
+Structured query engine answering counts, sums and listings directly from processed element data.
+"""
+
+import re
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+
+from src.utils import type_objects
+from src.utils.context_builder import STOPWORDS
+from src.utils.numeric_index import NumericIndex, from_si, normalize_key, parse_query_unit, to_si
+from src.utils.relationship_graph import RelationshipGraph
+
+# Words users type mapped to the IFC classes they mean (subtypes included)
+TYPE_TERMS = {
+    'curtain wall': ['IfcCurtainWall'],
+    'wall': ['IfcWall', 'IfcWallStandardCase', 'IfcWallElementedCase'],
+    'door': ['IfcDoor'],
+    'window': ['IfcWindow'],
+    'slab': ['IfcSlab'],
+    'floor': ['IfcSlab'],
+    'beam': ['IfcBeam'],
+    'column': ['IfcColumn'],
+    'stair': ['IfcStair', 'IfcStairFlight'],
+    'railing': ['IfcRailing'],
+    'roof': ['IfcRoof'],
+    'proxy': ['IfcBuildingElementProxy'],
+    'element': None  # every element
+}
+
+# Boolean qualifiers mapped to (property name, value)
+QUALIFIERS = [
+    (r"\bnon[- ]?load[- ]?bearing\b", ('LoadBearing', False)),
+    (r"\bload[- ]?bearing\b", ('LoadBearing', True)),
+    (r"\bexternal\b|\bexterior\b", ('IsExternal', True)),
+    (r"\binternal\b|\binterior\b", ('IsExternal', False)),
+]
+
+# Measures that can be summed, with the quantity names to prefer (first match per element wins)
+MEASURES = {
+    'area': ['NetArea', 'GrossArea', 'NetSideArea', 'GrossSideArea', 'NetFootprintArea', 'GrossFootprintArea'],
+    'volume': ['NetVolume', 'GrossVolume'],
+    'length': ['Length', 'NetLength', 'GrossLength'],
+    'perimeter': ['Perimeter'],
+    'weight': ['NetWeight', 'GrossWeight'],
+}
+
+# Comparatives mapped to the properties they compare (in order of preference) and the direction
+COMPARATIVES = {
+    'thicker': (['Thickness', 'Width'], '>'), 'thinner': (['Thickness', 'Width'], '<'),
+    'wider': (['Width'], '>'), 'narrower': (['Width'], '<'),
+    'taller': (['Height', 'Unconnected Height'], '>'), 'higher': (['Height', 'Unconnected Height'], '>'),
+    'lower': (['Height', 'Unconnected Height'], '<'),
+    'longer': (['Length'], '>'), 'shorter': (['Length'], '<'),
+    'deeper': (['Depth'], '>'), 'shallower': (['Depth'], '<'),
+    'heavier': (['NetWeight', 'GrossWeight', 'Weight', 'Mass'], '>'),
+    'lighter': (['NetWeight', 'GrossWeight', 'Weight', 'Mass'], '<'),
+}
+# SI unit of the properties comparatives and measures refer to, for values stored without a unit
+PROPERTY_UNITS = {normalize_key(name): unit for names, unit in (
+    (['Thickness', 'Width', 'Height', 'Unconnected Height', 'Depth'] + MEASURES['length'] + MEASURES['perimeter'], 'm'),
+    (MEASURES['area'], 'm2'),
+    (MEASURES['volume'], 'm3'),
+    (MEASURES['weight'] + ['Weight', 'Mass'], 'kg'),
+) for name in names}
+# SI unit each summable measure is totalled in
+MEASURE_UNITS = {'area': 'm2', 'volume': 'm3', 'length': 'm', 'perimeter': 'm', 'weight': 'kg'}
+# A unit written in a property name, e.g. "Volume (cm3)"
+NAME_UNIT_PATTERN = re.compile(r"\(([^()]+)\)")
+COMPARISONS = {
+    'greater than': '>', 'more than': '>', 'larger than': '>', 'over': '>', 'above': '>', 'at least': '>=',
+    'less than': '<', 'smaller than': '<', 'under': '<', 'below': '<', 'at most': '<=', 'between': 'between'
+}
+_NUMBER = r"(\d+(?:\.\d+)?)(?:\s*((?!and\b)[a-z°][a-z0-9²³]*))?"
+COMPARATIVE_PATTERN = re.compile(rf"\b({'|'.join(COMPARATIVES)}) than {_NUMBER}")
+PROPERTY_RANGE_PATTERN = re.compile(
+    rf"\b(?:with|where|whose|having) (?:an? |the |their )?([a-z][a-z ]*?) (?:is |are |of )?"
+    rf"({'|'.join(COMPARISONS)}) {_NUMBER}(?: and {_NUMBER})?")
+
+# Phrases relating the elements asked about to other elements, and the graph edge they follow
+RELATIONS = {
+    'in': 'hosted_by', 'inside': 'hosted_by', 'within': 'hosted_by', 'hosted by': 'hosted_by',
+    'hosted in': 'hosted_by', 'connected to': 'connects', 'connected with': 'connects',
+    'part of': 'part_of', 'belonging to': 'part_of',
+}
+_QUALIFIER_WORDS = r"(?:non[- ]?load[- ]?bearing |load[- ]?bearing |external |exterior |internal |interior )*"
+RELATION_PATTERN = re.compile(
+    rf"\b({'|'.join(sorted(RELATIONS, key=len, reverse=True))}) (?:the |a |an |any |each |every )?"
+    rf"({_QUALIFIER_WORDS})({'|'.join(term for term in TYPE_TERMS if term != 'element')})s?\b")
+
+COUNT_PATTERN = re.compile(r"\bhow many\b|\bcount\b|\bnumber of\b|\btotal number\b")
+SUM_PATTERN = re.compile(r"\btotal\b|\bsum\b|\boverall\b|\bcombined\b")
+LIST_PATTERN = re.compile(r"\b(list|what|which)\b.*\b(types?|kinds?)\b|\b(types?|kinds?) of\b")
+GROUP_PATTERN = re.compile(r"\b(?:by|per) ([a-z][a-z ]*?)\s*\??$")
+
+# Words that carry no filter meaning in an aggregate question
+FILLER_WORDS = STOPWORDS | {
+    "how", "many", "count", "number", "total", "sum", "overall", "combined", "list", "type", "types",
+    "kind", "kinds", "of", "in", "is", "are", "there", "do", "we", "me", "a", "an", "on", "by", "per",
+    "please", "can", "you", "project", "whole", "entire", "non", "load", "bearing", "loadbearing",
+    "external", "exterior", "internal", "interior"
+}
+
+
+class StructuredQueryEngine:
+    """Answer aggregate and lookup questions exactly from the processed elements.
+
+    Per-type element lists and counts are computed once when the engine is
+    built; each question is then a pass over the matching type buckets only.
+    Range questions ("walls thicker than 200 mm") are answered from a
+    NumericIndex of SI-normalised property values. ``answer`` returns None
+    for anything that is not a recognised aggregate, so callers can fall
+    back to similarity search and the LLM.
+    """
+
+    # Matching elements listed in a range answer
+    MAX_LISTED = 10
+
+    def __init__(self, data: Dict[str, Any], numeric: Optional[NumericIndex] = None,
+                 graph: Optional[RelationshipGraph] = None):
+        self.elements: List[Dict[str, Any]] = data.get('elements', []) if isinstance(data, dict) else []
+        self.types: Dict[str, Dict[str, Any]] = (data.get('types') or {}) if isinstance(data, dict) else {}
+        self.numeric = numeric if numeric is not None else NumericIndex(data)
+        self.graph = graph if graph is not None else RelationshipGraph.from_data(data)
+        self.by_type: Dict[str, List[int]] = defaultdict(list)
+        for i, element in enumerate(self.elements):
+            self.by_type[element.get('type', 'Unknown')].append(i)
+        self.type_counts = Counter({t: len(ids) for t, ids in self.by_type.items()})
+
+    def answer(self, query: str) -> Optional[Dict[str, Any]]:
+        """Answer a question if it is a count, sum or listing over element data.
+
+        Returns:
+            Dict with the 'intent', a markdown 'answer', the 'facts' it was
+            computed from and the number of 'elements' considered, or None
+        """
+        text = query.lower().strip()
+        relation = RELATION_PATTERN.search(text) if self.graph is not None else None
+        if relation is not None:
+            # "doors in external walls": the clause selects the related elements, not the ones counted
+            text = f"{text[:relation.start()]} {text[relation.end():]}"
+        term, types = self._match_type(text)
+        if term is None:
+            return None
+        condition = self._match_range(text)
+        if condition is not None:
+            # The clause is fully parsed; only the rest of the question needs checking
+            start, end = condition['span']
+            text = f"{text[:start]} {text[end:]}"
+        group = GROUP_PATTERN.search(text)
+        if self._has_unhandled_words(text, term, group.group(1) if group else ""):
+            # e.g. "how many precast walls": a filter we cannot apply exactly
+            return None
+        # "walls by loadbearing" groups on the property rather than filtering by it
+        qualifiers = self._qualifiers(text[:group.start()] if group else text)
+        indices = self._select(types, qualifiers)
+        label = self._label(term, qualifiers)
+
+        if relation is not None:
+            return self._related(label, indices, relation)
+        if condition is not None:
+            return self._range(label, condition, indices)
+        measure = next((m for m in MEASURES if re.search(rf"\b{m}s?\b", text)), None)
+        summing = measure is not None and SUM_PATTERN.search(text) is not None
+        if group and not summing:
+            # "how many walls by loadbearing" is a grouped count
+            grouped = self._group_by_property(label, group.group(1), indices)
+            if grouped is not None:
+                return grouped
+        if COUNT_PATTERN.search(text):
+            return self._count(label, indices)
+        if summing:
+            return self._sum(label, measure, indices)
+        if LIST_PATTERN.search(text):
+            return self._list_types(label, indices)
+        return None
+
+    @staticmethod
+    def _qualifiers(text: str) -> List[Tuple[str, bool]]:
+        qualifiers = [q for pattern, q in QUALIFIERS if re.search(pattern, text)]
+        # "non-loadbearing" also matches the loadbearing pattern; keep the first (most specific)
+        seen = set()
+        return [q for q in qualifiers if not (q[0] in seen or seen.add(q[0]))]
+
+    def _match_type(self, text: str) -> Tuple[Optional[str], Optional[List[str]]]:
+        for term, types in TYPE_TERMS.items():
+            if re.search(rf"\b{term}s?\b", text):
+                return term, types
+        return None, None
+
+    @staticmethod
+    def _match_range(text: str) -> Optional[Dict[str, Any]]:
+        """A numeric condition such as "thicker than 200 mm" or "with width between 0.9 and 1.2 m".
+
+        Returns the candidate property names, the operator, the bounds as
+        typed with their unit (parsed by parse_query_unit, or None) and the
+        span of the clause in the text.
+        """
+        match = COMPARATIVE_PATTERN.search(text)
+        if match:
+            names, operator = COMPARATIVES[match.group(1)]
+            number_groups = [2]
+        else:
+            match = PROPERTY_RANGE_PATTERN.search(text)
+            if not match:
+                return None
+            phrase = match.group(1).strip()
+            names = MEASURES.get(phrase.rstrip('s'), []) + [phrase]
+            operator = COMPARISONS[match.group(2)]
+            number_groups = [3, 5] if operator == 'between' else [3]
+            if operator == 'between' and match.group(5) is None:
+                return None
+        bounds = []
+        end = match.end()
+        for group in number_groups:
+            unit = parse_query_unit(match.group(group + 1))
+            bounds.append((float(match.group(group)), unit))
+            # A word after the number that is not a unit is left for the rest of the question
+            end = match.end(group + 1) if unit else match.end(group)
+        if len(bounds) == 2 and bounds[0][1] is None:
+            # "between 2 and 3 m": the unit after the second number applies to both
+            bounds[0] = (bounds[0][0], bounds[1][1])
+        return {'properties': names, 'operator': operator, 'bounds': bounds, 'span': (match.start(), end),
+                'text': text[match.start():end]}
+
+    @staticmethod
+    def _has_unhandled_words(text: str, term: str, group_text: str) -> bool:
+        known = FILLER_WORDS | set(term.split()) | set(group_text.split()) | set(MEASURES)
+        for word in re.findall(r"[a-z]+", text):
+            if word not in known and word.rstrip("s") not in known:
+                return True
+        return False
+
+    def _select(self, types: Optional[List[str]], qualifiers: List[Tuple[str, bool]]) -> List[int]:
+        """Indices of elements of the given types that satisfy all boolean qualifiers."""
+        if types is None:
+            indices = list(range(len(self.elements)))
+        else:
+            indices = sorted(i for t in types for i in self.by_type.get(t, []))
+        for prop_name, expected in qualifiers:
+            indices = [i for i in indices if self._bool_property(self._element(i), prop_name) is expected]
+        return indices
+
+    @staticmethod
+    def _label(term: str, qualifiers: List[Tuple[str, bool]]) -> str:
+        words = {('LoadBearing', True): 'loadbearing', ('LoadBearing', False): 'non-loadbearing',
+                 ('IsExternal', True): 'external', ('IsExternal', False): 'internal'}
+        prefix = " ".join(words[q] for q in qualifiers)
+        return f"{prefix} {term}s".strip()
+
+    def _count(self, label: str, indices: List[int]) -> Dict[str, Any]:
+        breakdown = Counter(self.elements[i].get('type', 'Unknown') for i in indices)
+        lines = [f"There are **{len(indices)} {label}** in the model."]
+        if len(breakdown) > 1:
+            lines += [f"- {t}: {n}" for t, n in breakdown.most_common()]
+        return {'intent': 'count', 'answer': "\n".join(lines), 'facts': dict(breakdown), 'elements': len(indices)}
+
+    def _sum(self, label: str, measure: str, indices: List[int]) -> Dict[str, Any]:
+        """Total of one quantity over the elements, from the SI values of the numeric index.
+
+        The total is shown in the project's unit for the measure, with the
+        quantity that was summed; elements without it are counted as missing.
+        """
+        article = "an" if measure[0] in "aeiou" else "a"
+        selected = set(indices)
+        found = self._sum_quantity(measure, selected)
+        if found is None:
+            return {'intent': 'sum', 'answer': f"None of the {len(indices)} {label} have {article} {measure} quantity.",
+                    'facts': {}, 'elements': len(indices)}
+        key, scale = found
+        values = [to_si(value, scale) for i, value in zip(self.numeric.element_ids[key], self.numeric.values[key])
+                  if i in selected]
+        unit_label, unit_scale = self.numeric.project_unit(MEASURE_UNITS[measure])
+        total = from_si(sum(values), unit_scale)
+        quantity = f"{key[0]}.{key[1]}"
+        missing = len(selected) - len(values)
+        lines = [f"The total {measure} of the {label} is **{total:,.3f} {unit_label}** "
+                 f"(sum of {quantity} over {len(values)} elements)."]
+        if missing:
+            lines.append(f"- {missing} {label} have no {key[1]} value and are not included")
+        return {'intent': 'sum', 'answer': "\n".join(lines),
+                'facts': {'total': total, 'unit': unit_label, 'quantity': quantity, 'summed': len(values),
+                          'missing': missing},
+                'elements': len(indices)}
+
+    def _sum_quantity(self, measure: str, selected: set) -> Optional[Tuple[Tuple[str, str], float]]:
+        """The numeric index key to sum for a measure, with the scale of its values to SI.
+
+        The measure's preferred quantities come first, else any property
+        naming the measure ("Volume (cm3)"), a plain name before a longer one;
+        the key most of the elements have wins. Only quantities in the
+        measure's dimension are summed.
+        """
+        def candidates(keys):
+            for key in keys:
+                scale = self._sum_scale(key, MEASURE_UNITS[measure])
+                covered = sum(1 for i in self.numeric.element_ids[key] if i in selected) if scale else 0
+                if covered:
+                    yield (NAME_UNIT_PATTERN.sub("", key[1]).strip().lower() == measure, covered), key, scale
+
+        for name in MEASURES[measure]:
+            best = max(candidates(self.numeric.find(name)), default=None, key=lambda c: c[0])
+            if best is not None:
+                return best[1], best[2]
+        best = max(candidates(k for k in self.numeric.keys() if measure in k[1].lower()), default=None,
+                   key=lambda c: c[0])
+        return (best[1], best[2]) if best is not None else None
+
+    def _sum_scale(self, key: Tuple[str, str], dimension: str) -> Optional[float]:
+        """Scale from a key's indexed values to SI if they measure ``dimension``, else None.
+
+        Values stored without a unit are read in the unit their property
+        name gives ("Volume (cm3)"), else in the project's unit, as in range
+        questions.
+        """
+        si_unit = self.numeric.si_units[key]
+        if si_unit is not None:
+            return 1.0 if si_unit == dimension else None
+        named = NAME_UNIT_PATTERN.search(key[1])
+        unit = parse_query_unit(named.group(1)) if named else None
+        if unit is not None:
+            return unit[1] if unit[0] == dimension else None
+        if (self.numeric.dimension(key) or PROPERTY_UNITS.get(normalize_key(key[1]))) == dimension:
+            return self.numeric.project_unit(dimension)[1]
+        return None
+
+    def _range(self, label: str, condition: Dict[str, Any], indices: List[int]) -> Optional[Dict[str, Any]]:
+        """Elements whose value of the condition's property is in range, looked up in the numeric index.
+
+        The first candidate property that any selected element has is used;
+        an element matches when its value in any property set holding that
+        property is in range.
+        """
+        selected = set(indices)
+        for name in condition['properties']:
+            keys = [key for key in self.numeric.find(name) if not selected.isdisjoint(self.numeric.element_ids[key])]
+            if keys:
+                break
+        else:
+            return None
+
+        matched: Dict[int, Tuple[float, Tuple[str, str]]] = {}
+        covered = set()
+        for key in keys:
+            limits = self._limits(key, condition)
+            if limits is None:
+                # Values in a different dimension than the one asked for
+                continue
+            covered.update(i for i in self.numeric.element_ids[key] if i in selected)
+            ids, values = self.numeric.range(key, *limits)
+            for i, value in zip(ids, values):
+                if i in selected and i not in matched:
+                    matched[i] = (value, key)
+        if not covered:
+            return None
+
+        used = Counter(f"{key[0]}.{key[1]}" for _, key in matched.values())
+        lines = [f"There are **{len(matched)} {label}** {condition['text']}."]
+        lines += [f"- by {name}: {n} elements" for name, n in used.most_common()]
+        missing = len(selected) - len(covered)
+        if missing:
+            lines.append(f"- {missing} {label} have no comparable {keys[0][1]} value and are not included")
+        si_unit = self.numeric.si_units[keys[0]]
+        if any(unit is None for _, unit in condition['bounds']) and si_unit is not None:
+            lines.append(f"Numbers without a unit were read in {self.numeric.project_unit(si_unit)[0]}.")
+        if matched:
+            lines.append(f"Matching {label}, smallest first:")
+            for i, (value, key) in sorted(matched.items(), key=lambda item: item[1][0])[:self.MAX_LISTED]:
+                unit_label, scale = self.numeric.project_unit(self.numeric.si_units[key])
+                lines.append(f"- {self.elements[i].get('name') or 'Unnamed'}: {from_si(value, scale):,.6g} {unit_label or ''}".rstrip())
+            if len(matched) > self.MAX_LISTED:
+                lines.append(f"- ... and {len(matched) - self.MAX_LISTED} more")
+        return {'intent': 'range', 'answer': "\n".join(lines),
+                'facts': {'condition': condition['text'], 'matches': len(matched), 'properties': dict(used),
+                          'missing': missing},
+                'elements': len(indices)}
+
+    def _related(self, label: str, indices: List[int], relation: "re.Match") -> Dict[str, Any]:
+        """Elements related to elements of another type, e.g. the doors hosted by external walls."""
+        phrase, qualifier_text, target_term = relation.groups()
+        kind = RELATIONS[phrase]
+        target_qualifiers = self._qualifiers(qualifier_text)
+        targets = set(self._select(TYPE_TERMS[target_term], target_qualifiers))
+        target_label = self._label(target_term, target_qualifiers)
+
+        per_target = Counter()
+        matched = 0
+        for i in indices:
+            hits = [int(n) for n in self.graph.neighbours(i, kind) if n in targets]
+            if hits:
+                matched += 1
+                per_target.update(hits)
+        lines = [f"There are **{matched} {label}** {phrase} {target_label} "
+                 f"(out of {len(indices)} {label} in the model)."]
+        for target, n in per_target.most_common(self.MAX_LISTED):
+            element = self.elements[target]
+            lines.append(f"- {element.get('name') or 'Unnamed'} ({element.get('type', 'Unknown')}, "
+                         f"{element.get('id', '')}): {n}")
+        if len(per_target) > self.MAX_LISTED:
+            lines.append(f"- ... and {len(per_target) - self.MAX_LISTED} more {target_label}")
+        if not self.graph.kind_counts().get(kind):
+            lines.append(f"The model records no \"{phrase}\" relationships between elements.")
+        return {'intent': 'related', 'answer': "\n".join(lines),
+                'facts': {'relation': kind, 'matches': matched, 'per_target': {
+                    self.elements[t].get('id', str(t)): n for t, n in per_target.items()}},
+                'elements': len(indices)}
+
+    def _limits(self, key: Tuple[str, str], condition: Dict[str, Any]) -> Optional[Tuple]:
+        """Arguments for NumericIndex.range: the condition's bounds converted to the key's SI unit."""
+        si_unit = self.numeric.si_units[key]
+        converted = []
+        for number, unit in condition['bounds']:
+            if unit is None:
+                # A bare number is read in the project's unit, e.g. "wider than 900" in millimetres
+                converted.append(to_si(number, self.numeric.project_unit(si_unit)[1]))
+            elif unit[0] == si_unit:
+                converted.append(to_si(number, unit[1]))
+            elif si_unit is None:
+                # Values stored without a unit are taken to be in the project's unit for the dimension
+                # asked, if that is the property's dimension: "thicker than 200 kg" is not a length
+                expected = self.numeric.dimension(key) or PROPERTY_UNITS.get(normalize_key(key[1]))
+                if unit[0] != expected:
+                    return None
+                converted.append(from_si(to_si(number, unit[1]), self.numeric.project_unit(unit[0])[1]))
+            else:
+                return None
+        operator = condition['operator']
+        if operator == 'between':
+            low, high = sorted(converted)
+            return low, high, True, True
+        value = converted[0]
+        return {'>': (value, None, False, True), '>=': (value, None, True, True),
+                '<': (None, value, True, False), '<=': (None, value, True, True)}[operator]
+
+    def _list_types(self, label: str, indices: List[int]) -> Dict[str, Any]:
+        """Group elements by their type name (the element name without its instance suffix)."""
+        groups = Counter(self._type_name(self.elements[i]) for i in indices)
+        kinds = "type" if len(groups) == 1 else "types"
+        lines = [f"The model has **{len(groups)} {label[:-1]} {kinds}** across {len(indices)} {label}:"]
+        lines += [f"- {name}: {n}" for name, n in groups.most_common()]
+        return {'intent': 'list', 'answer': "\n".join(lines), 'facts': dict(groups), 'elements': len(indices)}
+
+    def _group_by_property(self, label: str, prop_text: str, indices: List[int]) -> Optional[Dict[str, Any]]:
+        key = prop_text.replace(" ", "").lower()
+        groups = Counter()
+        matched_name = None
+        for i in indices:
+            for properties in self._element(i).get('properties', {}).values():
+                hit = next((name for name in properties if name.replace(" ", "").lower() == key), None)
+                if hit is not None:
+                    matched_name = hit
+                    value = properties[hit].get('value')
+                    groups["(empty)" if value in (None, "") else str(value)] += 1
+                    break
+            else:
+                groups["(not set)"] += 1
+        if matched_name is None:
+            return None
+        lines = [f"{label.capitalize()} grouped by **{matched_name}**:"]
+        lines += [f"- {value}: {n}" for value, n in groups.most_common()]
+        return {'intent': 'group', 'answer': "\n".join(lines), 'facts': dict(groups), 'elements': len(indices)}
+
+    def _element(self, i: int) -> Dict[str, Any]:
+        """Element i with the properties of its type object merged in."""
+        return type_objects.resolve(self.elements[i], self.types)
+
+    @staticmethod
+    def _type_name(element: Dict[str, Any]) -> str:
+        # Authoring tools often append the instance id, e.g. "Basic Wall:wall:355992"
+        return re.sub(r":\d+$", "", element.get('name') or "Unnamed")
+
+    @staticmethod
+    def _bool_property(element: Dict[str, Any], prop_name: str) -> Optional[bool]:
+        for properties in element.get('properties', {}).values():
+            prop = properties.get(prop_name)
+            if isinstance(prop, dict) and isinstance(prop.get('value'), bool):
+                return prop['value']
+        return None
@@ -0,0 +1,125 @@
+"""
+Element relationship graph in compressed sparse row (CSR) arrays.
+
+Ingest collects the relationships between extracted elements that the
+element dicts do not carry: openings filled by doors and windows
+(IfcRelVoidsElement + IfcRelFillsElement), element connections
+(IfcRelConnectsElements), decomposition (IfcRelAggregates) and type objects
+(IfcRelDefinesByType). Nodes are the element indices, followed by one node
+per type object. Every relationship is stored in both directions with an
+edge kind, so neighbours of a node, optionally of one kind, are a slice of
+``targets`` between two ``offsets``:
+
+    offsets     int64, nodes + 1 entries
+    targets     int32, node index per edge
+    edge_kinds  int8, index into EDGE_KINDS per edge
+
+The graph is stored with the processed data as ``relationships`` (see
+``to_dict``) and restored with ``RelationshipGraph.from_data``.
+"""
+
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Each relationship and its inverse; the order is part of the stored format
+EDGE_KINDS = ['hosts', 'hosted_by', 'connects', 'aggregates', 'part_of', 'typed_by', 'type_of']
+INVERSE = {'hosts': 'hosted_by', 'hosted_by': 'hosts', 'connects': 'connects', 'aggregates': 'part_of',
+           'part_of': 'aggregates', 'typed_by': 'type_of', 'type_of': 'typed_by'}
+KIND_LABELS = {'hosts': "Hosts", 'hosted_by': "Hosted by", 'connects': "Connected to",
+               'aggregates': "Made of", 'part_of': "Part of", 'typed_by': "Type", 'type_of': "Instances"}
+
+
+class RelationshipGraph:
+    """Typed adjacency of elements and type objects, queried in O(degree)."""
+
+    def __init__(self, offsets: np.ndarray, targets: np.ndarray, edge_kinds: np.ndarray,
+                 element_count: int, types: Optional[List[Dict[str, Any]]] = None):
+        self.offsets = offsets
+        self.targets = targets
+        self.edge_kinds = edge_kinds
+        self.element_count = element_count
+        self.types: List[Dict[str, Any]] = types or []
+        if len(offsets) != element_count + len(self.types) + 1:
+            raise ValueError("Relationship graph offsets do not match its node count")
+
+    @classmethod
+    def from_edges(cls, element_count: int, edges: Iterable[Tuple[int, int, str]],
+                   types: Optional[List[Dict[str, Any]]] = None) -> "RelationshipGraph":
+        """Build the graph from (source node, target node, kind) triples; inverse edges are added."""
+        types = types or []
+        kind_codes = {kind: code for code, kind in enumerate(EDGE_KINDS)}
+        rows = set()
+        for source, target, kind in edges:
+            if source != target:
+                rows.add((source, kind_codes[kind], target))
+                rows.add((target, kind_codes[INVERSE[kind]], source))
+        # Sorted by node, then kind, so each node's edges of one kind are contiguous
+        table = np.array(sorted(rows), dtype=np.int64).reshape(-1, 3)
+        counts = np.bincount(table[:, 0], minlength=element_count + len(types))
+        offsets = np.zeros(element_count + len(types) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(offsets, table[:, 2].astype(np.int32), table[:, 1].astype(np.int8), element_count, types)
+
+    @classmethod
+    def from_data(cls, data: Dict[str, Any]) -> Optional["RelationshipGraph"]:
+        """The graph stored with processed data, or None for data without one."""
+        stored = data.get('relationships') if isinstance(data, dict) else None
+        if not stored:
+            return None
+        if list(stored.get('kinds', EDGE_KINDS)) != EDGE_KINDS:
+            raise ValueError("Relationship graph was stored with different edge kinds")
+        return cls(np.asarray(stored['offsets'], dtype=np.int64), np.asarray(stored['targets'], dtype=np.int32),
+                   np.asarray(stored['edge_kinds'], dtype=np.int8), int(stored['element_count']),
+                   list(stored.get('types', [])))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable form stored with the processed data as ``relationships``."""
+        return {
+            'kinds': list(EDGE_KINDS),
+            'element_count': self.element_count,
+            'types': self.types,
+            'offsets': self.offsets.tolist(),
+            'targets': self.targets.tolist(),
+            'edge_kinds': self.edge_kinds.tolist()
+        }
+
+    def __len__(self) -> int:
+        """Number of edges (each relationship counts once per direction)."""
+        return len(self.targets)
+
+    def degree(self, node: int) -> int:
+        return int(self.offsets[node + 1] - self.offsets[node])
+
+    def neighbours(self, node: int, kind: Optional[str] = None) -> np.ndarray:
+        """Nodes related to a node, optionally by one kind of edge only."""
+        start, end = self.offsets[node], self.offsets[node + 1]
+        if kind is None:
+            return self.targets[start:end]
+        code = EDGE_KINDS.index(kind)
+        kinds = self.edge_kinds[start:end]
+        # Edges are sorted by kind within a node
+        lo, hi = np.searchsorted(kinds, code, 'left'), np.searchsorted(kinds, code, 'right')
+        return self.targets[start + lo:start + hi]
+
+    def edges(self, node: int) -> List[Tuple[str, int]]:
+        """(kind, node) for every edge of a node."""
+        start, end = self.offsets[node], self.offsets[node + 1]
+        return [(EDGE_KINDS[k], int(t)) for k, t in zip(self.edge_kinds[start:end], self.targets[start:end])]
+
+    def is_type(self, node: int) -> bool:
+        return node >= self.element_count
+
+    def type_info(self, node: int) -> Dict[str, Any]:
+        """Descriptor (id, type, name) of a type object node."""
+        return self.types[node - self.element_count]
+
+    def type_node(self, element: int) -> Optional[int]:
+        """The type object node of an element, if it has one."""
+        found = self.neighbours(element, 'typed_by')
+        return int(found[0]) if len(found) else None
+
+    def kind_counts(self) -> Dict[str, int]:
+        """Number of edges per kind."""
+        counts = np.bincount(self.edge_kinds, minlength=len(EDGE_KINDS)) if len(self) else [0] * len(EDGE_KINDS)
+        return {kind: int(n) for kind, n in zip(EDGE_KINDS, counts)}
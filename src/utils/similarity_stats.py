@@ -0,0 +1,107 @@
+"""
+Pairwise similarity statistics and heatmap inputs that never build the full N x N matrix.
+"""
+
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+
+def unit_rows(matrix: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length, as float32."""
+    rows = np.array(matrix, dtype=np.float32)
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True) + 1e-8
+    return rows
+
+
+def similarity_statistics(matrix: np.ndarray, block_size: int = 1024, bins: int = 40) -> Dict[str, Any]:
+    """Min, max, mean and histogram of cosine similarity over all distinct pairs.
+
+    The upper triangle is visited block by block, so memory stays at
+    ``block_size`` squared however many vectors there are.
+    """
+    rows = unit_rows(matrix)
+    n = rows.shape[0]
+    edges = np.linspace(-1.0, 1.0, bins + 1)
+    counts = np.zeros(bins, dtype=np.int64)
+    total = 0.0
+    pairs = 0
+    lowest, highest = np.inf, -np.inf
+
+    for start in range(0, n, block_size):
+        block = rows[start:start + block_size]
+        for other_start in range(start, n, block_size):
+            scores = block @ rows[other_start:other_start + block_size].T
+            if other_start == start:
+                # Diagonal block: only pairs above the diagonal
+                scores = scores[np.triu_indices(scores.shape[0], k=1, m=scores.shape[1])]
+            else:
+                scores = scores.ravel()
+            if not scores.size:
+                continue
+            np.clip(scores, -1.0, 1.0, out=scores)
+            lowest = min(lowest, float(scores.min()))
+            highest = max(highest, float(scores.max()))
+            total += float(scores.sum(dtype=np.float64))
+            pairs += scores.size
+            counts += np.histogram(scores, bins=edges)[0]
+
+    if not pairs:
+        return {'pairs': 0, 'min': None, 'max': None, 'mean': None, 'histogram': counts, 'bin_edges': edges}
+    return {
+        'pairs': pairs,
+        'min': lowest,
+        'max': highest,
+        'mean': total / pairs,
+        'histogram': counts,
+        'bin_edges': edges
+    }
+
+
+def stratified_sample(labels: Sequence[str], max_points: int = 200, seed: int = 42) -> np.ndarray:
+    """Indices of a sample that keeps each label's share (at least one per label), grouped by label."""
+    labels = np.asarray(labels)
+    n = len(labels)
+    if n <= max_points:
+        return np.argsort(labels, kind='stable')
+    rng = np.random.default_rng(seed)
+    chosen: List[np.ndarray] = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        take = min(len(members), max(1, round(max_points * len(members) / n)))
+        chosen.append(np.sort(rng.choice(members, size=take, replace=False)))
+    return np.concatenate(chosen)
+
+
+def sampled_similarity(matrix: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """Cosine similarity between the sampled rows only."""
+    rows = unit_rows(np.asarray(matrix)[indices])
+    return rows @ rows.T
+
+
+def type_mean_similarity(matrix: np.ndarray, labels: Sequence[str],
+                         block_size: int = 4096) -> Dict[str, Any]:
+    """Mean cosine similarity between every pair of label groups.
+
+    The mean of u.v over all pairs of two groups equals the dot product of
+    the groups' mean unit vectors, so one pass over the rows is enough.
+    Within-group means on the diagonal include each vector with itself.
+    """
+    labels = np.asarray(labels)
+    names, inverse = np.unique(labels, return_inverse=True)
+    sums = np.zeros((len(names), np.asarray(matrix).shape[1]), dtype=np.float64)
+    for start in range(0, len(labels), block_size):
+        rows = unit_rows(np.asarray(matrix)[start:start + block_size])
+        np.add.at(sums, inverse[start:start + block_size], rows)
+    sizes = np.bincount(inverse, minlength=len(names))
+    means = sums / sizes[:, None]
+    return {'labels': names.tolist(), 'sizes': sizes.tolist(), 'similarity': means @ means.T}
+
+
+def element_types(texts: Sequence[str], default: str = "Unknown") -> List[str]:
+    """Element type of each embedded text, read from its 'Element Type:' field."""
+    types = []
+    for text in texts:
+        head = text.split(" | ", 1)[0] if text else ""
+        types.append(head[len("Element Type: "):] if head.startswith("Element Type: ") else default)
+    return types
@@ -0,0 +1,226 @@
+"""
+Serialisation profiles for the element texts that are embedded.
+
+A profile decides how much of an element is written and how tersely:
+
+- ``full``: every property as "pset - property: value unit", as the chunker
+  has always written it
+- ``compact``: properties grouped under their property set once
+  ("[pset] property: value unit; property: value"), empty and redundant
+  values left out, SI unit labels written as symbols (MILLIMETRE -> mm)
+  and floats without trailing noise (1499.9999999999998 -> 1500)
+
+Both write " | "-separated "Label: value" parts that
+``context_builder.parse_element_text`` reads back. Texts longer than the
+token limit are split into several chunks, each repeating the element's
+header (type, ID, name), so every chunk can be embedded and retrieved on
+its own.
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+
+from src.utils.numeric_index import SI_PREFIXES, SI_UNITS
+from src.utils.tokens import TokenCounter
+
+# Input limit of the OpenAI embedding models
+MAX_EMBEDDING_TOKENS = 8191
+# Headroom for token estimates, which can be ~15% low without tiktoken
+ESTIMATE_MARGIN = 0.85
+
+PREFIX_SYMBOLS = {
+    'EXA': 'E', 'PETA': 'P', 'TERA': 'T', 'GIGA': 'G', 'MEGA': 'M', 'KILO': 'k', 'HECTO': 'h', 'DECA': 'da',
+    'DECI': 'd', 'CENTI': 'c', 'MILLI': 'm', 'MICRO': 'µ', 'NANO': 'n', 'PICO': 'p', 'FEMTO': 'f', 'ATTO': 'a'
+}
+
+Item = Tuple[Optional[str], str]
+
+
+def unit_symbol(label: Optional[str]) -> Optional[str]:
+    """Symbol of an SI unit label, e.g. 'MILLIMETRE' -> 'mm'; other labels are returned as they are."""
+    if not label:
+        return label
+    for prefix in ('',) + tuple(SI_PREFIXES):
+        name = label[len(prefix):]
+        if label.startswith(prefix) and name in SI_UNITS:
+            return PREFIX_SYMBOLS.get(prefix, '') + ('g' if name == 'GRAM' else SI_UNITS[name][0])
+    return label
+
+
+def format_number(value: Any) -> str:
+    """A value as text, with floats rounded to 6 decimals and whole floats written as integers."""
+    if isinstance(value, float):
+        value = round(value, 6)
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+    return str(value)
+
+
+class TextProfile:
+    """How elements are written as text for embedding."""
+
+    def __init__(self, name: str, group_property_sets: bool = False, drop_empty: bool = False,
+                 drop_redundant: bool = False, short_values: bool = False):
+        self.name = name
+        # Write each property set name once, followed by its properties
+        self.group_property_sets = group_property_sets
+        # Leave out empty strings and property sets without values
+        self.drop_empty = drop_empty
+        # Leave out values repeating the element's name or type name, and a description equal to the name
+        self.drop_redundant = drop_redundant
+        # SI unit symbols instead of labels, floats without representation noise
+        self.short_values = short_values
+
+
+PROFILES = {
+    'full': TextProfile('full'),
+    'compact': TextProfile('compact', group_property_sets=True, drop_empty=True, drop_redundant=True,
+                           short_values=True)
+}
+
+PROFILE_LABELS = {
+    'compact': "Compact (fewer tokens)",
+    'full': "Full (every field)"
+}
+
+
+def get_profile(profile: Any) -> TextProfile:
+    """A TextProfile, given one or its name."""
+    if isinstance(profile, TextProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown text profile: {profile}. Choose from {list(PROFILES)}")
+    return PROFILES[profile]
+
+
+class TextSerializer:
+    """Write elements and type objects as text chunks of at most ``max_tokens`` tokens."""
+
+    def __init__(self, profile: Any = 'full', max_tokens: Optional[int] = MAX_EMBEDDING_TOKENS,
+                 token_counter: Optional[TokenCounter] = None):
+        self.profile = get_profile(profile)
+        if max_tokens is not None and max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter or TokenCounter()
+        self.split_elements = 0
+
+    def element(self, element: Dict[str, Any], type_name: Optional[str] = None) -> List[str]:
+        """Chunks describing an element (normally one); its type's properties are described by the type."""
+        header = [f"Element Type: {element.get('type', 'Unknown')}", f"ID: {element.get('id', 'Unknown')}"]
+        name = element.get('name')
+        if name:
+            header.append(f"Name: {self._clean(name)}")
+        description = element.get('description')
+        if description and not (self.profile.drop_redundant and description == name):
+            header.append(f"Description: {self._clean(description)}")
+        if type_name:
+            header.append(f"Type: {self._clean(type_name)}")
+        redundant = {str(name), str(type_name)} if self.profile.drop_redundant else set()
+        return self._chunks(header, self._items(element.get('properties', {}), redundant))
+
+    def type_object(self, type_id: str, entry: Dict[str, Any], instances: int) -> List[str]:
+        """Chunks describing a type object's properties, shared by its instances."""
+        header = [f"Element Type: {entry['type']}", f"ID: {type_id}"]
+        if entry.get('name'):
+            header.append(f"Name: {self._clean(entry['name'])}")
+        header.append(f"Instances: {instances}")
+        redundant = {str(entry.get('name'))} if self.profile.drop_redundant else set()
+        return self._chunks(header, self._items(entry.get('properties', {}), redundant))
+
+    def _clean(self, text: Any) -> str:
+        """Text with the part separators replaced, so names and values cannot split a part."""
+        text = str(text).replace(" | ", " / ")
+        return text.replace("; ", ", ") if self.profile.group_property_sets else text
+
+    def _items(self, property_sets: Dict[str, Any], redundant: set) -> List[Item]:
+        """(property set, "property: value unit") per property worth writing."""
+        profile = self.profile
+        clean = self._clean
+        grouped = profile.group_property_sets
+        items: List[Item] = []
+        for ps_name, properties in property_sets.items():
+            if not isinstance(properties, dict):
+                # Direct property set value
+                items.append((None, f"{clean(ps_name)}: {clean(properties)}"))
+                continue
+            ps_name = clean(ps_name)
+            for prop_name, prop_data in properties.items():
+                if isinstance(prop_data, dict):
+                    value = prop_data.get('value')
+                    unit = prop_data.get('unit', '')
+                    prop_type = prop_data.get('type', '')
+                else:
+                    # Direct property value
+                    value, unit, prop_type = prop_data, '', ''
+                if value is None and (isinstance(prop_data, dict) or profile.drop_empty):
+                    continue
+                if profile.drop_empty and (value == '' or value == 'None'):
+                    continue
+                if str(value) in redundant:
+                    continue
+                if profile.short_values:
+                    value, unit = format_number(value), unit_symbol(unit)
+                text = f"{prop_name}: {value}"
+                if " | " in text or grouped and "; " in text:
+                    text = f"{clean(prop_name)}: {clean(value)}"
+                if unit:
+                    text += f" {unit}"
+                if prop_type:
+                    text += f" (Type: {prop_type})"
+                items.append((ps_name, text))
+        return items
+
+    def _render(self, header: List[str], items: List[Item]) -> str:
+        parts = list(header)
+        if self.profile.group_property_sets:
+            current, group = None, []
+            for ps_name, text in items + [(None, None)]:
+                if group and (ps_name != current or ps_name is None):
+                    parts.append(f"[{current}] " + "; ".join(group))
+                    group = []
+                if ps_name is None:
+                    if text is not None:
+                        parts.append(text)
+                else:
+                    current = ps_name
+                    group.append(text)
+        else:
+            parts.extend(f"{ps_name} - {text}" if ps_name is not None else text for ps_name, text in items)
+        return " | ".join(parts)
+
+    def _chunks(self, header: List[str], items: List[Item]) -> List[str]:
+        text = self._render(header, items)
+        if self.max_tokens is None:
+            return [text]
+        limit = self.max_tokens if self.token_counter.is_exact else int(self.max_tokens * ESTIMATE_MARGIN)
+        # A token is at least one byte, so most texts need no counting
+        if len(text.encode('utf-8')) <= limit or self.token_counter.count(text) <= limit:
+            return [text]
+
+        # Pack properties greedily; property set names and separators are counted per item
+        self.split_elements += 1
+        budget = limit - self.token_counter.count(" | ".join(header)) - 1
+        chunks, batch, used = [], [], 0
+        for ps_name, item_text in items:
+            cost = self.token_counter.count(f"{ps_name or ''} - {item_text}") + 1
+            if batch and used + cost > budget:
+                chunks.append(self._render(header, batch))
+                batch, used = [], 0
+            batch.append((ps_name, item_text))
+            used += cost
+        if batch or not chunks:
+            chunks.append(self._render(header, batch))
+        return chunks
+
+
+def token_report(texts: List[str], token_counter: Optional[TokenCounter] = None) -> Dict[str, Any]:
+    """Token totals of texts about to be embedded: chunks, total and largest tokens, and
+    whether the counts are exact (tiktoken) or estimated."""
+    counter = token_counter or TokenCounter()
+    counts = counter.count_many(list(texts)) if texts else []
+    return {
+        'chunks': len(counts),
+        'tokens': sum(counts),
+        'max_tokens': max(counts, default=0),
+        'exact': counter.is_exact
+    }
@@ -0,0 +1,164 @@
+"""
+Per-stage latency tracing for the search and chat pipeline.
+
+Each chat turn gets a PipelineTrace that records wall time per stage plus
+counters (tokens, result counts, cache hits). Finished traces are appended
+as JSON lines to a local file; run this module on that file for p50/p95
+latencies per stage:
+
+    python -m src.utils.tracing logs/chat_traces.jsonl
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+DEFAULT_TRACE_PATH = os.path.join("logs", "chat_traces.jsonl")
+
+
+class PipelineTrace:
+    """Wall time per stage and counters for one pipeline run (e.g. one chat turn)."""
+
+    def __init__(self, name: str = "chat_turn", **attributes):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.stages: List[Dict[str, Any]] = []
+        self.counters: Dict[str, Any] = {}
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.total_ms: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block as a named stage. Repeated names are recorded separately."""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_stage(name, (time.perf_counter() - start) * 1000)
+
+    def add_stage(self, name: str, elapsed_ms: float) -> None:
+        """Record a stage measured elsewhere, e.g. across a streamed response."""
+        self.stages.append({'stage': name, 'ms': round(elapsed_ms, 3)})
+
+    def set(self, key: str, value: Any) -> None:
+        self.counters[key] = value
+
+    def incr(self, key: str, amount: float = 1) -> None:
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def finish(self) -> "PipelineTrace":
+        """Fix the total wall time of the run."""
+        if self.total_ms is None:
+            self.total_ms = round((time.perf_counter() - self._start) * 1000, 3)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        self.finish()
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'timestamp': self.started_at,
+            'total_ms': self.total_ms,
+            'stages': self.stages,
+            'counters': self.counters,
+            'attributes': self.attributes
+        }
+
+
+class NullTrace(PipelineTrace):
+    """Trace that records nothing, used when the caller did not ask for tracing."""
+
+    def __init__(self):
+        super().__init__("null")
+
+    def add_stage(self, name: str, elapsed_ms: float) -> None:
+        pass
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def incr(self, key: str, amount: float = 1) -> None:
+        pass
+
+
+def ensure_trace(trace: Optional[PipelineTrace]) -> PipelineTrace:
+    """Return the given trace, or a no-op trace if None."""
+    return trace if trace is not None else NullTrace()
+
+
+class TraceRecorder:
+    """Append finished traces as JSON lines to a local file."""
+
+    _lock = threading.Lock()
+
+    def __init__(self, path: str = DEFAULT_TRACE_PATH):
+        self.path = path
+
+    def record(self, trace: PipelineTrace) -> None:
+        line = json.dumps(trace.to_dict(), default=str)
+        directory = os.path.dirname(self.path)
+        with self._lock:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Read back all recorded traces, skipping malformed lines."""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Count, p50, p95 and max wall time per stage (and for whole runs as 'total')."""
+    timings: Dict[str, List[float]] = {}
+    for record in records:
+        timings.setdefault('total', []).append(record.get('total_ms') or 0.0)
+        per_stage: Dict[str, float] = {}
+        for stage in record.get('stages', []):
+            per_stage[stage['stage']] = per_stage.get(stage['stage'], 0.0) + stage['ms']
+        for name, ms in per_stage.items():
+            timings.setdefault(name, []).append(ms)
+    return {
+        name: {
+            'count': len(values),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)),
+            'max_ms': float(np.max(values))
+        }
+        for name, values in timings.items()
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else DEFAULT_TRACE_PATH
+    records = TraceRecorder(path).load()
+    if not records:
+        print(f"No traces found in {path}")
+        return
+    print(f"{len(records)} traces from {path}")
+    print(f"{'stage':<24} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for name, stats in sorted(summarize(records).items(), key=lambda item: -item[1]['p95_ms']):
+        print(f"{name:<24} {stats['count']:>6} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f} {stats['max_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
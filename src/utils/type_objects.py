@@ -0,0 +1,62 @@
+"""
+Type object properties, stored once per type and merged into occurrences on read.
+
+Ingest resolves the property sets of every IfcTypeObject once and stores them
+with the processed data as ``types``: type id -> {'type', 'name',
+'properties'}. An element typed by one carries its ``type_id`` and only the
+properties that the type does not already give it with the same value (its
+overrides and additions). Consumers that need everything an element has
+read it through ``effective_properties`` / ``resolve``, where occurrence
+values win over type values, as in IFC.
+"""
+
+from typing import Dict, Any, Iterator, Optional
+
+Types = Dict[str, Dict[str, Any]]
+
+
+def type_of(element: Dict[str, Any], types: Optional[Types]) -> Optional[Dict[str, Any]]:
+    """The type entry of an element, if it has one."""
+    type_id = element.get('type_id')
+    return types.get(type_id) if types and type_id is not None else None
+
+
+def effective_properties(element: Dict[str, Any], types: Optional[Types]) -> Dict[str, Dict[str, Any]]:
+    """An element's property sets with those of its type merged underneath."""
+    own = element.get('properties') or {}
+    type_entry = type_of(element, types)
+    if not type_entry or not type_entry.get('properties'):
+        return own
+    merged = {ps_name: dict(properties) for ps_name, properties in type_entry['properties'].items()}
+    for ps_name, properties in own.items():
+        if isinstance(properties, dict):
+            merged.setdefault(ps_name, {}).update(properties)
+        else:
+            merged[ps_name] = properties
+    return merged
+
+
+def resolve(element: Dict[str, Any], types: Optional[Types]) -> Dict[str, Any]:
+    """The element with its effective properties (the element itself when it has no type)."""
+    if not type_of(element, types):
+        return element
+    return dict(element, properties=effective_properties(element, types))
+
+
+def resolved_elements(data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Every element of processed data with its effective properties."""
+    types = data.get('types') if isinstance(data, dict) else None
+    for element in (data.get('elements', []) if isinstance(data, dict) else []):
+        yield resolve(element, types)
+
+
+def strip_inherited(properties: Dict[str, Dict[str, Any]],
+                    type_properties: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Drop occurrence properties equal to the type's (value and unit); empty sets are dropped too."""
+    stripped = {}
+    for ps_name, props in properties.items():
+        inherited = type_properties.get(ps_name) or {}
+        kept = {name: prop for name, prop in props.items() if inherited.get(name) != prop}
+        if kept or ps_name not in type_properties:
+            stripped[ps_name] = kept
+    return stripped
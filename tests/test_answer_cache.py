@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from src.components import chat_tab
+from src.components.chat_tab import ChatTab
+from src.utils.answer_cache import SemanticAnswerCache
+from src.utils.embedding import EmbeddingProcessor
+
+HITS = [{'text': "Element Type: IfcWall | ID: 1 | Name: Basic Wall", 'similarity_score': 0.9}]
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_similar_question_on_the_same_store_hits():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    cache.store(('fp', 0.3, 1500), "how thick are the walls", unit(1, 0, 0), "200 mm", HITS)
+    hit = cache.lookup(('fp', 0.3, 1500), unit(1, 0.05, 0))
+    assert hit['answer'] == "200 mm"
+    assert hit['results'] == HITS
+    assert hit['similarity'] > 0.95
+    assert cache.lookup(('fp', 0.3, 1500), unit(0, 1, 0)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_other_embeddings_or_settings_never_share_answers():
+    cache = SemanticAnswerCache()
+    cache.store(('fp', 0.3, 1500), "q", unit(1, 0), "answer")
+    assert cache.lookup(('other fp', 0.3, 1500), unit(1, 0)) is None
+    assert cache.lookup(('fp', 0.5, 1500), unit(1, 0)) is None
+    # A query vector of another size (another model) misses instead of failing
+    assert cache.lookup(('fp', 0.3, 1500), unit(1, 0, 0)) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store('fp', "a", unit(1, 0, 0), "A")
+    cache.store('fp', "b", unit(0, 1, 0), "B")
+    assert cache.lookup('fp', unit(1, 0, 0))['answer'] == "A"
+    cache.store('fp', "c", unit(0, 0, 1), "C")
+    assert len(cache) == 2
+    assert cache.lookup('fp', unit(0, 1, 0)) is None
+    assert cache.lookup('fp', unit(1, 0, 0))['answer'] == "A"
+    assert cache.lookup('fp', unit(0, 0, 1))['answer'] == "C"
+
+
+def test_invalidate_where_drops_one_fingerprint_only():
+    cache = SemanticAnswerCache()
+    cache.store(('fp', 0.3, 1500), "q", unit(1, 0), "A")
+    cache.store(('fp', 0.5, 1500), "q", unit(1, 0), "A2")
+    cache.store(('other', 0.3, 1500), "q", unit(1, 0), "B")
+    cache.invalidate_where(lambda key: key[0] == 'fp')
+    assert len(cache) == 1
+    assert cache.lookup(('other', 0.3, 1500), unit(1, 0))['answer'] == "B"
+
+
+def test_fingerprint_keys_the_texts_model_and_vector_size():
+    processor = EmbeddingProcessor()
+    processor.set_embeddings(["a", "b"], np.eye(2, dtype=np.float32))
+    before = processor.fingerprint()
+    processor.set_embeddings(["a", "b"], np.eye(2, dtype=np.float32))
+    assert processor.fingerprint() == before
+    processor.set_embeddings(["a", "c"], np.eye(2, dtype=np.float32))
+    assert processor.fingerprint() != before
+    processor.set_embeddings(["a", "b"], np.ones((2, 4), dtype=np.float32))
+    assert processor.fingerprint() != before
+    processor.set_model('text-embedding-3-large')
+    processor.set_embeddings(["a", "b"], np.eye(2, dtype=np.float32))
+    assert processor.fingerprint() != before
+
+
+class FailingClient:
+    class chat:
+        class completions:
+            @staticmethod
+            def create(**kwargs):
+                raise RuntimeError("service unavailable")
+
+
+@pytest.fixture
+def failing_client(monkeypatch):
+    monkeypatch.setattr(chat_tab.OpenAIClientManager, 'get_client', staticmethod(lambda api_key: FailingClient))
+
+
+def test_failed_answers_are_flagged(failing_client):
+    response, outcome = ChatTab._generate_chat_response("how thick are the walls", HITS, "key")
+    assert outcome == {'success': False}
+    assert "service unavailable" in response
+
+
+def test_failed_streams_are_flagged_once_consumed(failing_client):
+    stream, outcome = ChatTab._generate_chat_response("how thick are the walls", HITS, "key", stream=True)
+    assert outcome == {'success': True}
+    assert "service unavailable" in "".join(stream)
+    assert outcome == {'success': False}
+
+
+def test_missing_api_key_is_flagged():
+    _, outcome = ChatTab._generate_chat_response("how thick are the walls", HITS, None)
+    assert outcome == {'success': False}
@@ -0,0 +1,116 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.utils import columnar
+from src.utils.relationship_graph import RelationshipGraph
+
+ELEMENTS = [
+    {'id': "2O2Fr$t4X7Zf8NOew3FLOH", 'type': "IfcWall", 'name': "Basic Wall:200mm:1", 'type_id': "T1",
+     'properties': {
+         'Pset_WallCommon': {'IsExternal': {'value': True, 'unit': None},
+                             'Width': {'value': 200.0, 'unit': "MILLIMETRE"},
+                             'Layers': {'value': 3, 'unit': None},
+                             'Reference': {'value': "Wände – 200", 'unit': None},
+                             'Big': {'value': 1 << 70, 'unit': None}},
+         'Custom': {'Note': {'value': None, 'unit': None}, 'Raw': {'value': [1, 2], 'unit': None},
+                    'Extra': {'value': 1.5, 'unit': "METRE", 'type': "IfcLengthMeasure"}},
+         'Direct': "not a property set"}},
+    {'id': "0M6o6Dw2f0Sf8NOew3FLOH", 'type': "IfcDoor", 'name': "Door", 'description': None,
+     'properties': {'Pset_DoorCommon': {'IsExternal': {'value': True, 'unit': None},
+                                        'Width': {'value': 200.0, 'unit': "MILLIMETRE"}}}},
+    {'id': 7, 'type': "IfcSlab", 'properties': None},
+    {'type': "IfcBeam"},
+]
+
+
+def processed(with_graph=True):
+    data = {
+        'file_info': {'name': "model.ifc", 'type': "IFC"},
+        'summary': {'total_elements': len(ELEMENTS), 'element_types': ["IfcBeam", "IfcDoor", "IfcSlab", "IfcWall"]},
+        'units': {'MILLIMETRE': {'type': "LENGTHUNIT", 'si_unit': "m", 'scale': 0.001, 'project': True}},
+        'types': {'T1': {'type': "IfcWallType", 'name': "Basic Wall:200mm", 'properties': {}}},
+        'elements': ELEMENTS,
+    }
+    if with_graph:
+        graph = RelationshipGraph.from_edges(len(ELEMENTS), [(0, 1, 'hosts'), (0, 2, 'connects')],
+                                             types=[{'id': "T1"}])
+        data['relationships'] = graph.to_dict()
+    return data
+
+
+def plain(data):
+    """Columnar data as plain JSON values, for comparison with the input."""
+    return json.loads(json.dumps(data, default=columnar.json_default))
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_bytes_round_trip(compress):
+    data = processed()
+    loaded = columnar.read(columnar.to_bytes(data, compress=compress))
+    assert plain(loaded) == plain(data)
+    assert loaded['elements'][0] == ELEMENTS[0]
+    assert loaded['elements'][-1] == ELEMENTS[-1]
+    assert loaded['elements'][1:3] == ELEMENTS[1:3]
+    assert list(loaded['elements']) == ELEMENTS
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_file_round_trip(tmp_path, compress):
+    path = str(tmp_path / f"model{columnar.EXTENSION}")
+    columnar.write(processed(), path, compress=compress)
+    loaded = columnar.read(path)
+    assert loaded['elements'].tolist() == ELEMENTS
+    # Uncompressed columns are views of the memory-mapped file; compressed ones are decompressed copies
+    offsets = loaded['relationships']['offsets']
+    assert offsets.flags.owndata is False
+    assert offsets.flags.writeable is False
+    assert (offsets.base is not None and isinstance(offsets.base, bytes)) is compress
+
+
+def test_relationship_arrays_are_stored_as_columns():
+    data = processed()
+    table = columnar.to_columns(data)
+    for field in ('offsets', 'targets', 'edge_kinds'):
+        assert f"relationships.{field}" in table['columns']
+        assert field not in table['meta']['relationships']
+    # The input is left untouched
+    assert isinstance(data['relationships']['offsets'], list)
+
+    loaded = columnar.read(columnar.to_bytes(data))
+    relationships = loaded['relationships']
+    assert relationships['offsets'].dtype == np.int64
+    assert relationships['targets'].dtype == np.int32
+    assert relationships['edge_kinds'].dtype == np.int8
+    graph = RelationshipGraph.from_data(loaded)
+    assert sorted(graph.neighbours(0).tolist()) == [1, 2]
+    assert graph.neighbours(1, 'hosted_by').tolist() == [0]
+
+
+def test_equal_values_are_stored_once():
+    table = columnar.to_columns(processed(with_graph=False))
+    # The two IsExternal and the two Width values share their value table rows
+    property_count = len(table['columns']['prop_value'])
+    assert len(table['columns']['value_kind']) == property_count - 2
+
+
+def test_data_without_elements_or_graph_round_trips():
+    data = {'file_info': {'name': "empty"}, 'elements': []}
+    loaded = columnar.read(columnar.to_bytes(data))
+    assert len(loaded['elements']) == 0
+    assert plain(loaded) == data
+
+
+def test_other_content_is_rejected():
+    assert not columnar.is_columnar(b'{"elements": []}')
+    with pytest.raises(ValueError, match="Not a columnar IFC model file"):
+        columnar.read(b'{"elements": []}')
+
+
+def test_elements_are_read_only_sequences():
+    elements = columnar.read(columnar.to_bytes(processed()))['elements']
+    assert len(elements) == len(ELEMENTS)
+    assert elements[-4] == ELEMENTS[0]
+    with pytest.raises(IndexError):
+        elements[len(ELEMENTS)]
@@ -0,0 +1,59 @@
+import json
+from collections.abc import Sequence
+
+import pytest
+
+from src.utils.json_stream import JSONEventReader, load_document
+
+DOCUMENTS = [
+    '{"pad": "x", "v": 2.5, "w": -0.125e+3, "x": 7E-2, "y": -12, "z": 1e5}',
+    '[1, 2.75, -3.5e-1, 4E2, 0, -0.0, 123456789.125, true, false, null]',
+    '{"name": "Wände – ÄÖÜ ✓ 漢字", "elements": [{"type": "IfcWall", "id": "a", "properties": '
+    '{"Pset_WallCommon": {"Width": {"value": 0.2, "unit": "METRE"}, "IsExternal": {"value": true}}}}, '
+    '{"type": "IfcDoor", "id": "b", "properties": {}}], "summary": {"total_elements": 2}}',
+    '{"elements": [], "relationships": [[1.5, 2e3], {"a": -1.25E+2}], "scale": 0.001}',
+    '3.14159e-10',
+    '"just a string"',
+    '{}',
+    '[]',
+]
+
+
+def plain(value):
+    """A loaded value with its lazy and columnar arrays turned into lists."""
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return [plain(item) for item in value]
+    return value
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 18))
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_load_document_matches_json_load(document, chunk_size):
+    expected = json.loads(document)
+    result = load_document(document.encode('utf-8'), large_array_bytes=16, chunk_size=chunk_size)
+    if isinstance(expected, dict) and 'elements' in expected and 'summary' not in expected:
+        result.pop('summary')
+    assert plain(result) == expected
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 18))
+def test_item_byte_ranges(chunk_size):
+    source = DOCUMENTS[2].encode('utf-8')
+    for event in JSONEventReader(source, chunk_size).events():
+        if event[0] in ('value', 'item'):
+            value, start, end = event[-3:]
+            assert json.loads(source[start:end]) == value
+
+
+def test_number_split_at_chunk_boundary():
+    # "2." ends the first chunk, "5" starts the next
+    head = '{"pad":"","v":2.'
+    document = '{"pad":"%s","v":2.5}' % ('x' * (1024 - len(head)))
+    assert load_document(document.encode('utf-8'), chunk_size=1024)['v'] == 2.5
+
+
+def test_invalid_document_raises():
+    with pytest.raises(ValueError):
+        load_document(b'{"v": 2.}', chunk_size=4)
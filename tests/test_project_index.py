@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from src.utils.embedding import EmbeddingProcessor
+from src.utils.project_index import ProjectIndex
+
+DIMS = 64
+
+
+def make_store(model='text-embedding-3-small', dimensions=None, count=100, dims=DIMS, seed=0):
+    processor = EmbeddingProcessor()
+    processor.set_model(model)
+    if dimensions is not None:
+        processor.set_dimensions(dimensions)
+    vectors = np.random.default_rng(seed).standard_normal((count, dims)).astype(np.float32)
+    processor.set_embeddings([f"element {seed}-{i}" for i in range(count)], vectors)
+    return processor, vectors
+
+
+def query_processor(model='text-embedding-3-small', dimensions=None):
+    processor = EmbeddingProcessor()
+    processor.set_model(model)
+    if dimensions is not None:
+        processor.set_dimensions(dimensions)
+    return processor
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ProjectIndex(memory_budget_mb=1)
+    for seed, source in enumerate(['a', 'b', 'c']):
+        index.add_processor(source, make_store(seed=seed)[0], str(tmp_path))
+    return index
+
+
+def test_results_are_merged_across_shards(index):
+    _, vectors = make_store(seed=1)
+    results = index.find_top_similar("", top_k=3, query_embedding=vectors[7], query_processor=query_processor())
+    assert results[0]['source'] == 'b'
+    assert results[0]['text'] == "element 1-7"
+    assert results[0]['similarity_score'] == pytest.approx(1.0, abs=1e-5)
+    assert [r['similarity_score'] for r in results] == sorted((r['similarity_score'] for r in results), reverse=True)
+
+
+def test_shard_size_counts_vectors_texts_and_search_index(index):
+    index.find_top_similar("", query_embedding=np.ones(DIMS))
+    vectors = 100 * DIMS * 4
+    texts = sum(len(f"element 0-{i}") for i in range(100))
+    # Stored float32 vectors plus the normalised float32 search matrix
+    assert index.memory_usage_bytes == 3 * (2 * vectors + texts)
+
+
+def test_least_recently_used_shards_are_evicted_beyond_the_budget(index):
+    shard_bytes = ProjectIndex._shard_bytes(index._get_shard('a'))
+    index.memory_budget_bytes = 2 * shard_bytes
+    index._get_shard('b')
+    index._get_shard('a')
+    # 'b' is now the least recently used of the two loaded shards
+    index._get_shard('c')
+    assert index.loaded_sources == ['a', 'c']
+    assert index.memory_usage_bytes <= index.memory_budget_bytes
+
+
+def test_query_model_must_match_every_shard(index):
+    with pytest.raises(ValueError, match="query uses text-embedding-3-large"):
+        index.find_top_similar("", query_embedding=np.ones(DIMS),
+                               query_processor=query_processor('text-embedding-3-large', DIMS))
+
+
+def test_query_vector_length_must_match_the_shards(index):
+    with pytest.raises(ValueError, match=f"{DIMS}-dimension vectors but the query vector has 32"):
+        index.find_top_similar("", query_embedding=np.ones(32))
+
+
+def test_shards_of_different_models_cannot_be_mixed(index, tmp_path):
+    index.find_top_similar("", query_embedding=np.ones(DIMS))
+    index.add_processor('large', make_store('text-embedding-3-large', DIMS, seed=9)[0], str(tmp_path))
+    with pytest.raises(ValueError, match="All shards in a project must use the same embedding model"):
+        index.find_top_similar("", query_embedding=np.ones(DIMS))
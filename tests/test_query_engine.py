@@ -0,0 +1,150 @@
+import pytest
+
+from src.utils.numeric_index import NumericIndex
+from src.utils.query_engine import StructuredQueryEngine
+
+UNITS = {
+    'MILLIMETRE': {'type': "LENGTHUNIT", 'si_unit': "m", 'scale': 0.001, 'project': True},
+    'CUBIC_METRE': {'type': "VOLUMEUNIT", 'si_unit': "m3", 'scale': 1.0, 'project': True},
+}
+
+
+def wall(name, loadbearing, width, volume=None):
+    properties = {
+        'Pset_WallCommon': {'LoadBearing': {'value': loadbearing, 'unit': None},
+                            'Width': {'value': width, 'unit': "MILLIMETRE"}},
+    }
+    if volume is not None:
+        properties['Qto_WallBaseQuantities'] = {'NetVolume': {'value': volume, 'unit': "CUBIC_METRE"}}
+    return {'id': name, 'type': "IfcWall", 'name': name, 'properties': properties}
+
+
+def slab(name, thickness, volume_cm3):
+    # Values without a unit, as some exporters write them
+    return {'id': name, 'type': "IfcSlab", 'name': name, 'properties': {
+        'Dimensions': {'Thickness': {'value': thickness, 'unit': None}},
+        'Custom': {'Volume (cm3)': {'value': volume_cm3, 'unit': None}}}}
+
+
+def door(name, width, unit):
+    return {'id': name, 'type': "IfcDoor", 'name': name, 'properties': {
+        'Pset_DoorCommon': {'Width': {'value': width, 'unit': unit}}}}
+
+
+@pytest.fixture
+def data():
+    return {'units': UNITS, 'elements': [
+        wall("Wall A", True, 200.0, 2.0),
+        wall("Wall B", False, 100.0, 1.5),
+        # 1500 mm as authoring tools store it
+        wall("Wall C", True, 1499.9999999999998),
+        slab("Slab A", 150.0, 500000.0),
+        slab("Slab B", 250.0, 250000.0),
+        door("Door A", 900.0, "MILLIMETRE"),
+        door("Door B", 1.0, "METRE"),
+        door("Door C", 3.0, "FOOT"),
+    ]}
+
+
+@pytest.fixture
+def engine(data):
+    return StructuredQueryEngine(data)
+
+
+WIDTH = ('Pset_WallCommon', 'Width')
+
+
+def test_values_are_normalised_to_si(data):
+    index = NumericIndex(data)
+    assert index.si_units[WIDTH] == 'm'
+    assert list(index.values[WIDTH]) == pytest.approx([0.1, 0.2, 1.5])
+    assert list(index.element_ids[WIDTH]) == [1, 0, 2]
+    assert index.project_unit('m') == ('MILLIMETRE', 0.001)
+    assert index.project_unit('kg') == ('kg', 1.0)
+
+
+def test_the_most_common_unit_of_a_property_is_indexed(data):
+    index = NumericIndex(data)
+    door_width = ('Pset_DoorCommon', 'Width')
+    # Millimetres and metres are both lengths; the unknown FOOT label is skipped
+    assert list(index.values[door_width]) == [0.9, 1.0]
+    assert index.skipped == 1
+
+
+def test_values_without_a_unit_are_kept_as_they_are(data):
+    index = NumericIndex(data)
+    thickness = ('Dimensions', 'Thickness')
+    assert index.si_units[thickness] is None
+    assert index.dimension(thickness) is None
+    assert list(index.values[thickness]) == [150.0, 250.0]
+
+
+def test_range_bounds_can_be_exclusive(data):
+    index = NumericIndex(data)
+    assert list(index.range(WIDTH, 0.1, 0.2)[0]) == [1, 0]
+    assert list(index.range(WIDTH, 0.1, 0.2, include_low=False)[0]) == [0]
+    assert list(index.range(WIDTH, 0.1, 0.2, include_high=False)[0]) == [1]
+    assert list(index.range(WIDTH, high=0.1, include_high=False)[0]) == []
+    assert list(index.range(('Missing', 'Width'), 0.0)[0]) == []
+
+
+def test_range_bounds_allow_for_rounding(data):
+    index = NumericIndex(data)
+    assert list(index.range(WIDTH, 1.5)[0]) == [2]
+    assert list(index.range(WIDTH, 1.5, include_low=False)[0]) == []
+    assert list(index.range(WIDTH, high=1.5, include_high=False)[0]) == [1, 0]
+
+
+@pytest.mark.parametrize("query, matches", [
+    ("how many walls are thicker than 150 mm", 2),
+    ("how many walls are wider than 0.2 m", 1),
+    ("how many walls are wider than 1.5 m", 0),
+    ("how many walls are wider than 150", 2),
+    ("how many walls with width between 100 and 200 mm", 2),
+    ("how many loadbearing walls are thinner than 1 m", 1),
+])
+def test_range_questions(engine, query, matches):
+    result = engine.answer(query)
+    assert result['intent'] == 'range'
+    assert result['facts']['matches'] == matches
+
+
+def test_values_without_a_unit_are_read_in_the_project_unit(engine):
+    result = engine.answer("how many slabs are thicker than 200 mm")
+    assert result['facts']['matches'] == 1
+    assert engine.answer("how many slabs are thicker than 0.2 m")['facts']['matches'] == 1
+
+
+def test_bounds_in_another_dimension_are_rejected(engine):
+    assert engine.answer("how many walls are thicker than 200 kg") is None
+    assert engine.answer("how many slabs are thicker than 200 kg") is None
+
+
+def test_sum_uses_si_values_and_names_the_quantity(engine):
+    result = engine.answer("total volume of walls")
+    assert result['intent'] == 'sum'
+    assert result['facts'] == {'total': pytest.approx(3.5), 'unit': 'CUBIC_METRE',
+                               'quantity': 'Qto_WallBaseQuantities.NetVolume', 'summed': 2, 'missing': 1}
+    assert "Qto_WallBaseQuantities.NetVolume" in result['answer']
+
+
+def test_sum_reads_the_unit_in_a_property_name(engine):
+    result = engine.answer("total volume of slabs")
+    assert result['facts']['quantity'] == 'Custom.Volume (cm3)'
+    assert result['facts']['total'] == pytest.approx(0.75)
+    assert result['facts']['unit'] == 'CUBIC_METRE'
+
+
+def test_sum_without_the_quantity(engine):
+    result = engine.answer("total area of walls")
+    assert result['facts'] == {}
+    assert "None of the 3 walls have an area quantity" in result['answer']
+
+
+def test_grouped_counts_are_not_filtered_counts(engine):
+    grouped = engine.answer("how many walls by loadbearing")
+    assert grouped['intent'] == 'group'
+    assert grouped['facts'] == {'True': 2, 'False': 1}
+    counted = engine.answer("how many loadbearing walls")
+    assert counted['intent'] == 'count'
+    assert counted['elements'] == 2